@@ -0,0 +1,46 @@
+import argparse, os, time
+
+os.environ.setdefault("OFFLINE_MODE", "1")
+
+import config
+from backtest.data import load_history, load_archive_history
+from storage.candle_archive import CandleArchive
+from backtest.engine import run_fast, run_replay
+
+
+def main():
+    ap = argparse.ArgumentParser(description="離線回測：以本地 K 線檔重播 trend / revert 策略與 RiskManager")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--data", help="K 線資料夾（{SYMBOL}_{interval}.csv|.json）")
+    src.add_argument("--archive", nargs="?", const=config.CANDLE_ARCHIVE_DIR, help="本地 K 線封存目錄（python -m storage sync）")
+    ap.add_argument("--start", type=int, help="封存視窗起點 open_time（ms）")
+    ap.add_argument("--end", type=int, help="封存視窗終點 open_time（ms）")
+    ap.add_argument("--symbols", nargs="*", default=config.SYMBOL_POOL)
+    ap.add_argument("--interval", default=config.KLINE_INTERVAL)
+    ap.add_argument("--mode", choices=("fast", "replay"), default="fast")
+    ap.add_argument("--equity", type=float, default=config.BACKTEST_START_EQUITY)
+    ap.add_argument("--fee", type=float, default=config.BACKTEST_FEE_RATE)
+    ap.add_argument("--slippage", type=float, default=config.BACKTEST_SLIPPAGE)
+    ap.add_argument("--funding", type=float, default=config.BACKTEST_FUNDING_RATE,
+                    help="沒有 {SYMBOL}_funding.csv 時每 8h 的資金費率")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.archive:
+        hist = load_archive_history(CandleArchive(args.archive), args.symbols, args.interval, args.start, args.end,
+                                    default_funding=args.funding)
+    else:
+        hist = load_history(args.data, args.symbols, args.interval, default_funding=args.funding)
+    t1 = time.perf_counter()
+    run = run_fast if args.mode == "fast" else run_replay
+    res = run(hist, start_equity=args.equity, fee_rate=args.fee, slippage=args.slippage)
+    t2 = time.perf_counter()
+
+    print(f"[BACKTEST] {len(hist.symbols)} symbols × {len(hist.times)} bars ({args.interval}), "
+          f"load {t1 - t0:.2f}s, run {t2 - t1:.2f}s ({args.mode})")
+    for k, v in res.stats().items():
+        print(f"  {k:>14}: {v:,.4f}" if isinstance(v, float) else f"  {k:>14}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json, os
+from typing import Dict, List, Optional
+import numpy as np
+from exchange.kline_store import interval_ms
+
+FUNDING_PERIOD_MS = 8 * 3_600_000
+
+
+def _has_header(path: str) -> bool:
+    with open(path) as f:
+        first = f.readline().split(",")[0].strip()
+    try: float(first); return False
+    except ValueError: return True
+
+
+def load_klines(path: str) -> Dict[str, np.ndarray]:
+    """讀取本地 K 線檔：REST 原始 JSON（list of lists）或 Binance data.vision CSV"""
+    if path.endswith(".json"):
+        with open(path) as f:
+            raw = np.array([k[:7] for k in json.load(f)], dtype=np.float64)
+    else:
+        raw = np.loadtxt(path, delimiter=",", usecols=range(7), skiprows=1 if _has_header(path) else 0,
+                         dtype=np.float64, ndmin=2)
+    raw = raw[np.argsort(raw[:, 0], kind="stable")]
+    return {"open_time": raw[:, 0].astype(np.int64), "open": raw[:, 1], "high": raw[:, 2],
+            "low": raw[:, 3], "close": raw[:, 4], "volume": raw[:, 5], "close_time": raw[:, 6].astype(np.int64)}
+
+
+def load_funding(path: str):
+    """資金費率檔 CSV：fundingTime,fundingRate"""
+    raw = np.loadtxt(path, delimiter=",", usecols=(0, 1), skiprows=1 if _has_header(path) else 0, ndmin=2)
+    return raw[:, 0].astype(np.int64), raw[:, 1]
+
+
+class History:
+    """
+    多 symbol 對齊後的歷史資料。
+    - times：所有 symbol K 棒 open_time 的聯集（T,）
+    - close：(symbols × T)，中間缺 K 棒沿用前值，上市前以第一根補齊；start[i] 為第一根真實 K 棒位置
+    - funding：(symbols × T)，只有在資金費率結算的那根 K 棒有值，其餘為 0
+    """
+    def __init__(self, symbols: List[str], interval: str, times: np.ndarray, close: np.ndarray,
+                 start: np.ndarray, funding: np.ndarray):
+        self.symbols = symbols
+        self.interval = interval
+        self.interval_ms = interval_ms(interval)
+        self.times = times
+        self.close = close
+        self.start = start
+        self.funding = funding
+
+    @classmethod
+    def align(cls, interval: str, klines: Dict[str, Dict[str, np.ndarray]],
+              funding: Optional[Dict[str, tuple]] = None, default_funding: float = 0.0) -> "History":
+        symbols = list(klines)
+        times = np.unique(np.concatenate([k["open_time"] for k in klines.values()])) if klines else np.zeros(0, np.int64)
+        S, T = len(symbols), len(times)
+        close = np.full((S, T), np.nan)
+        start = np.zeros(S, dtype=np.int64)
+        for i, s in enumerate(symbols):
+            k = klines[s]
+            pos = np.searchsorted(times, k["open_time"])
+            close[i, pos] = k["close"]
+            start[i] = pos[0] if len(pos) else T
+            # 前值填補（缺 K 棒）與上市前補第一根
+            idx = np.where(np.isnan(close[i]), 0, np.arange(T))
+            np.maximum.accumulate(idx, out=idx)
+            close[i] = close[i, idx]
+            if len(pos): close[i, :start[i]] = close[i, start[i]]
+        fund = np.zeros((S, T))
+        on_boundary = (times % FUNDING_PERIOD_MS) == 0
+        for i, s in enumerate(symbols):
+            if funding and s in funding:
+                ft, fr = funding[s]
+                pos = np.searchsorted(times, ft)
+                ok = pos < T
+                fund[i, pos[ok]] = fr[ok]
+            else:
+                fund[i, on_boundary] = default_funding
+            fund[i, :start[i]] = 0.0
+        return cls(symbols, interval, times, close, start, fund)
+
+
+def load_history(data_dir: str, symbols: List[str], interval: str, default_funding: float = 0.0) -> History:
+    """data_dir/{SYMBOL}_{interval}.csv|.json，可選 data_dir/{SYMBOL}_funding.csv"""
+    klines, funding = {}, {}
+    for s in symbols:
+        for ext in (".csv", ".json"):
+            p = os.path.join(data_dir, f"{s}_{interval}{ext}")
+            if os.path.exists(p):
+                klines[s] = load_klines(p)
+                break
+        else:
+            print(f"[BACKTEST] no kline file for {s} in {data_dir}")
+            continue
+        fp = os.path.join(data_dir, f"{s}_funding.csv")
+        if os.path.exists(fp):
+            funding[s] = load_funding(fp)
+    return History.align(interval, klines, funding, default_funding)
+
+
+def load_archive_history(archive, symbols: List[str], interval: str, start_ms: int = None, end_ms: int = None,
+                         default_funding: float = 0.0) -> History:
+    """從 storage.candle_archive 切出 [start_ms, end_ms] 視窗（memmap，不解析文字檔）"""
+    klines = {}
+    for s in symbols:
+        w = archive.window(s, interval, start_ms, end_ms)
+        if len(w) == 0:
+            print(f"[BACKTEST] no archived klines for {s} {interval}")
+            continue
+        klines[s] = {name: w[name] for name in w.dtype.names}
+    return History.align(interval, klines, None, default_funding)
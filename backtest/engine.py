@@ -0,0 +1,138 @@
+import asyncio, math
+from typing import Dict
+import numpy as np
+import config
+from params import Params
+from risk.risk_mgr import RiskManager, stop_hit, add_due, trail_hit
+from strategies.batch import history_sides
+from strategies.signal_generator import generate_signal
+from backtest.data import History
+from backtest.sim import SimExchange, SimClient
+
+BARS_PER_YEAR = {"1m": 525_600, "5m": 105_120, "15m": 35_040, "30m": 17_520, "1h": 8_760, "4h": 2_190, "1d": 365}
+
+
+class BacktestResult:
+    def __init__(self, hist: History, ex: SimExchange, equity: np.ndarray, start_equity: float):
+        self.hist = hist
+        self.ex = ex
+        self.equity = equity
+        self.start_equity = start_equity
+
+    def stats(self) -> Dict[str, float]:
+        eq = self.equity
+        if len(eq) == 0:
+            return {"start_equity": self.start_equity, "final_equity": self.start_equity, "total_return": 0.0}
+        peak = np.maximum.accumulate(np.maximum(eq, self.start_equity))
+        dd = (peak - eq) / np.where(peak > 0, peak, 1.0)
+        rets = np.diff(eq, prepend=self.start_equity) / np.where(np.r_[self.start_equity, eq[:-1]] != 0,
+                                                                 np.r_[self.start_equity, eq[:-1]], 1.0)
+        sd = rets.std()
+        per_year = BARS_PER_YEAR.get(self.hist.interval, 35_040)
+        trades = np.array(self.ex.trades)
+        return {
+            "start_equity": self.start_equity,
+            "final_equity": float(eq[-1]),
+            "total_return": float(eq[-1] / self.start_equity - 1.0),
+            "max_drawdown": float(dd.max()),
+            "sharpe": float(rets.mean() / sd * math.sqrt(per_year)) if sd > 0 else 0.0,
+            "realized_pnl": self.ex.realized,
+            "fees": self.ex.fees,
+            "funding": self.ex.funding,
+            "fills": self.ex.fills,
+            "trades": len(trades),
+            "win_rate": float((trades > 0).mean()) if len(trades) else 0.0,
+            "liquidations": self.ex.liquidations,
+            "bars": len(eq),
+        }
+
+
+def run_fast(hist: History, start_equity: float = None, equity_ratio: float = None, leverage: int = None,
+             fee_rate: float = None, slippage: float = None, params: Params = None,
+             sides: np.ndarray = None) -> BacktestResult:
+    """
+    向量化快速路徑：整段歷史的訊號一次算出（strategies.batch），
+    出場 / 加碼規則用 risk_mgr 的 stop_hit / add_due / trail_hit 同時套用到所有持倉，
+    只有真正要下單的 symbol 才進 Python 迴圈。行為對應 scanner 每根 K 棒收盤跑一次 manage_symbol + monitor_all。
+    params 為 None 時用 config；sides 可傳入已算好的 history_sides（參數最佳化時同一組訊號參數共用）。
+    """
+    p = params or Params.from_config()
+    start_equity = config.BACKTEST_START_EQUITY if start_equity is None else start_equity
+    ratio = p.equity_ratio if equity_ratio is None else equity_ratio
+    lev = p.leverage if leverage is None else leverage
+    max_loss, add_thr = p.max_loss_pct, p.profit_add_threshold_pct
+    giveback, max_pyr = p.trailing_giveback_pct, p.max_pyramid
+
+    ex = SimExchange(hist.symbols, start_equity, fee_rate, slippage)
+    S, T = hist.close.shape
+    if sides is None: sides = history_sides(hist.close, hist.start, p)
+    fund_bars = np.flatnonzero(np.any(hist.funding != 0, axis=0))
+    is_fund = np.zeros(T, dtype=bool); is_fund[fund_bars] = True
+    hw = np.zeros(S); pyr = np.zeros(S, dtype=np.int64)
+    equity = np.empty(T)
+
+    def enter(i: int, side: int, price: float) -> bool:
+        qty = ex.wallet * ratio * lev / price
+        if qty <= 0: return False
+        ex.fill(i, side * qty, price)
+        return True
+
+    for t in range(T):
+        p = hist.close[:, t]
+        if is_fund[t]: ex.charge_funding(p, hist.funding[:, t])
+        if ex.liquidate(p):
+            hw[:] = 0.0; pyr[:] = 0
+
+        for i in np.flatnonzero(sides[:, t]):
+            enter(i, int(sides[i, t]), p[i])
+
+        open_idx = np.flatnonzero(ex.amt)
+        if len(open_idx):
+            a, e, pp = ex.amt[open_idx], ex.entry[open_idx], p[open_idx]
+            pr = a * (pp - e) / (np.abs(a) * e)
+            h = np.maximum(hw[open_idx], pr)
+            hw[open_idx] = h
+            stop = stop_hit(pr, max_loss)
+            add = ~stop & add_due(pr, pyr[open_idx], add_thr, max_pyr)
+            trail = ~stop & trail_hit(pr, h, giveback)
+            for j in np.flatnonzero(stop | add | trail):
+                i = open_idx[j]
+                if add[j] and enter(i, 1 if a[j] > 0 else -1, p[i]):
+                    pyr[i] += 1
+                if stop[j] or trail[j]:
+                    ex.close(i, p[i])
+            flat = ex.amt == 0
+            hw[flat] = 0.0; pyr[flat] = 0
+
+        equity[t] = ex.equity(p)
+    return BacktestResult(hist, ex, equity, start_equity)
+
+
+async def _replay(hist: History, start_equity: float, fee_rate, slippage) -> BacktestResult:
+    ex = SimExchange(hist.symbols, start_equity, fee_rate, slippage)
+    client = SimClient(hist, ex)
+    rm = RiskManager(client, protective=False)
+    S, T = hist.close.shape
+    equity = np.empty(T)
+    for t in range(T):
+        client.t = t
+        p = hist.close[:, t]
+        if np.any(hist.funding[:, t] != 0): ex.charge_funding(p, hist.funding[:, t])
+        ex.liquidate(p)
+        for i, s in enumerate(hist.symbols):
+            if t < hist.start[i]: continue
+            sig = await generate_signal(client, s)
+            if sig: await rm.execute_trade(s, sig)
+        await rm.monitor_all(hist.symbols)
+        equity[t] = ex.equity(p)
+    return BacktestResult(hist, ex, equity, start_equity)
+
+
+def run_replay(hist: History, start_equity: float = None, fee_rate: float = None,
+               slippage: float = None) -> BacktestResult:
+    """
+    忠實重播：每根 K 棒依序呼叫 generate_signal（已註冊策略）、RiskManager.execute_trade
+    與 monitor_all（SimClient 取代 BinanceClient）。較慢，作為 run_fast 的對照基準。
+    """
+    start_equity = config.BACKTEST_START_EQUITY if start_equity is None else start_equity
+    return asyncio.run(_replay(hist, start_equity, fee_rate, slippage))
@@ -0,0 +1,265 @@
+import argparse, hashlib, itertools, json, os, random, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, List
+
+os.environ.setdefault("OFFLINE_MODE", "1")
+
+import numpy as np
+import config
+from params import Params
+from strategies.batch import history_sides
+from backtest.data import History, load_history, load_archive_history
+from backtest.engine import run_fast
+
+GROUP_SIZE = 8   # 同一組訊號參數的風控組合最多幾個併成一個 task
+
+
+# ----- 參數空間 -----
+def parse_space(specs: List[str]) -> Dict[str, list]:
+    """
+    "trend_ema_fast=10,20,30" → 離散值；"max_loss_pct=0.3:0.8" → 連續區間（隨機搜尋用均勻分布）
+    """
+    space = {}
+    for spec in specs:
+        name, _, vals = spec.partition("=")
+        name = name.strip().lower()
+        if ":" in vals:
+            lo, hi = vals.split(":")
+            space[name] = (float(lo), float(hi))
+        else:
+            space[name] = [v.strip() for v in vals.split(",") if v.strip()]
+    return space
+
+
+def grid(space: Dict[str, list], base: Params = None) -> List[Params]:
+    base = base or Params.from_config()
+    names = list(space)
+    for n in names:
+        if isinstance(space[n], tuple): raise ValueError(f"grid search needs discrete values: {n}")
+    return [base.replace(**dict(zip(names, combo))) for combo in itertools.product(*(space[n] for n in names))]
+
+
+def sample(space: Dict[str, list], n: int, seed: int = 0, base: Params = None) -> List[Params]:
+    base = base or Params.from_config()
+    rng = random.Random(seed)
+    out, seen = [], set()
+    for _ in range(n * 20):
+        if len(out) >= n: break
+        kw = {k: (rng.uniform(*v) if isinstance(v, tuple) else rng.choice(v)) for k, v in space.items()}
+        p = base.replace(**kw)
+        if p.key() in seen: continue
+        seen.add(p.key()); out.append(p)
+    return out
+
+
+def valid(p: Params) -> bool:
+    return p.trend_ema_fast < p.trend_ema_slow and p.boll_window >= 2 and p.revert_rsi_oversold < p.revert_rsi_overbought
+
+
+# ----- 共享唯讀 K 線（worker 只 attach，不複製） -----
+_ARRAYS = ("times", "close", "start", "funding")
+
+
+class SharedHistory:
+    """把 History 的陣列放進 multiprocessing.shared_memory；worker 以 spec attach 成唯讀 view"""
+    def __init__(self, hist: History):
+        self.blocks = []
+        self.spec = {"symbols": hist.symbols, "interval": hist.interval, "arrays": {}}
+        for name in _ARRAYS:
+            arr = np.ascontiguousarray(getattr(hist, name))
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+            self.blocks.append(shm)
+            self.spec["arrays"][name] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close(); shm.unlink()
+        self.blocks = []
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+_worker = {}
+
+
+def _attach(spec) -> History:
+    arrays = {}
+    for name, (shm_name, shape, dtype) in spec["arrays"].items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        # 由主程序負責 unlink；spawn 的 worker 有自己的 resource_tracker，不取消登記會在結束時被誤刪
+        if multiprocessing.get_start_method() != "fork":
+            resource_tracker.unregister(shm._name, "shared_memory")
+        arr = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[name] = arr
+        _worker.setdefault("blocks", []).append(shm)
+    return History(spec["symbols"], spec["interval"], arrays["times"], arrays["close"], arrays["start"], arrays["funding"])
+
+
+def _init_worker(spec, run_kwargs):
+    _worker["hist"] = _attach(spec)
+    _worker["run_kwargs"] = run_kwargs
+
+
+def _evaluate_group(group: List[Dict]) -> List[Dict]:
+    """同一組訊號參數：history_sides 只算一次，再跑每組風控參數"""
+    hist, kw = _worker["hist"], _worker["run_kwargs"]
+    params = [Params.from_dict(d) for d in group]
+    t0 = time.perf_counter()
+    sides = history_sides(hist.close, hist.start, params[0])
+    out = []
+    for p in params:
+        stats = run_fast(hist, params=p, sides=sides, **kw).stats()
+        out.append({"key": p.key(), "params": p.as_dict(), "stats": stats})
+    dt = (time.perf_counter() - t0) / len(params)
+    for r in out: r["stats"]["seconds"] = dt
+    return out
+
+
+# ----- 結果檔（JSONL，可續跑） -----
+def fingerprint(hist: History, source: str = None, **run_kwargs) -> Dict:
+    """
+    結果檔第一行記錄的資料與回測設定：來源路徑、symbol、期間、K 線內容雜湊、起始資金 / 手續費 / 滑價 / 維持保證金。
+    任何一項不同，舊結果就不能拿來續跑
+    """
+    h = hashlib.sha1()
+    for name in _ARRAYS: h.update(np.ascontiguousarray(getattr(hist, name)).tobytes())
+    run = {"start_equity": config.BACKTEST_START_EQUITY, "fee_rate": config.BACKTEST_FEE_RATE,
+           "slippage": config.BACKTEST_SLIPPAGE, "maint_rate": config.BACKTEST_MAINT_MARGIN_RATE,
+           "brackets": config.BACKTEST_BRACKETS_FILE}
+    run.update({k: v for k, v in run_kwargs.items() if v is not None})
+    fp = {"source": os.path.abspath(source) if source else None, "symbols": list(hist.symbols),
+          "interval": hist.interval, "start": int(hist.times[0]) if len(hist.times) else None,
+          "end": int(hist.times[-1]) if len(hist.times) else None, "bars": len(hist.times),
+          "data_sha1": h.hexdigest(), "run": run}
+    return json.loads(json.dumps(fp))   # 與讀回的 JSON 同型別（tuple → list）
+
+
+def load_results(path: str, fp: Dict = None) -> Dict[str, Dict]:
+    """讀回已完成的組合；給 fp 時第一行的 fingerprint 必須相同，否則拒絕續跑（ValueError）"""
+    done = {}
+    if not path or not os.path.exists(path) or os.path.getsize(path) == 0: return done
+    with open(path) as f:
+        for i, line in enumerate(f):
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue   # 中斷時寫到一半的最後一行
+            if i == 0 and fp is not None and r.get("fingerprint") != fp:
+                old = r.get("fingerprint") or {}
+                diff = sorted(k for k in set(fp) | set(old) if fp.get(k) != old.get(k)) or ["fingerprint missing"]
+                raise ValueError(f"{path} was produced with different data / settings ({', '.join(diff)}); "
+                                 f"use another --out or remove it")
+            if "key" in r: done[r["key"]] = r
+    return done
+
+
+def _groups(todo: List[Params]) -> List[List[Dict]]:
+    by_sig: Dict[tuple, List[Params]] = {}
+    for p in todo:
+        by_sig.setdefault(p.signal_key(), []).append(p)
+    out = []
+    for ps in by_sig.values():
+        for i in range(0, len(ps), GROUP_SIZE):
+            out.append([p.as_dict() for p in ps[i:i + GROUP_SIZE]])
+    return out
+
+
+def optimize(hist: History, combos: List[Params], out_path: str = None, workers: int = None,
+             source: str = None, **run_kwargs) -> List[Dict]:
+    """
+    平行評估所有參數組合（ProcessPoolExecutor），結果逐筆 append 到 out_path；
+    已在 out_path 的組合直接略過（中斷後重跑即續跑）。回傳所有結果（含先前的）。
+    out_path 第一行為 fingerprint(hist, source, run_kwargs)：資料或回測設定不同時拒絕續跑。
+    """
+    fp = fingerprint(hist, source, **run_kwargs) if out_path else None
+    done = load_results(out_path, fp)
+    todo = [p for p in dict.fromkeys(combos) if valid(p) and p.key() not in done]
+    results = list(done.values())
+    print(f"[OPTIMIZE] {len(combos)} combos, {len(done)} already done, {len(todo)} to run")
+    if not todo: return results
+
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    f = open(out_path, "a") if out_path else None
+    if f and f.tell() == 0:
+        f.write(json.dumps({"fingerprint": fp}) + "\n")
+    try:
+        with SharedHistory(hist) as sh, ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                            initargs=(sh.spec, run_kwargs)) as ex:
+            futs = [ex.submit(_evaluate_group, g) for g in _groups(todo)]
+            n = 0
+            for fut in as_completed(futs):
+                for r in fut.result():
+                    results.append(r); n += 1
+                    if f: f.write(json.dumps(r) + "\n")
+                if f: f.flush()
+                el = time.perf_counter() - t0
+                print(f"[OPTIMIZE] {n}/{len(todo)} done, {n / el:.2f} combos/s")
+    finally:
+        if f: f.close()
+    return results
+
+
+def rank(results: List[Dict], by: str = "sharpe", descending: bool = True) -> List[Dict]:
+    return sorted(results, key=lambda r: r["stats"].get(by, float("-inf")), reverse=descending)
+
+
+def print_table(results: List[Dict], varied: List[str], by: str, top: int = 20):
+    cols = ["total_return", "max_drawdown", "sharpe", "trades", "win_rate"]
+    if by not in cols: cols.insert(0, by)
+    print(" ".join(["rank"] + [f"{c:>14}" for c in varied + cols]))
+    for i, r in enumerate(results[:top], 1):
+        vals = [r["params"][c] for c in varied] + [r["stats"].get(c, float("nan")) for c in cols]
+        print(" ".join([f"{i:>4}"] + [f"{v:>14.4f}" if isinstance(v, float) else f"{v:>14}" for v in vals]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="策略 / 風控參數平行最佳化（grid 或 random search）")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--data", help="K 線資料夾（{SYMBOL}_{interval}.csv|.json）")
+    src.add_argument("--archive", nargs="?", const=config.CANDLE_ARCHIVE_DIR, help="本地 K 線封存目錄")
+    ap.add_argument("--start", type=int); ap.add_argument("--end", type=int)
+    ap.add_argument("--symbols", nargs="*", default=config.SYMBOL_POOL)
+    ap.add_argument("--interval", default=config.KLINE_INTERVAL)
+    ap.add_argument("--param", action="append", default=[], required=True,
+                    help='參數空間，可重複：trend_ema_fast=10,20,30 或 max_loss_pct=0.3:0.8')
+    ap.add_argument("--random", type=int, default=0, help="隨機搜尋組數（0 = 完整 grid）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default="optimize_results.jsonl", help="結果檔（JSONL，可續跑）")
+    ap.add_argument("--rank", default="sharpe")
+    ap.add_argument("--ascending", action="store_true", help="指標越小越好（如 max_drawdown）")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--equity", type=float, default=config.BACKTEST_START_EQUITY)
+    ap.add_argument("--fee", type=float, default=config.BACKTEST_FEE_RATE)
+    ap.add_argument("--slippage", type=float, default=config.BACKTEST_SLIPPAGE)
+    ap.add_argument("--funding", type=float, default=config.BACKTEST_FUNDING_RATE)
+    args = ap.parse_args()
+
+    space = parse_space(args.param)
+    combos = sample(space, args.random, args.seed) if args.random else grid(space)
+    if args.archive:
+        from storage.candle_archive import CandleArchive
+        hist = load_archive_history(CandleArchive(args.archive), args.symbols, args.interval, args.start, args.end,
+                                    default_funding=args.funding)
+    else:
+        hist = load_history(args.data, args.symbols, args.interval, default_funding=args.funding)
+    print(f"[OPTIMIZE] {len(hist.symbols)} symbols × {len(hist.times)} bars ({args.interval})")
+
+    try:
+        res = optimize(hist, combos, args.out, args.workers, source=args.data or args.archive,
+                       start_equity=args.equity, fee_rate=args.fee, slippage=args.slippage)
+    except ValueError as e:
+        ap.error(str(e))
+    keys = {p.key() for p in combos}
+    ranked = rank([r for r in res if r["key"] in keys], args.rank, not args.ascending)
+    print_table(ranked, list(space), args.rank, args.top)
+
+
+if __name__ == "__main__":
+    main()
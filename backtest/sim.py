@@ -0,0 +1,180 @@
+import json
+from decimal import Decimal
+from typing import List, Optional
+import numpy as np
+import config
+from exchange.account import AccountSnapshot
+from exchange.kline_store import KlineStore
+from risk.margin import LeverageBrackets
+from backtest.data import History
+
+
+def load_brackets(path: str) -> LeverageBrackets:
+    """leverageBracket 回應的 JSON 檔（與 risk.margin 相同格式）"""
+    brackets = LeverageBrackets(None)
+    with open(path) as f: brackets.load(json.load(f))
+    return brackets
+
+
+class SimExchange:
+    """
+    單向持倉、全倉模式的模擬帳戶：市價成交含滑價與手續費，另計資金費率。
+    維持保證金依 leverage bracket（名目 × mmr - cum，同 risk.margin）；未給 brackets 時讀 BACKTEST_BRACKETS_FILE，
+    沒有 bracket 的 symbol 以 BACKTEST_MAINT_MARGIN_RATE 計
+    """
+    def __init__(self, symbols: List[str], equity: float, fee_rate: float = None, slippage: float = None,
+                 brackets: LeverageBrackets = None, maint_rate: float = None):
+        self.symbols = symbols
+        self.index = {s: i for i, s in enumerate(symbols)}
+        self.fee_rate = config.BACKTEST_FEE_RATE if fee_rate is None else fee_rate
+        self.slippage = config.BACKTEST_SLIPPAGE if slippage is None else slippage
+        self.amt = np.zeros(len(symbols))
+        self.entry = np.zeros(len(symbols))
+        self.wallet = float(equity)
+        self.fees = self.funding = self.realized = 0.0
+        self.fills = 0
+        self.trades: List[float] = []   # 每次減倉 / 平倉的已實現損益（未扣手續費）
+        self.liquidations = 0
+        if brackets is None and config.BACKTEST_BRACKETS_FILE:
+            brackets = load_brackets(config.BACKTEST_BRACKETS_FILE)
+        self.maint_rate = config.BACKTEST_MAINT_MARGIN_RATE if maint_rate is None else maint_rate
+        # 每個 symbol 的 (cap, mmr, cum)，依名目升冪
+        self.tiers = [[(float(b.cap), float(b.mmr), float(b.cum)) for b in brackets.get(s)] if brackets else []
+                      for s in symbols]
+
+    def fill(self, i: int, qty: float, price: float) -> float:
+        if qty == 0: return 0.0
+        fp = price * (1.0 + self.slippage if qty > 0 else 1.0 - self.slippage)
+        fee = abs(qty) * fp * self.fee_rate
+        self.wallet -= fee; self.fees += fee; self.fills += 1
+        a, e = self.amt[i], self.entry[i]
+        if a == 0 or (a > 0) == (qty > 0):
+            new = a + qty
+            self.entry[i] = (a * e + qty * fp) / new
+            self.amt[i] = new
+            return fp
+        closed = min(abs(qty), abs(a)) * (1.0 if a > 0 else -1.0)
+        pnl = closed * (fp - e)
+        self.wallet += pnl; self.realized += pnl; self.trades.append(pnl)
+        rest = a + qty
+        if abs(rest) <= 1e-12 * max(abs(a), 1.0):
+            self.amt[i] = 0.0; self.entry[i] = 0.0
+        else:
+            self.amt[i] = rest
+            if (rest > 0) != (a > 0): self.entry[i] = fp   # 反手
+        return fp
+
+    def close(self, i: int, price: float):
+        if self.amt[i] != 0: self.fill(i, -self.amt[i], price)
+
+    def unrealized(self, prices: np.ndarray) -> np.ndarray:
+        return np.where(self.amt != 0, self.amt * (prices - self.entry), 0.0)
+
+    def equity(self, prices: np.ndarray) -> float:
+        return self.wallet + float(self.unrealized(prices).sum())
+
+    def maint_margin(self, prices: np.ndarray) -> float:
+        total = 0.0
+        for i in np.flatnonzero(self.amt):
+            n = abs(float(self.amt[i])) * float(prices[i])
+            if not self.tiers[i]:
+                total += n * self.maint_rate
+                continue
+            for cap, mmr, cum in self.tiers[i]:
+                if n < cap: break
+            total += n * mmr - cum
+        return total
+
+    def liquidate(self, prices: np.ndarray) -> bool:
+        """權益 <= 維持保證金時以目前價格強平所有持倉；穿倉的部分由保險基金吸收（錢包不低於 0）"""
+        if not self.amt.any() or self.equity(prices) > self.maint_margin(prices): return False
+        for i in np.flatnonzero(self.amt): self.close(i, prices[i])
+        self.wallet = max(self.wallet, 0.0)
+        self.liquidations += 1
+        return True
+
+    def charge_funding(self, prices: np.ndarray, rates: np.ndarray):
+        pay = float(np.where(self.amt != 0, self.amt * prices * rates, 0.0).sum())   # 多單在正費率時支付
+        self.wallet -= pay; self.funding += pay
+
+
+class SimClient:
+    """
+    離線版 BinanceClient：供 strategies 與 RiskManager 使用的同名非同步方法，
+    資料來自 History 中目前模擬時間（bar t）以前的 K 線，下單進 SimExchange。
+    """
+    def __init__(self, hist: History, ex: SimExchange):
+        self.hist = hist
+        self.ex = ex
+        self.t = 0
+        self.kline_store = KlineStore(self, capacity=config.KLINE_LIMIT, min_refresh_sec=0, clock=self.clock)
+
+    def clock(self) -> float:
+        return (int(self.hist.times[self.t]) + self.hist.interval_ms) / 1000.0
+
+    def _price(self, symbol: str) -> float:
+        return float(self.hist.close[self.ex.index[symbol], self.t])
+
+    # ----- market -----
+    async def get_klines(self, symbol: str, interval: str = None, limit: int = None,
+                         start_time: int = None, end_time: int = None):
+        i = self.ex.index[symbol]
+        lo, hi = int(self.hist.start[i]), self.t + 1
+        if start_time is not None:
+            lo = max(lo, int(np.searchsorted(self.hist.times, start_time)))
+        if limit: lo = max(lo, hi - limit)
+        iv = self.hist.interval_ms
+        return [[int(ot), c, c, c, c, 0.0, int(ot) + iv - 1]
+                for ot, c in zip(self.hist.times[lo:hi], self.hist.close[i, lo:hi])]
+
+    async def get_price(self, symbol: str) -> Optional[Decimal]:
+        return Decimal(str(self._price(symbol)))
+
+    async def change_leverage(self, symbol: str, leverage: int):
+        return None
+
+    async def get_symbol_filters(self, symbol: str):
+        return None
+
+    async def _quantize_qty(self, symbol: str, qty: Decimal) -> Decimal:
+        return qty
+
+    # ----- account -----
+    def _position(self, symbol: str) -> dict:
+        i = self.ex.index[symbol]
+        amt, entry, p = float(self.ex.amt[i]), float(self.ex.entry[i]), self._price(symbol)
+        return {"entryPrice": Decimal(str(entry)), "positionAmt": Decimal(str(amt)),
+                "unrealizedProfit": Decimal(str(amt * (p - entry))), "leverage": Decimal(config.LEVERAGE),
+                "markPrice": Decimal(str(p))}
+
+    async def get_equity(self) -> Decimal:
+        return Decimal(str(self.ex.wallet))
+
+    async def get_position(self, symbol: str) -> Optional[dict]:
+        return self._position(symbol)
+
+    async def account_snapshot(self) -> AccountSnapshot:
+        open_syms = [self.ex.symbols[i] for i in np.flatnonzero(self.ex.amt)]
+        w = Decimal(str(self.ex.wallet))
+        return AccountSnapshot({s: self._position(s) for s in open_syms}, w, w)
+
+    def invalidate_snapshot(self):
+        pass
+
+    # ----- orders -----
+    def _fill(self, symbol: str, qty: float):
+        fp = self.ex.fill(self.ex.index[symbol], qty, self._price(symbol))
+        return {"symbol": symbol, "status": "FILLED", "executedQty": str(abs(qty)), "avgPrice": str(fp)}
+
+    async def open_long(self, symbol: str, qty: Decimal):
+        if qty <= 0: return None
+        return self._fill(symbol, float(qty))
+
+    async def open_short(self, symbol: str, qty: Decimal):
+        if qty <= 0: return None
+        return self._fill(symbol, -float(qty))
+
+    async def close_position(self, symbol: str, pos: Optional[dict] = None):
+        amt = float(self.ex.amt[self.ex.index[symbol]])
+        if amt == 0: return None
+        return self._fill(symbol, -amt)
@@ -0,0 +1,189 @@
+import argparse, asyncio, json, os, platform, subprocess, sys, tempfile, threading, time
+
+# mock server 與子程序都會 import config：離線執行不需要真的 API 金鑰
+os.environ.setdefault("OFFLINE_MODE", "1")
+
+from bench.mock_fapi import MockFapi
+
+DEFAULT_SYMBOLS = (8, 50, 200, 500)
+SCENARIOS = ("scanner", "hedge_engine", "scheduler")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# 子程序固定的環境：只走 REST、不開背景 stream / metrics，候選不被成交額門檻擋掉（N 個 symbol 全進掃描）
+CHILD_ENV = {
+    "MARKET_DATA_MODE": "rest", "USER_STREAM_ENABLED": "false", "WATCHDOG_ENABLED": "false",
+    "METRICS_PORT": "0", "METRICS_JSON_PATH": "", "CANDLE_ARCHIVE_ENABLED": "false",
+    "STATE_ENABLED": "false", "SYMBOL_POOL_MODE": "list", "VOLUME_MIN_USD": "0", "FUNDING_RATE_MIN": "-1",
+}
+
+# 與 baseline 比較的欄位（warm = 第 2 輪起的中位數 / 平均）
+COMPARED = (("warm", "wall_ms"), ("warm", "requests"), ("warm", "indicator_cpu_ms"), ("cold", "wall_ms"),
+            ("cold", "requests"), (None, "peak_rss_mb"))
+
+
+class ServerThread:
+    """mock fapi 跑在獨立執行緒的 event loop：不和受測程序搶同一個 loop / CPU 計時"""
+    def __init__(self, mock: MockFapi):
+        self.mock = mock
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self) -> str:
+        self.thread.start()
+        return self.call(self.mock.start())
+
+    def reset(self, symbols: int, positions: float):
+        async def _reset(): self.mock.reset(symbols, positions)
+        self.call(_reset())
+
+    def stop(self):
+        self.call(self.mock.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def run_one(url: str, spec: dict, verbose: bool = False) -> dict:
+    env = {**os.environ, **CHILD_ENV, "BINANCE_BASE_URL": url}
+    env.setdefault("DEBUG_MODE", "false")
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        path = f.name
+    try:
+        out = None if verbose else subprocess.DEVNULL
+        subprocess.run([sys.executable, "-m", "bench.runner", json.dumps(spec), path], env=env,
+                       stdout=out, stderr=out if not verbose else None, check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with open(path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(path)
+
+
+def _get(r: dict, section, field):
+    src = r if section is None else (r.get(section) or {})
+    return src.get(field)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, request_tolerance: float):
+    """回傳 [(key, 欄位, 基準, 目前, 變化比例, 是否退步)]；時間 / 記憶體超過 tolerance、請求數超過 request_tolerance 算退步"""
+    rows = []
+    for key, r in results.items():
+        b = baseline.get(key)
+        if b is None: continue
+        for section, field in COMPARED:
+            new, old = _get(r, section, field), _get(b, section, field)
+            if new is None or old is None: continue
+            change = (new - old) / old if old else 0.0
+            limit = request_tolerance if field == "requests" else tolerance
+            rows.append((key, f"{section}.{field}" if section else field, old, new, change, change > limit + 1e-9))
+    return rows
+
+
+def print_table(results: dict):
+    print(f"{'run':<20} {'cold ms':>9} {'warm ms':>9} {'req/cyc':>8} {'cpu ms':>8} {'ind cpu':>8} "
+          f"{'errors':>6} {'rss MB':>7}")
+    for key, r in results.items():
+        w = r["warm"] or r["cold"]
+        print(f"{key:<20} {r['cold']['wall_ms']:>9.1f} {w['wall_ms']:>9.1f} {w['requests']:>8.1f} "
+              f"{w['cpu_ms']:>8.1f} {w['indicator_cpu_ms']:>8.2f} {w['errors']:>6.1f} {r['peak_rss_mb']:>7.1f}")
+        by = ", ".join(f"{e}={n:g}" for e, n in sorted(w["by_endpoint"].items(), key=lambda kv: -kv[1]))
+        print(f"{'':<20}   requests: {by}")
+        if w.get("phases_ms"):
+            print(f"{'':<20}   phases ms: " + ", ".join(f"{p}={v:.1f}" for p, v in sorted(w["phases_ms"].items())))
+        if w.get("scheduler"):
+            print(f"{'':<20}   scheduler: " + ", ".join(f"{t}={n:g}" for t, n in w["scheduler"].items()))
+        if "restore_ms" in r: print(f"{'':<20}   restore from state: {r['restore_ms']:.1f} ms")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="離線效能基準：本機 mock fapi + scanner / HedgeEngine 多輪量測")
+    ap.add_argument("--symbols", default=",".join(map(str, DEFAULT_SYMBOLS)), help="逗號分隔的 symbol 數量")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗號分隔：{', '.join(SCENARIOS)}")
+    ap.add_argument("--cycles", type=int, default=4, help="每組輪數（第 1 輪為冷啟動，其餘取中位數）")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="回 503 的請求比例")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="回 429 的請求比例")
+    ap.add_argument("--positions", type=float, default=0.1, help="開局即有持倉的 symbol 比例")
+    ap.add_argument("--warm-start", action="store_true",
+                    help="另跑重啟情境（key 加 +warm）：先跑一輪寫入狀態檔，重建 client 從狀態檔恢復後才開始量測")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save", action="store_true", help="把本次結果寫入 baseline（同 key 覆寫）")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="時間 / 記憶體允許的退步比例")
+    ap.add_argument("--request-tolerance", type=float, default=0.05,
+                    help="請求數允許的增加比例（帳戶快照重抓次數與成交時序有關，略有浮動）")
+    ap.add_argument("--check", action="store_true", help="有退步時 exit code 1")
+    ap.add_argument("--out", help="另存本次完整結果（JSON）")
+    ap.add_argument("--verbose", action="store_true", help="顯示受測程序輸出")
+    args = ap.parse_args(argv)
+
+    settings = {k: getattr(args, k) for k in ("cycles", "latency_ms", "jitter_ms", "error_rate", "throttle_rate", "positions")}
+    server = ServerThread(MockFapi(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                                   throttle_rate=args.throttle_rate, positions=args.positions))
+    url = server.start()
+    print(f"[BENCH] mock fapi at {url}  {settings}")
+    results = {}
+    try:
+        for scenario in args.scenarios.split(","):
+            for n in (int(x) for x in args.symbols.split(",")):
+                server.reset(n, args.positions)
+                t0 = time.time()
+                r = run_one(url, {"scenario": scenario, "symbols": n, "cycles": args.cycles}, args.verbose)
+                results[f"{scenario}/{n}"] = r
+                print(f"[BENCH] {scenario}/{n} done in {time.time() - t0:.1f}s")
+                if args.warm_start:
+                    server.reset(n, args.positions)
+                    r = run_one(url, {"scenario": scenario, "symbols": n, "cycles": args.cycles, "warm_start": True},
+                                args.verbose)
+                    results[f"{scenario}/{n}+warm"] = r
+                    print(f"[BENCH] {scenario}/{n}+warm done, restore {r['restore_ms']:.1f}ms")
+    finally:
+        server.stop()
+
+    print()
+    print_table(results)
+
+    meta = {"git": _git_rev(), "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "settings": settings}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+
+    regressed = False
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            base = json.load(f)
+        if base.get("meta", {}).get("settings") != settings:
+            print(f"\n[BENCH] warning: baseline settings differ {base.get('meta', {}).get('settings')}")
+        rows = compare(results, base.get("results", {}), args.tolerance, args.request_tolerance)
+        if rows:
+            print(f"\nvs baseline {args.baseline} (git {base.get('meta', {}).get('git', '?')}):")
+            for key, field, old, new, change, bad in rows:
+                print(f"{key:<20} {field:<22} {old:>10.1f} → {new:>10.1f}  {change * 100:+7.1f}%{'  REGRESSION' if bad else ''}")
+            regressed = any(r[-1] for r in rows)
+
+    if args.save:
+        base = {"meta": meta, "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                base["results"] = json.load(f).get("results", {})
+        base["results"].update({k: {kk: v for kk, v in r.items() if kk != "per_cycle"} for k, r in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump(base, f, indent=1)
+        print(f"\n[BENCH] baseline saved → {args.baseline}")
+
+    if args.check and regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse, json, os, random, time, tracemalloc
+
+os.environ.setdefault("OFFLINE_MODE", "1")
+
+import numpy as np
+from exchange.kline_decoder import KlineDecoder, ALL_FIELDS
+from exchange.kline_store import KlineBuffer
+
+COLUMNS = ["open_time", "open", "high", "low", "close", "volume", "close_time",
+           "quote_volume", "trades", "taker_base", "taker_quote", "ignore"]
+
+
+def make_body(rows: int, seed: int = 7) -> bytes:
+    """與 /fapi/v1/klines 同格式的回應（價量為字串）"""
+    rnd, px, t0 = random.Random(seed), 100.0, 1_700_000_000_000
+    out = []
+    for i in range(rows):
+        o = px; px *= 1 + rnd.gauss(0, 0.002)
+        ot = t0 + i * 900_000
+        out.append([ot, f"{o:.4f}", f"{max(o, px) * 1.001:.4f}", f"{min(o, px) * 0.999:.4f}", f"{px:.4f}",
+                    f"{rnd.uniform(1e3, 1e5):.3f}", ot + 899_999, f"{rnd.uniform(1e5, 1e7):.4f}",
+                    rnd.randint(100, 5000), f"{rnd.uniform(1e2, 1e4):.3f}", f"{rnd.uniform(1e4, 1e6):.4f}", "0"])
+    return json.dumps(out).encode()
+
+
+def pandas_path(body: bytes):
+    """原本 strategies 的 _klines_to_df：12 欄 DataFrame、5 次 astype(float)、to_datetime，最後只讀 close"""
+    import pandas as pd
+    df = pd.DataFrame(json.loads(body), columns=COLUMNS)
+    for c in ("open", "high", "low", "close", "volume"):
+        df[c] = df[c].astype(float)
+    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
+    return df["close"].to_numpy()
+
+
+class RowBuffer(KlineBuffer):
+    """上一版 KlineBuffer.ingest：逐列逐欄寫入 NumPy scalar（對照組）"""
+    def ingest(self, klines) -> int:
+        return self._ingest_rows(klines)
+
+
+def _paths(rows: int):
+    try:
+        import pandas  # noqa: F401
+        yield "pandas DataFrame", pandas_path
+    except ImportError:
+        print("[BENCH] pandas 未安裝，略過 DataFrame 對照組")
+    row = RowBuffer(rows, KlineDecoder(ALL_FIELDS))
+    yield "row-wise ingest (7 cols)", lambda body: (row.reset(), row.ingest(json.loads(body)))
+    for fields in (ALL_FIELDS, ("open_time", "close")):
+        buf = KlineBuffer(rows, KlineDecoder(fields))
+        yield f"decoder ({len(fields)} cols)", lambda body, buf=buf: (buf.reset(), buf.ingest(json.loads(body)))
+
+
+def measure(fn, body: bytes, repeat: int) -> dict:
+    fn(body)   # 暖機：decoder 暫存區在第一次呼叫配置
+    t0 = time.perf_counter()
+    for _ in range(repeat): fn(body)
+    us = (time.perf_counter() - t0) / repeat * 1e6
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us": us, "peak_kb": peak / 1024}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="K 線解碼基準：pandas DataFrame / 逐列寫入 / KlineDecoder（含 json.loads）")
+    ap.add_argument("--rows", default="2,200,1000", help="逗號分隔的每次回應筆數（2 = 增量同步，200 = KLINE_LIMIT）")
+    ap.add_argument("--repeat", type=int, default=500)
+    args = ap.parse_args(argv)
+    print(f"{'path':26} {'rows':>5} {'us/call':>9} {'peak KB':>8}")
+    for rows in (int(x) for x in args.rows.split(",")):
+        body = make_body(rows)
+        base = measure(lambda b: json.loads(b), body, args.repeat)
+        print(f"{'json.loads only':26} {rows:5d} {base['us']:9.1f} {base['peak_kb']:8.1f}")
+        for name, fn in _paths(rows):
+            r = measure(fn, body, args.repeat)
+            print(f"{name:26} {rows:5d} {r['us']:9.1f} {r['peak_kb']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
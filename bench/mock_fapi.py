@@ -0,0 +1,391 @@
+import argparse, asyncio, json, math, random, time
+from typing import Dict, List, Optional
+import numpy as np
+from aiohttp import web
+from exchange.kline_store import interval_ms
+from exchange.rate_limiter import request_cost
+from exchange.transport import ENDPOINTS
+
+START_MS = 1_704_067_200_000   # 2024-01-01 00:00 UTC：模擬時鐘起點（固定 → 每次跑出相同行情）
+UNIT_MS = 900_000              # 行情函數的時間單位（15m）；各週期 K 線都取樣同一條價格曲線
+ROUTES = {(m, p): name for name, (m, p, _) in ENDPOINTS.items()}
+
+
+def symbol_names(n: int) -> List[str]:
+    return [f"S{i:03d}USDT" for i in range(n)]
+
+
+def _fmt(x: float, prec: int = 8) -> str:
+    return f"{x:.{prec}f}"
+
+
+class MockMarket:
+    """
+    確定性的合成行情：price(i, t) 為三個不同週期正弦疊加的對數價格（t 以 UNIT_MS 計），
+    平滑連續，週期夠短讓 EMA / MACD / 布林帶在幾十根內出現交叉。
+    """
+    def __init__(self, n: int, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.symbols = symbol_names(n)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.base = np.exp(rng.uniform(math.log(0.01), math.log(50000), n))
+        self.amp = rng.uniform(0.02, 0.08, (n, 3))
+        self.period = rng.uniform([40, 9, 2.5], [90, 25, 6], (n, 3))
+        self.phase = rng.uniform(0, 2 * math.pi, (n, 3))
+        self.volume = np.exp(rng.uniform(math.log(2e7), math.log(5e9), n))
+        self.funding = rng.uniform(-0.0005, 0.001, n)
+
+    def price(self, i: int, t) -> np.ndarray:
+        t = np.asarray(t, dtype=np.float64)[..., None]
+        x = (self.amp[i] * np.sin(t / self.period[i] * 2 * math.pi + self.phase[i])).sum(axis=-1)
+        return self.base[i] * np.exp(x)
+
+    def precision(self, i: int):
+        """(price precision, qty precision)：大致比照實盤（BTC 0.1 / 0.001）"""
+        mag = math.floor(math.log10(self.base[i]))
+        return min(max(5 - mag, 1), 8), min(max(mag - 1, 0), 8)
+
+    def brackets(self, i: int) -> List[tuple]:
+        """(notional cap, max leverage, mmr)：第一級上限隨成交額縮放（大幣種放得比較寬），比照實盤的階梯"""
+        base = 10 ** round(math.log10(self.volume[i] / 2000))
+        return [(base * k, lev, mmr) for k, lev, mmr in
+                ((1, 50, 0.01), (5, 25, 0.02), (20, 20, 0.025), (50, 10, 0.05), (200, 5, 0.1), (1000, 1, 0.25))]
+
+    def klines(self, i: int, iv: int, first: int, count: int, now_ms: int) -> list:
+        opens = first + np.arange(count, dtype=np.int64) * iv
+        opens = opens[opens <= now_ms]
+        if not len(opens): return []
+        t0 = opens / UNIT_MS
+        t1 = np.minimum(opens + iv, now_ms) / UNIT_MS   # 未收盤 K 棒收在現在價格
+        o, c = self.price(i, t0), self.price(i, t1)
+        mid = self.price(i, (t0 + t1) / 2)
+        hi = np.maximum(np.maximum(o, c), mid) * 1.001
+        lo = np.minimum(np.minimum(o, c), mid) * 0.999
+        pp, _ = self.precision(i)
+        vol = self.volume[i] / 96 / self.base[i]
+        return [[int(ot), _fmt(a, pp), _fmt(b, pp), _fmt(d, pp), _fmt(e, pp), _fmt(vol, 3), int(ot + iv - 1),
+                 _fmt(vol * e, 2), 1000, _fmt(vol / 2, 3), _fmt(vol * e / 2, 2), "0"]
+                for ot, a, b, d, e in zip(opens, o, hi, lo, c)]
+
+
+class MockFapi:
+    """
+    本機 USDⓈ-M Futures REST 替身（只實作 BinanceClient 用到的 endpoint）：
+    - 行情由 MockMarket 依模擬時鐘產生；/_bench/advance 推進時鐘（每輪掃描前推進 SCAN_INTERVAL）
+    - MARKET 單以標記價立即成交並更新持倉 / 權益（扣 taker 手續費、檢查保證金與 leverage bracket 上限）；
+      STOP / TRAILING 單只掛著（不撮合）
+    - latency_ms ± jitter_ms 延遲；error_rate 比例回 503（-1001）、throttle_rate 比例回 429（-1003, Retry-After）
+    - 以 request_cost 計算權重並回 X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-*；超過 weight_limit 也回 429
+    - 每個 endpoint 的請求數由 /_bench/stats 取得（/_bench/* 不計入）
+    """
+    def __init__(self, symbols: int = 50, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, positions: float = 0.1,
+                 equity: float = 10000.0, weight_limit: int = 2400, seed: int = 7, fee_rate: float = 0.0004):
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.weight_limit = weight_limit
+        self.fee_rate = fee_rate
+        self.seed = seed
+        self._runner: Optional[web.AppRunner] = None
+        self.port = 0
+        self.reset(symbols, positions, equity)
+
+    def reset(self, symbols: int, positions: float = 0.1, equity: float = 10000.0):
+        self.market = MockMarket(symbols, self.seed)
+        self.rng = random.Random(self.seed)
+        self._offset_ms = 0
+        self._started = time.time()
+        self.wallet = equity
+        self.leverage: Dict[str, int] = {}
+        self.positions: Dict[str, list] = {}   # symbol → [amt, entry]
+        self.orders: Dict[int, dict] = {}
+        self._order_id = 0
+        self.counts: Dict[str, int] = {}
+        self.errors = 0
+        self._window = {"1m": [0, 0], "10s": [0, 0], "o1m": [0, 0]}   # 視窗起點 → 已用量
+        self._seed_positions(positions)
+
+    # ----- 模擬時鐘 -----
+    def now_ms(self) -> int:
+        return START_MS + int((time.time() - self._started) * 1000) + self._offset_ms
+
+    def advance(self, ms: int) -> int:
+        self._offset_ms += int(ms)
+        return self.now_ms()
+
+    def mark(self, symbol: str) -> float:
+        return float(self.market.price(self.market.index[symbol], self.now_ms() / UNIT_MS))
+
+    def _seed_positions(self, fraction: float):
+        """依序種下虧損（觸發停損）、獲利（觸發加碼）、持平三種持倉，讓 monitor_all 每條路徑都會走到"""
+        n = int(len(self.market.symbols) * fraction)
+        for k, s in enumerate(self.market.symbols[:n]):
+            mark = self.mark(s)
+            _, qp = self.market.precision(self.market.index[s])
+            amt = round(max(20.0 / mark, 10 ** -qp), qp) * (1 if k % 2 == 0 else -1)
+            pr = (-0.7, 0.5, 0.05)[k % 3]
+            self.positions[s] = [amt, mark / (1 + pr) if amt > 0 else mark / (1 - pr)]
+
+    # ----- 帳戶 -----
+    def _upnl(self, s: str, p) -> float:
+        return p[0] * (self.mark(s) - p[1])
+
+    def _margin(self) -> float:
+        return sum(abs(p[0]) * p[1] / self.leverage.get(s, 20) for s, p in self.positions.items())
+
+    def _max_notional(self, s: str, lev: int) -> float:
+        return max((cap for cap, ml, _ in self.market.brackets(self.market.index[s]) if ml >= lev), default=0.0)
+
+    def _position_row(self, s: str) -> dict:
+        amt, entry = self.positions.get(s, (0.0, 0.0))
+        mark = self.mark(s)
+        pp, _ = self.market.precision(self.market.index[s])
+        return {"symbol": s, "positionAmt": repr(amt), "entryPrice": _fmt(entry, pp), "markPrice": _fmt(mark, pp),
+                "unRealizedProfit": _fmt(amt * (mark - entry)), "leverage": str(self.leverage.get(s, 20)),
+                "marginType": "cross", "positionSide": "BOTH", "updateTime": self.now_ms()}
+
+    def _fill(self, s: str, side: str, qty: float, reduce_only: bool):
+        amt, entry = self.positions.get(s, (0.0, 0.0))
+        d = qty if side == "BUY" else -qty
+        if reduce_only and (amt == 0 or amt * d > 0):
+            raise _Reject(400, -2022, "ReduceOnly Order is rejected.")
+        if reduce_only and abs(d) > abs(amt): d = -amt
+        mark = self.mark(s)
+        lev, fee = self.leverage.get(s, 20), abs(d) * mark * self.fee_rate
+        if amt * d >= 0:   # 開倉 / 加碼
+            if abs(amt + d) * mark > self._max_notional(s, lev):
+                raise _Reject(400, -2027, "Exceeded the maximum allowable position at current leverage.")
+            if abs(d) * mark / lev + fee > self.wallet - self._margin():
+                raise _Reject(400, -2019, "Margin is insufficient.")
+            new = amt + d
+            entry = (abs(amt) * entry + abs(d) * mark) / abs(new)
+        else:              # 減倉 / 平倉
+            closed = min(abs(d), abs(amt))
+            self.wallet += closed * (mark - entry) * (1 if amt > 0 else -1)
+            new = amt + d
+            if amt * new < 0: entry = mark
+        self.wallet -= fee
+        if abs(new) < 1e-12: self.positions.pop(s, None)
+        else: self.positions[s] = [new, entry]
+        return mark, abs(d)
+
+    # ----- 權重 / 錯誤注入 -----
+    def _use(self, key: str, span_ms: int, n: int) -> int:
+        w, now = self._window[key], self.now_ms()
+        start = now - now % span_ms
+        if w[0] != start: w[0], w[1] = start, 0
+        w[1] += n
+        return w[1]
+
+    async def _dispatch(self, request: web.Request):
+        name = ROUTES.get((request.method, request.path))
+        if name is None:
+            return web.json_response({"code": -1000, "msg": f"unknown path {request.method} {request.path}"}, status=404)
+        self.counts[name] = self.counts.get(name, 0) + 1
+        params = dict(request.query)
+        cost_params = {**params, "batchOrders": json.loads(params["batchOrders"])} if "batchOrders" in params else params
+        weight, orders = request_cost(name, cost_params)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(self._use("1m", 60_000, weight))}
+        if orders:
+            headers["X-MBX-ORDER-COUNT-10S"] = str(self._use("10s", 10_000, orders))
+            headers["X-MBX-ORDER-COUNT-1M"] = str(self._use("o1m", 60_000, orders))
+        delay = self.latency_ms + (self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0: await asyncio.sleep(delay / 1000)
+        r = self.rng.random()
+        if r < self.throttle_rate or int(headers["X-MBX-USED-WEIGHT-1M"]) > self.weight_limit:
+            self.errors += 1
+            return web.json_response({"code": -1003, "msg": "Too many requests."}, status=429,
+                                     headers={**headers, "Retry-After": "1"})
+        if r < self.throttle_rate + self.error_rate:
+            self.errors += 1
+            return web.json_response({"code": -1001, "msg": "Internal error; unable to process your request."},
+                                     status=503, headers=headers)
+        try:
+            data = getattr(self, "_h_" + name)(params)
+        except _Reject as e:
+            self.errors += 1
+            return web.json_response({"code": e.code, "msg": e.msg}, status=e.status, headers=headers)
+        return web.json_response(data, headers=headers)
+
+    # ----- endpoints -----
+    def _symbols(self, params) -> List[str]:
+        s = params.get("symbol")
+        if s is None: return self.market.symbols
+        if s not in self.market.index: raise _Reject(400, -1121, "Invalid symbol.")
+        return [s]
+
+    def _h_exchange_info(self, params):
+        out = []
+        for i, s in enumerate(self.market.symbols):
+            pp, qp = self.market.precision(i)
+            out.append({"symbol": s, "status": "TRADING", "contractType": "PERPETUAL", "quoteAsset": "USDT",
+                        "pricePrecision": pp, "quantityPrecision": qp, "filters": [
+                            {"filterType": "PRICE_FILTER", "tickSize": _fmt(10 ** -pp), "minPrice": _fmt(10 ** -pp)},
+                            {"filterType": "LOT_SIZE", "stepSize": _fmt(10 ** -qp), "minQty": _fmt(10 ** -qp),
+                             "maxQty": "10000000"},
+                            {"filterType": "MIN_NOTIONAL", "notional": "5"}]})
+        return {"timezone": "UTC", "serverTime": self.now_ms(), "symbols": out}
+
+    def _one_or_all(self, params, row):
+        rows = [row(s) for s in self._symbols(params)]
+        return rows[0] if params.get("symbol") is not None else rows
+
+    def _h_ticker_price(self, params):
+        return self._one_or_all(params, lambda s: {"symbol": s, "price": repr(self.mark(s)), "time": self.now_ms()})
+
+    def _h_ticker_24hr(self, params):
+        def row(s):
+            i, p = self.market.index[s], self.mark(s)
+            return {"symbol": s, "lastPrice": repr(p), "quoteVolume": _fmt(self.market.volume[i], 2),
+                    "volume": _fmt(self.market.volume[i] / p, 3), "closeTime": self.now_ms()}
+        return self._one_or_all(params, row)
+
+    def _h_premium_index(self, params):
+        def row(s):
+            p = self.mark(s)
+            return {"symbol": s, "markPrice": repr(p), "indexPrice": repr(p),
+                    "lastFundingRate": _fmt(self.market.funding[self.market.index[s]]),
+                    "nextFundingTime": self.now_ms() + 3_600_000, "time": self.now_ms()}
+        return self._one_or_all(params, row)
+
+    def _h_klines(self, params):
+        s = self._symbols(params)[0]
+        iv = interval_ms(params.get("interval", "15m"))
+        limit = min(int(params.get("limit", 500)), 1500)
+        now = self.now_ms()
+        if "startTime" in params:
+            first = int(params["startTime"]); first -= first % iv
+        else:
+            first = now - now % iv - (limit - 1) * iv
+        if "endTime" in params:
+            limit = min(limit, (int(params["endTime"]) - first) // iv + 1)
+        return self.market.klines(self.market.index[s], iv, first, max(limit, 0), now)
+
+    def _h_balance(self, params):
+        upnl = sum(self._upnl(s, p) for s, p in self.positions.items())
+        return [{"asset": "USDT", "balance": _fmt(self.wallet), "crossUnPnl": _fmt(upnl),
+                 "availableBalance": _fmt(self.wallet + min(upnl, 0) - self._margin())}]
+
+    def _h_position_risk(self, params):
+        return [self._position_row(s) for s in self._symbols(params)]
+
+    def _h_change_leverage(self, params):
+        s, lev = self._symbols(params)[0], int(params.get("leverage", 20))
+        amt, _ = self.positions.get(s, (0.0, 0.0))
+        if abs(amt) * self.mark(s) > self._max_notional(s, lev):
+            raise _Reject(400, -4028, "Leverage is not valid.")
+        self.leverage[s] = lev
+        return {"symbol": s, "leverage": lev, "maxNotionalValue": _fmt(self._max_notional(s, lev), 0)}
+
+    def _h_leverage_brackets(self, params):
+        def row(s):
+            rows, floor = [], 0.0
+            for k, (cap, lev, mmr) in enumerate(self.market.brackets(self.market.index[s]), 1):
+                rows.append({"bracket": k, "initialLeverage": lev, "notionalCap": cap, "notionalFloor": floor,
+                             "maintMarginRatio": mmr, "cum": 0.0})
+                floor = cap
+            return {"symbol": s, "brackets": rows}
+        return self._one_or_all(params, row)
+
+    def _h_commission_rate(self, params):
+        return {"symbol": self._symbols(params)[0], "makerCommissionRate": _fmt(self.fee_rate / 2),
+                "takerCommissionRate": _fmt(self.fee_rate)}
+
+    def _h_new_order(self, params):
+        s = self._symbols(params)[0]
+        qty, side, typ = float(params["quantity"]), params["side"], params.get("type", "MARKET")
+        self._order_id += 1
+        o = {"orderId": self._order_id, "symbol": s, "side": side, "type": typ, "origQty": params["quantity"],
+             "clientOrderId": params.get("newClientOrderId", f"mock-{self._order_id}"),
+             "reduceOnly": params.get("reduceOnly") == "true", "updateTime": self.now_ms()}
+        if typ != "MARKET":
+            o.update({k: params[k] for k in ("stopPrice", "activationPrice", "callbackRate", "workingType") if k in params})
+            if "activationPrice" in params: o["activatePrice"] = params["activationPrice"]
+            o["status"] = "NEW"
+            self.orders[self._order_id] = o
+            return o
+        price, filled = self._fill(s, side, qty, o["reduceOnly"])
+        o.update({"status": "FILLED", "executedQty": repr(filled), "avgPrice": repr(price)})
+        return o
+
+    def _h_batch_orders(self, params):
+        out = []
+        for o in json.loads(params.get("batchOrders") or "[]")[:5]:
+            try:
+                out.append(self._h_new_order({k: str(v) for k, v in o.items()}))
+            except _Reject as e:
+                out.append({"code": e.code, "msg": e.msg})
+        return out
+
+    def _h_cancel_order(self, params):
+        o = self.orders.pop(int(params.get("orderId", 0)), None)
+        if o is None: raise _Reject(400, -2011, "Unknown order sent.")
+        return {**o, "status": "CANCELED"}
+
+    def _h_get_orders(self, params):
+        s = params.get("symbol")
+        return [o for o in self.orders.values() if s is None or o["symbol"] == s]
+
+    def _h_new_listen_key(self, params):
+        return {"listenKey": "mock-listen-key"}
+
+    def _h_renew_listen_key(self, params):
+        return {}
+
+    # ----- /_bench 控制端點 -----
+    async def _advance(self, request):
+        return web.json_response({"now_ms": self.advance(int(request.query.get("ms", 0)))})
+
+    async def _stats(self, request):
+        return web.json_response({"requests": dict(self.counts), "total": sum(self.counts.values()),
+                                  "errors": self.errors, "positions": len(self.positions),
+                                  "open_orders": len(self.orders), "wallet": self.wallet, "now_ms": self.now_ms()})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/_bench/advance", self._advance)
+        app.router.add_get("/_bench/stats", self._stats)
+        app.router.add_route("*", "/fapi/{tail:.*}", self._dispatch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class _Reject(Exception):
+    def __init__(self, status: int, code: int, msg: str):
+        self.status, self.code, self.msg = status, code, msg
+
+
+async def _serve(args):
+    mock = MockFapi(args.symbols, args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.positions)
+    url = await mock.start(args.host, args.port)
+    print(f"[MOCK] {args.symbols} symbols at {url}  (BINANCE_BASE_URL={url})")
+    while True:
+        await asyncio.sleep(3600)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="本機 mock fapi（手動對 main.py 測試用；需 OFFLINE_MODE=1 或設定 API_KEY）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--symbols", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--positions", type=float, default=0.1, help="開局即有持倉的 symbol 比例")
+    try:
+        asyncio.run(_serve(ap.parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
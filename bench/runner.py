@@ -0,0 +1,162 @@
+import asyncio, json, os, resource, statistics, sys, tempfile, time
+from typing import Dict
+import aiohttp
+import config
+from bench.mock_fapi import symbol_names
+from engine.hedge_engine import HedgeEngine
+from engine.scheduler import Scheduler
+from exchange.binance_client import BinanceClient
+from exchange.rate_limiter import RateLimiter
+from main import scan_cycle, trade_candidates
+from monitoring import metrics
+from risk.risk_mgr import RiskManager
+from storage.state_store import StateStore
+import strategies.batch as batch
+from strategies.indicators import IndicatorEngine
+
+
+class SimClock:
+    """跟著 mock 模擬時鐘走的 time.time()：KlineStore / RateLimiter 用它，每輪推進 SCAN_INTERVAL 才會補 K 線、回補額度"""
+    def __init__(self):
+        self.delta = 0.0
+
+    def __call__(self) -> float:
+        return time.time() + self.delta
+
+    def set(self, now_ms: int):
+        self.delta = now_ms / 1000 - time.time()
+
+
+class IndicatorMeter:
+    """把指標計算函式包一層，累計其 process CPU 時間（批次：stack_closes + evaluate；逐一：IndicatorEngine.apply）"""
+    def __init__(self):
+        self.cpu = 0.0
+
+    def _wrap(self, fn):
+        def timed(*a, **kw):
+            t0 = time.process_time()
+            try: return fn(*a, **kw)
+            finally: self.cpu += time.process_time() - t0
+        return timed
+
+    def install(self):
+        batch.stack_closes = self._wrap(batch.stack_closes)
+        batch.evaluate = self._wrap(batch.evaluate)
+        IndicatorEngine.apply = self._wrap(IndicatorEngine.apply)
+
+
+def _phase_sums() -> Dict[str, float]:
+    return {dict(l).get("phase"): h.sum for (n, l), h in metrics.REGISTRY.histograms.items()
+            if n == "scan_phase_seconds"}
+
+
+def _sched_counts() -> Dict[str, float]:
+    return {dict(l).get("trigger"): v for (n, l), v in metrics.REGISTRY.counters.items()
+            if n == "scheduler_evaluations_total"}
+
+
+def _summarize(cycles: list) -> dict:
+    warm = cycles[1:]
+    out = {"cold": cycles[0], "warm": None}
+    if warm:
+        med = lambda k: statistics.median(c[k] for c in warm)
+        out["warm"] = {"wall_ms": med("wall_ms"), "cpu_ms": med("cpu_ms"), "indicator_cpu_ms": med("indicator_cpu_ms"),
+                       "requests": statistics.mean(c["requests"] for c in warm),
+                       "errors": statistics.mean(c["errors"] for c in warm),
+                       "phases_ms": {p: statistics.median(c["phases_ms"].get(p, 0.0) for c in warm)
+                                     for p in warm[-1]["phases_ms"]},
+                       "by_endpoint": {e: statistics.mean(c["by_endpoint"].get(e, 0) for c in warm)
+                                       for e in sorted({e for c in warm for e in c["by_endpoint"]})},
+                       "scheduler": {t: statistics.mean(c["scheduler"].get(t, 0) for c in warm)
+                                     for t in sorted({t for c in warm for t in c["scheduler"]})}}
+    return out
+
+
+def _build(clock, store=None):
+    client = BinanceClient(config.API_KEY or "bench", config.API_SECRET or "bench")
+    client.limiter = RateLimiter(clock=clock)
+    if client.transport is not None: client.transport.on_headers = client.limiter.observe
+    client.kline_store.clock = clock
+    return client, RiskManager(client, store=store)
+
+
+def _driver(scenario: str, client, rm):
+    watched = set(config.SYMBOL_POOL)
+    if scenario == "scanner":
+        return lambda: scan_cycle(client, rm, watched, len(config.SYMBOL_POOL))
+    if scenario == "hedge_engine":
+        return HedgeEngine(client, rm).run
+    if scenario == "scheduler":   # SCHEDULE_MODE=candle：每輪推進 SCAN_INTERVAL，只重算收盤 / 價格變動的 symbol
+        return Scheduler(client, rm, watched, len(config.SYMBOL_POOL), trade_candidates,
+                         clock=client.kline_store.clock).tick
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+async def run(spec: dict) -> dict:
+    """
+    在本程序內跑 spec["cycles"] 輪 spec["scenario"]，回傳每輪 wall / CPU / 指標 CPU / 請求數與峰值 RSS。
+    spec["warm_start"]：先以 StateStore 跑一輪並 checkpoint、關掉 client，再從同一個狀態檔重建後才開始量測（模擬重啟）
+    """
+    config.SYMBOL_POOL = symbol_names(spec["symbols"])
+    clock = SimClock()
+    tmp, store, restore_ms = None, None, None
+    async with aiohttp.ClientSession(config.BINANCE_BASE_URL) as admin:
+        async def call(method, path, **q):
+            async with admin.request(method, path, params={k: str(v) for k, v in q.items()}) as r:
+                return await r.json()
+
+        # 先對齊模擬時鐘再建 client：token bucket 的起始時間戳要和之後的 clock() 同一條時間軸
+        clock.set((await call("GET", "/_bench/stats"))["now_ms"])
+        if spec.get("warm_start"):
+            tmp = tempfile.mkdtemp(prefix="bench-state-")
+            store = StateStore(os.path.join(tmp, "state.db"))
+            client, rm = _build(clock, store)
+            await _driver(spec["scenario"], client, rm)()
+            store.checkpoint(client, rm)
+            await client.close(); store.close()
+            clock.set((await call("POST", "/_bench/advance", ms=config.SCAN_INTERVAL * 1000))["now_ms"])
+            t0 = time.perf_counter()
+            store = StateStore(os.path.join(tmp, "state.db"))
+            client, rm = _build(clock, store)
+            store.restore(client, rm)
+            restore_ms = (time.perf_counter() - t0) * 1000
+        else:
+            client, rm = _build(clock)
+        meter = IndicatorMeter()
+        meter.install()
+        drive = _driver(spec["scenario"], client, rm)
+
+        cycles = []
+        for _ in range(spec["cycles"]):
+            clock.set((await call("POST", "/_bench/advance", ms=config.SCAN_INTERVAL * 1000))["now_ms"])
+            before, phases, sched = await call("GET", "/_bench/stats"), _phase_sums(), _sched_counts()
+            t0, c0, i0 = time.perf_counter(), time.process_time(), meter.cpu
+            await drive()
+            wall, cpu, ind = time.perf_counter() - t0, time.process_time() - c0, meter.cpu - i0
+            after, phases2 = await call("GET", "/_bench/stats"), _phase_sums()
+            req = after["requests"]
+            cycles.append({"wall_ms": wall * 1000, "cpu_ms": cpu * 1000, "indicator_cpu_ms": ind * 1000,
+                           "requests": after["total"] - before["total"], "errors": after["errors"] - before["errors"],
+                           "phases_ms": {p: (v - phases.get(p, 0.0)) * 1000 for p, v in phases2.items()},
+                           "scheduler": {t: n - sched.get(t, 0) for t, n in _sched_counts().items()
+                                         if n - sched.get(t, 0)},
+                           "by_endpoint": {e: n - before["requests"].get(e, 0) for e, n in req.items()
+                                           if n - before["requests"].get(e, 0)},
+                           "positions": after["positions"]})
+    await client.close()
+    if store is not None:
+        store.close()
+        for f in os.listdir(tmp): os.unlink(os.path.join(tmp, f))
+        os.rmdir(tmp)
+    out = {"scenario": spec["scenario"], "symbols": spec["symbols"], "cycles": len(cycles),
+           "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+           **_summarize(cycles), "per_cycle": cycles}
+    if restore_ms is not None: out["restore_ms"] = restore_ms
+    return out
+
+
+if __name__ == "__main__":
+    # python -m bench.runner '<spec json>' <result path>（由 python -m bench 以子程序呼叫：每組量測獨立的峰值記憶體）
+    result = asyncio.run(run(json.loads(sys.argv[1])))
+    with open(sys.argv[2], "w") as f:
+        json.dump(result, f)
@@ -9,12 +9,29 @@ API_KEY = os.getenv("API_KEY") or os.getenv("BINANCE_API_KEY") or os.getenv("BIN
 API_SECRET = os.getenv("API_SECRET") or os.getenv("BINANCE_API_SECRET") or os.getenv("BINANCE_SECRET")
 TESTNET = os.getenv("TESTNET", "false").lower() in ("1", "true", "yes")
 
-if not API_KEY or not API_SECRET:
+# 離線模式（回測 / 參數最佳化）不需要 API 金鑰
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "false").lower() in ("1", "true", "yes")
+
+if (not API_KEY or not API_SECRET) and not OFFLINE_MODE:
     print("[ERROR] 請設定 API_KEY / API_SECRET（或 BINANCE_API_KEY / BINANCE_API_SECRET）")
     sys.exit(1)
 
 SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", "60"))
 
+# ===== REST 傳輸：aiohttp（原生 async，連線池）或 connector（UMFutures + executor）=====
+BINANCE_TRANSPORT = os.getenv("BINANCE_TRANSPORT", "aiohttp").lower()
+BINANCE_HTTP_LIMIT_PER_HOST = int(os.getenv("BINANCE_HTTP_LIMIT_PER_HOST", "50"))
+BINANCE_HTTP_TIMEOUT = float(os.getenv("BINANCE_HTTP_TIMEOUT", "10"))
+BINANCE_RECV_WINDOW = int(os.getenv("BINANCE_RECV_WINDOW", "5000"))
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "")   # 空字串 = 依 TESTNET；benchmark 時指向本機 mock（bench/mock_fapi.py）
+
+# ===== REST 頻率限制排程（Binance USDⓈ-M 預設上限；實際可用量 × RATE_LIMIT_SAFETY）=====
+RATE_LIMIT_WEIGHT_PER_MIN = int(os.getenv("RATE_LIMIT_WEIGHT_PER_MIN", "2400"))
+RATE_LIMIT_ORDERS_PER_10S = int(os.getenv("RATE_LIMIT_ORDERS_PER_10S", "300"))
+RATE_LIMIT_ORDERS_PER_MIN = int(os.getenv("RATE_LIMIT_ORDERS_PER_MIN", "1200"))
+RATE_LIMIT_SAFETY = float(os.getenv("RATE_LIMIT_SAFETY", "0.8"))
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "2"))   # 429 後依 Retry-After 重送次數
+
 SYMBOL_POOL: List[str] = [
     "BTCUSDT","ETHUSDT","SOLUSDT","XRPUSDT","ADAUSDT",
     "DOGEUSDT","1000PEPEUSDT","AVAXUSDT"
@@ -31,8 +48,15 @@ PROFIT_ADD_THRESHOLD_PCT = float(os.getenv("PROFIT_ADD_THRESHOLD_PCT", "0.40"))
 TRAILING_GIVEBACK_PCT = float(os.getenv("TRAILING_GIVEBACK_PCT", "0.20"))
 MAX_LOSS_PCT = float(os.getenv("MAX_LOSS_PCT", "0.65"))
 
+# exchange_info 快取秒數（過期後背景刷新）
+EXCHANGE_INFO_TTL = int(os.getenv("EXCHANGE_INFO_TTL", "3600"))
+
 KLINE_INTERVAL = os.getenv("KLINE_INTERVAL", "15m")
 KLINE_LIMIT = int(os.getenv("KLINE_LIMIT", "200"))
+# 同一 (symbol, interval) 在此秒數內重複讀取直接用本地 K 線快取
+KLINE_MIN_REFRESH_SEC = float(os.getenv("KLINE_MIN_REFRESH_SEC", "5"))
+# K 線 buffer 只解碼 / 保存這些欄位（open_time 一定保留）；策略只讀 close，其餘欄位需要時再加
+KLINE_FIELDS = [f.strip() for f in os.getenv("KLINE_FIELDS", "open_time,close").split(",") if f.strip()]
 
 TREND_EMA_FAST = int(os.getenv("TREND_EMA_FAST", "20"))
 TREND_EMA_SLOW = int(os.getenv("TREND_EMA_SLOW", "50"))
@@ -44,12 +68,96 @@ REVERT_RSI_OVERBOUGHT = int(os.getenv("REVERT_RSI_OVERBOUGHT", "65"))
 BOLL_WINDOW = int(os.getenv("BOLL_WINDOW", "20"))
 BOLL_STDDEV = float(os.getenv("BOLL_STDDEV", "2.0"))
 
+# 訊號計算：batch（所有候選疊成矩陣一次算）或 per_symbol（逐一 symbol 增量計算）
+SIGNAL_MODE = os.getenv("SIGNAL_MODE", "batch").lower()
+# per_symbol 路徑的特徵快照 LRU 上限（每個 (symbol, interval, K 棒) 一筆，所有註冊策略共用）
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "2048"))
+
 PYRAMID_BREAKOUT_ENABLED = os.getenv("PYRAMID_BREAKOUT_ENABLED", "true").lower() in ("1","true","yes")
 PYRAMID_BREAKOUT_LOOKBACK = int(os.getenv("PYRAMID_BREAKOUT_LOOKBACK", "20"))
 
 VOLUME_MIN_USD = float(os.getenv("VOLUME_MIN_USD", "10000000"))
 FUNDING_RATE_MIN = float(os.getenv("FUNDING_RATE_MIN", "-0.02"))
 
+# ===== 篩選模式：bulk（全市場 2 個請求）或 per_symbol（每個 symbol 2 個請求）=====
+SCREEN_MODE = os.getenv("SCREEN_MODE", "bulk").lower()
+# list = 使用 SYMBOL_POOL；all = 所有成交額 >= UNIVERSE_MIN_VOLUME_USD 的 USDT 永續
+SYMBOL_POOL_MODE = os.getenv("SYMBOL_POOL_MODE", "list").lower()
+UNIVERSE_MIN_VOLUME_USD = float(os.getenv("UNIVERSE_MIN_VOLUME_USD", str(VOLUME_MIN_USD)))
+UNIVERSE_MAX_SYMBOLS = int(os.getenv("UNIVERSE_MAX_SYMBOLS", "50"))
+
+# ===== 行情來源：rest（輪詢）或 ws（WebSocket 推送，REST 只做回補/備援）=====
+MARKET_DATA_MODE = os.getenv("MARKET_DATA_MODE", "rest").lower()
+WS_BASE_URL = os.getenv("WS_BASE_URL") or ("wss://stream.binancefuture.com" if TESTNET else "wss://fstream.binance.com")
+WS_STALE_SEC = float(os.getenv("WS_STALE_SEC", "10"))
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "200"))
+WS_HEARTBEAT_SEC = float(os.getenv("WS_HEARTBEAT_SEC", "30"))
+
+# ===== user data stream 帳戶鏡像 =====
+USER_STREAM_ENABLED = os.getenv("USER_STREAM_ENABLED", "false").lower() in ("1","true","yes")
+USER_STREAM_KEEPALIVE_SEC = int(os.getenv("USER_STREAM_KEEPALIVE_SEC", "1800"))
+USER_STREAM_RESYNC_SEC = int(os.getenv("USER_STREAM_RESYNC_SEC", "300"))
+
+# ===== 風控 watchdog（標記價 tick 觸發停損 / 移動停利 / 加碼）=====
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "false").lower() in ("1","true","yes")
+WATCHDOG_REFRESH_SEC = float(os.getenv("WATCHDOG_REFRESH_SEC", "2"))
+WATCHDOG_ADD_COOLDOWN_SEC = float(os.getenv("WATCHDOG_ADD_COOLDOWN_SEC", str(SCAN_INTERVAL)))
+
+# ===== 交易所端保護單（reduce-only STOP_MARKET / TRAILING_STOP_MARKET，標記價觸發）=====
+PROTECTIVE_ORDERS_ENABLED = os.getenv("PROTECTIVE_ORDERS_ENABLED", "false").lower() in ("1","true","yes")
+PROTECTIVE_TRAIL_ACTIVATION_PCT = float(os.getenv("PROTECTIVE_TRAIL_ACTIVATION_PCT", "0.10"))  # 獲利比例達此值才啟動追蹤
+PROTECTIVE_CALLBACK_RATE = float(os.getenv("PROTECTIVE_CALLBACK_RATE", "0"))   # %；0 = 依 TRAILING_GIVEBACK_PCT 換算
+PROTECTIVE_PRICE_TOLERANCE = float(os.getenv("PROTECTIVE_PRICE_TOLERANCE", "0.001"))  # 觸發價偏差超過此比例才改單
+
+# ===== 下單：sizing 資料預先備妥，同輪訊號以 batchOrders 合併送出 =====
+ORDER_BATCH_ENABLED = os.getenv("ORDER_BATCH_ENABLED", "true").lower() in ("1","true","yes")
+ORDER_BATCH_SIZE = int(os.getenv("ORDER_BATCH_SIZE", "5"))            # 交易所上限 5
+SIZING_MAX_AGE_SEC = float(os.getenv("SIZING_MAX_AGE_SEC", "10"))     # prepare 取得的價格 / 權益沿用秒數
+
+# ===== 本地保證金模型（leverage bracket / 可用保證金 / 手續費，送單前算出可成交的最大數量）=====
+LEVERAGE_BRACKET_TTL = float(os.getenv("LEVERAGE_BRACKET_TTL", "3600"))   # leverageBracket 快取秒數
+MARGIN_FEE_RATE = float(os.getenv("MARGIN_FEE_RATE", "0.0005"))           # 查不到 commissionRate 時的 taker 費率
+MARGIN_PRICE_BUFFER = float(os.getenv("MARGIN_PRICE_BUFFER", "0.001"))    # 市價單成交價偏離的估計
+MARGIN_ALLOCATION = os.getenv("MARGIN_ALLOCATION", "sequential").lower()  # 同輪多筆進場保證金不足時：sequential / proportional
+
+# ===== 狀態持久化（SQLite WAL）：風控狀態即時寫入、行情快取每輪快照，重啟後接續並暖機 =====
+STATE_ENABLED = os.getenv("STATE_ENABLED", "false").lower() in ("1","true","yes")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "data/state.db")
+STATE_DB_SYNC = os.getenv("STATE_DB_SYNC", "normal").lower()   # normal：程序崩潰不丟資料；full：斷電也不丟（每筆 fsync）
+
+# ===== 水平分片：coordinator（全域額度）＋ N 個 worker（python -m engine.cluster local|coordinator|worker）=====
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "2"))
+CLUSTER_ADDRESS = os.getenv("CLUSTER_ADDRESS", "unix:/tmp/hedge-cluster.sock")   # 或 host:port（跨主機）
+CLUSTER_MAX_EXPOSURE = float(os.getenv("CLUSTER_MAX_EXPOSURE", "0"))           # 全帳戶持倉名目價值上限（× equity），0 = 不限
+SYMBOL_TIMEOUT_SEC = float(os.getenv("SYMBOL_TIMEOUT_SEC", "10"))               # 單一 symbol 的 K 線同步超過即略過本輪，0 = 不限
+
+# ===== 排程：candle（K 棒收盤 / 價格變動才重算訊號，篩選與監控各自節奏）或 interval（每 SCAN_INTERVAL 整輪重跑）=====
+SCHEDULE_MODE = os.getenv("SCHEDULE_MODE", "candle").lower()
+EVAL_CLOSE_DELAY_SEC = float(os.getenv("EVAL_CLOSE_DELAY_SEC", "2"))     # K 棒收盤後等幾秒再算（交易所 K 線落定）
+EVAL_TICK_SEC = float(os.getenv("EVAL_TICK_SEC", "15"))                  # 兩次收盤之間檢查價格變動的間隔
+EVAL_PRICE_MOVE = float(os.getenv("EVAL_PRICE_MOVE", "0.005"))           # 即時價相對上次計算變動超過此比例即重算，0 = 只看收盤
+SCREEN_REFRESH_SEC = float(os.getenv("SCREEN_REFRESH_SEC", "300"))       # 篩選（shortlist）更新間隔
+MONITOR_INTERVAL_SEC = float(os.getenv("MONITOR_INTERVAL_SEC", "10"))    # 持倉監控（停損 / 移動停利 / 加碼）間隔
+
+# ===== 回測 =====
+BACKTEST_FEE_RATE = float(os.getenv("BACKTEST_FEE_RATE", "0.0005"))        # taker 手續費
+BACKTEST_SLIPPAGE = float(os.getenv("BACKTEST_SLIPPAGE", "0.0002"))        # 成交滑價（比例）
+BACKTEST_FUNDING_RATE = float(os.getenv("BACKTEST_FUNDING_RATE", "0.0001"))  # 無資金費率檔時每 8h 的預設值
+BACKTEST_START_EQUITY = float(os.getenv("BACKTEST_START_EQUITY", "10000"))
+BACKTEST_BRACKETS_FILE = os.getenv("BACKTEST_BRACKETS_FILE", "")                 # leverageBracket 回應（JSON），維持保證金率依名目分級
+BACKTEST_MAINT_MARGIN_RATE = float(os.getenv("BACKTEST_MAINT_MARGIN_RATE", "0.01"))  # 沒有 bracket 的 symbol 用的維持保證金率
+
+# ===== 本地 K 線封存（memmap） =====
+CANDLE_ARCHIVE_ENABLED = os.getenv("CANDLE_ARCHIVE_ENABLED", "false").lower() in ("1","true","yes")
+CANDLE_ARCHIVE_DIR = os.getenv("CANDLE_ARCHIVE_DIR", "data/candles")
+CANDLE_ARCHIVE_DAYS = int(os.getenv("CANDLE_ARCHIVE_DAYS", "30"))   # sync 指令預設回補天數
+
+# ===== 監控指標：本機 /metrics（Prometheus）與定期 JSON dump =====
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))            # 0 = 不開 HTTP
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "")        # 空字串 = 不寫檔
+METRICS_JSON_INTERVAL_SEC = float(os.getenv("METRICS_JSON_INTERVAL_SEC", "60"))
+
 DEBUG_MODE = os.getenv("DEBUG_MODE", "true").lower() in ("1","true","yes")
 
 print("=================================")
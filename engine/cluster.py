@@ -0,0 +1,328 @@
+import argparse, asyncio, itertools, json, os, signal, subprocess, sys, time, zlib
+from decimal import Decimal
+from typing import Dict, List, Optional
+import config
+from exchange.rate_limiter import MARKET, RateLimiter
+
+# 只轉送 coordinator 校正全域額度需要的 header
+_FORWARD_HEADERS = ("x-mbx-used-weight-1m", "x-mbx-order-count-10s", "x-mbx-order-count-1m")
+
+
+def shard_of(symbol: str, workers: int) -> int:
+    """symbol → worker index（crc32：跨程序 / 跨主機穩定，不受 PYTHONHASHSEED 影響）"""
+    return zlib.crc32(symbol.encode()) % max(workers, 1)
+
+
+async def _open(address: str):
+    if address.startswith("unix:"): return await asyncio.open_unix_connection(address[5:])
+    host, port = address.rsplit(":", 1)
+    return await asyncio.open_connection(host, int(port))
+
+
+def _encode(msg: dict) -> bytes:
+    return (json.dumps(msg, separators=(",", ":")) + "\n").encode()
+
+
+# ===== coordinator =====
+class RiskBudget:
+    """
+    全帳戶共用的保證金 / 總曝險額度（coordinator 端）：
+    - worker 每次取得帳戶快照就回報 available / equity / 持倉名目價值（以 coordinator 時鐘標記快照時間）
+    - grant() 從「最新快照 − 之後已核准的量」中核給比例 k（0~1），worker 依 k 縮量
+    - 總曝險上限 = equity × CLUSTER_MAX_EXPOSURE（0 = 不限，只管保證金）
+    """
+    def __init__(self, max_exposure: float = None):
+        self.max_exposure = config.CLUSTER_MAX_EXPOSURE if max_exposure is None else max_exposure
+        self.available: Optional[float] = None
+        self.equity = self.exposure = 0.0
+        self.as_of = 0.0
+        self.grants: List[tuple] = []   # (核准時間, margin, notional)
+
+    def report(self, available: float, equity: float, exposure: float, age: float = 0.0):
+        t = time.time() - age
+        if t < self.as_of: return   # 比手上的快照舊
+        self.available, self.equity, self.exposure, self.as_of = available, equity, exposure, t
+        self.grants = [g for g in self.grants if g[0] > t]
+
+    def grant(self, margin: float, notional: float) -> float:
+        if self.available is None: return 1.0   # 尚無帳戶資料：不擋（worker 本地 MarginPool 仍會限制）
+        k = 1.0
+        if margin > 0:
+            k = min(k, max(self.available - sum(g[1] for g in self.grants), 0.0) / margin)
+        if self.max_exposure > 0 and notional > 0:
+            room = self.equity * self.max_exposure - self.exposure - sum(g[2] for g in self.grants)
+            k = min(k, max(room, 0.0) / notional)
+        if k > 0: self.grants.append((time.time(), margin * k, notional * k))
+        return k
+
+
+class Coordinator:
+    """
+    中央分配器：一個 RateLimiter（所有 worker 共用的 IP weight / 下單數額度與優先順序佇列）＋ RiskBudget。
+    協定為換行分隔 JSON；帶 id 的請求各自一個 task 處理（acquire 可能要排隊，不阻塞同連線的其他請求）。
+    """
+    def __init__(self, address: str = None, limiter: RateLimiter = None, budget: RiskBudget = None):
+        self.address = address or config.CLUSTER_ADDRESS
+        self.limiter = limiter or RateLimiter()
+        self.budget = budget or RiskBudget()
+        self.workers: Dict[int, float] = {}   # index → 最後收到訊息的時間
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        if self.address.startswith("unix:"):
+            path = self.address[5:]
+            if os.path.exists(path): os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._handle, path)
+        else:
+            host, port = self.address.rsplit(":", 1)
+            self._server = await asyncio.start_server(self._handle, host, int(port))
+        print(f"[CLUSTER] coordinator listening on {self.address}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        worker = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                msg = json.loads(line)
+                if msg.get("op") == "hello":
+                    worker = msg.get("worker")
+                    print(f"[CLUSTER] worker {worker} connected")
+                if worker is not None: self.workers[worker] = time.time()
+                if "id" in msg: asyncio.ensure_future(self._reply(writer, msg))
+                else: self._notify(msg)
+        except (ConnectionError, ValueError) as e:
+            print(f"[CLUSTER] worker {worker} connection error: {e}")
+        finally:
+            self.workers.pop(worker, None)
+            writer.close()
+            print(f"[CLUSTER] worker {worker} disconnected")
+
+    def _notify(self, msg: dict):
+        op = msg.get("op")
+        if op == "observe": self.limiter.observe(msg.get("headers"))
+        elif op == "penalize": self.limiter.penalize(msg.get("status", 429), msg.get("retry_after", 0.0))
+        elif op == "account":
+            self.budget.report(msg["available"], msg["equity"], msg["exposure"], msg.get("age", 0.0))
+
+    async def _reply(self, writer, msg: dict):
+        op, out = msg.get("op"), {"id": msg["id"]}
+        try:
+            if op == "acquire":
+                self.requests += 1
+                await self.limiter.acquire(msg.get("weight", 1), msg.get("orders", 0), msg.get("level", MARKET))
+            elif op == "reserve":
+                out["grant"] = self.budget.grant(msg.get("margin", 0.0), msg.get("notional", 0.0))
+            elif op == "stats":
+                out.update(workers=sorted(self.workers), requests=self.requests, limiter=self.limiter.summary())
+        except Exception as e:
+            out["error"] = str(e)
+        if not writer.is_closing():
+            writer.write(_encode(out))
+
+    def summary(self) -> str:
+        b = self.budget
+        avail = f"{b.available:.2f}" if b.available is not None else "-"
+        return (f"workers={sorted(self.workers)} requests={self.requests} available={avail} "
+                f"granted={sum(g[1] for g in b.grants):.2f} | {self.limiter.summary()}")
+
+
+# ===== worker =====
+class Channel:
+    """worker 端的 IPC 連線：請求帶 id，多個 await 共用一條連線；斷線時 call() 丟 ConnectionError 並在背景重連"""
+    def __init__(self, address: str, worker: int):
+        self.address, self.worker = address, worker
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._reconnect: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        reader, self._writer = await _open(self.address)
+        asyncio.ensure_future(self._read_loop(reader))
+        self.send("hello", worker=self.worker)
+
+    async def _read_loop(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                msg = json.loads(line)
+                fut = self._pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done(): fut.set_result(msg)
+        except (ConnectionError, ValueError):
+            pass
+        self._writer = None
+        for fut in self._pending.values():
+            if not fut.done(): fut.set_exception(ConnectionError("coordinator disconnected"))
+        self._pending.clear()
+        print(f"[CLUSTER] lost coordinator {self.address}, falling back to local limits")
+        if self._reconnect is None or self._reconnect.done():
+            self._reconnect = asyncio.ensure_future(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        while not self.connected:
+            await asyncio.sleep(1.0)
+            try:
+                await self.connect()
+                print(f"[CLUSTER] reconnected to {self.address}")
+            except OSError:
+                pass
+
+    def send(self, op: str, **kw):
+        if self.connected: self._writer.write(_encode({"op": op, **kw}))
+
+    async def call(self, op: str, **kw) -> dict:
+        if not self.connected: raise ConnectionError("coordinator not connected")
+        i = next(self._ids)
+        fut = self._pending[i] = asyncio.get_running_loop().create_future()
+        self._writer.write(_encode({"id": i, "op": op, **kw}))
+        msg = await fut
+        if "error" in msg: raise RuntimeError(msg["error"])
+        return msg
+
+
+class RemoteLimiter(RateLimiter):
+    """
+    worker 端 limiter：額度向 coordinator 申請（全域同一組 token bucket 與優先順序佇列），
+    回應 header / 429 轉給 coordinator 校正。coordinator 斷線時退回本地限流，容量為全域的 1/workers。
+    """
+    def __init__(self, channel: Channel, workers: int):
+        share = 1.0 / max(workers, 1)
+        super().__init__(weight_per_min=max(int(config.RATE_LIMIT_WEIGHT_PER_MIN * share), 1),
+                         orders_per_10s=max(int(config.RATE_LIMIT_ORDERS_PER_10S * share), 1),
+                         orders_per_min=max(int(config.RATE_LIMIT_ORDERS_PER_MIN * share), 1))
+        self.channel = channel
+
+    async def acquire(self, weight: float, orders: int = 0, level: int = MARKET):
+        if self.channel.connected:
+            t0 = self.clock()
+            try:
+                await self.channel.call("acquire", weight=weight, orders=orders, level=level)
+                self._record(level, self.clock() - t0)
+                return
+            except ConnectionError:
+                pass
+        await super().acquire(weight, orders, level)
+
+    def observe(self, headers):
+        super().observe(headers)
+        if headers:
+            h = {k.lower(): v for k, v in headers.items() if k.lower() in _FORWARD_HEADERS}
+            if h: self.channel.send("observe", headers=h)
+
+    def penalize(self, status: int, retry_after: float = 0.0) -> float:
+        self.channel.send("penalize", status=status, retry_after=retry_after)
+        return super().penalize(status, retry_after)
+
+
+class RemoteBudget:
+    """OrderSizer.budget：帳戶快照回報給 coordinator，送單前申請全域保證金 / 曝險額度"""
+    def __init__(self, channel: Channel):
+        self.channel = channel
+
+    def report(self, snap, available: Decimal):
+        exposure = sum(abs(p["positionAmt"]) * p["markPrice"] for p in snap.positions.values())
+        self.channel.send("account", available=float(available), equity=float(snap.equity),
+                          exposure=float(exposure), age=snap.age())
+
+    async def reserve(self, symbol: str, margin: Decimal, notional: Decimal) -> Decimal:
+        """回傳核准比例（0~1）；coordinator 斷線時不擋"""
+        try:
+            r = await self.channel.call("reserve", symbol=symbol, margin=float(margin), notional=float(notional))
+            return Decimal(str(r["grant"]))
+        except (ConnectionError, RuntimeError):
+            return Decimal("1")
+
+
+class Worker:
+    """單一 shard：只管 shard_of(symbol) == index 的 symbol（掃描、下單、持倉監控、保護單、watchdog）"""
+    def __init__(self, index: int, workers: int, address: str = None):
+        self.index, self.workers = index, workers
+        self.channel = Channel(address or config.CLUSTER_ADDRESS, index)
+
+    def owns(self, symbol: str) -> bool:
+        return shard_of(symbol, self.workers) == self.index
+
+    async def connect(self, retries: int = 30):
+        for i in range(retries):
+            try:
+                return await self.channel.connect()
+            except OSError:
+                if i == retries - 1: raise
+                await asyncio.sleep(0.5)
+
+    def attach(self, client, rm):
+        client.limiter = RemoteLimiter(self.channel, self.workers)
+        if client.transport is not None: client.transport.on_headers = client.limiter.observe
+        rm.shard = self.owns
+        rm.sizer.budget = RemoteBudget(self.channel)
+
+    def state_path(self) -> str:
+        return f"{config.STATE_DB_PATH}.w{self.index}"
+
+
+# ===== 啟動 =====
+async def _coordinator(args):
+    coord = Coordinator(args.address)
+    await coord.start()
+    try:
+        while True:
+            await asyncio.sleep(config.SCAN_INTERVAL)
+            print(f"[CLUSTER] {coord.summary()}")
+    finally:
+        await coord.stop()
+
+
+async def _worker(args):
+    from main import scanner
+    worker = Worker(args.index, args.workers, args.address)
+    await worker.connect()
+    await scanner(worker)
+
+
+async def _local(args):
+    """單機：本程序當 coordinator，另開 --workers 個 worker 子程序；任一 worker 結束就全部停止"""
+    coord = Coordinator(args.address)
+    await coord.start()
+    procs = [subprocess.Popen([sys.executable, "-m", "engine.cluster", "worker", "--index", str(i),
+                               "--workers", str(args.workers), "--address", coord.address])
+             for i in range(args.workers)]
+    try:
+        while all(p.poll() is None for p in procs):
+            await asyncio.sleep(1.0)
+    finally:
+        for p in procs:
+            if p.poll() is None: p.send_signal(signal.SIGINT)
+        for p in procs:
+            try: p.wait(timeout=10)
+            except subprocess.TimeoutExpired: p.kill()
+        await coord.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="水平分片：python -m engine.cluster local|coordinator|worker")
+    ap.add_argument("role", choices=("local", "coordinator", "worker"))
+    ap.add_argument("--workers", type=int, default=config.CLUSTER_WORKERS)
+    ap.add_argument("--index", type=int, default=0, help="worker 的 shard 編號（0 ~ workers-1）")
+    ap.add_argument("--address", default=config.CLUSTER_ADDRESS, help="unix:/path 或 host:port")
+    args = ap.parse_args(argv)
+    run = {"local": _local, "coordinator": _coordinator, "worker": _worker}[args.role]
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("exiting")
+
+
+if __name__ == "__main__":
+    main()
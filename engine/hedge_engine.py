@@ -1,8 +1,7 @@
 # engine/hedge_engine.py
 import asyncio
 from strategies.filter import filter_symbols  # 原本就存在的輕量版篩選
-from strategies.trend import generate_trend_signal, should_pyramid
-from strategies.revert import generate_revert_signal
+from strategies.signal_generator import generate_signal
 
 class HedgeEngine:
     def __init__(self, client, risk_mgr):
@@ -16,14 +15,11 @@ class HedgeEngine:
 
         for symbol in symbols:
             try:
-                trend_sig = await generate_trend_signal(self.client, symbol)
-                revert_sig = await generate_revert_signal(self.client, symbol)
-                signal = trend_sig or revert_sig
+                signal = await generate_signal(self.client, symbol)
                 if signal:
                     print(f"[SIGNAL] {symbol} -> {signal}")
                     await self.risk_mgr.execute_trade(symbol, signal)
-                    if await should_pyramid(self.client, symbol, side_long=(signal=="LONG")):
-                        await self.risk_mgr.execute_trade(symbol, signal)
+                    # 突破加碼已移除（strategies.trend 不再提供 should_pyramid）；加碼由 RiskManager 獲利加碼處理
                 else:
                     print(f"[NO SIGNAL] {symbol} no entry")
             except Exception as e:
@@ -0,0 +1,149 @@
+import asyncio, time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+import config
+from exchange.kline_store import interval_ms
+from filters.symbol_filter import shortlist
+from monitoring import metrics
+
+
+class EvalGate:
+    """
+    (symbol, interval) 何時需要重算訊號：
+    - new：還沒算過
+    - closed：上次計算之後有 K 棒收盤（時間跨過 interval 邊界）
+    - moved：即時 K 棒價格相對上次計算時變動 >= move（0 = 只看收盤）
+    其餘情況 K 線與指標跟上次一樣（或只差一點即時價），重算結果相同，直接略過
+    """
+    def __init__(self, interval: str = None, move: float = None):
+        self.interval = interval or config.KLINE_INTERVAL
+        self.iv = interval_ms(self.interval)
+        self.move = config.EVAL_PRICE_MOVE if move is None else move
+        self._last: Dict[str, Tuple[int, float]] = {}   # symbol → (計算時即時 K 棒的 open_time, 價格)
+
+    def candle(self, now_ms: int) -> int:
+        return now_ms // self.iv * self.iv if self.iv else now_ms
+
+    def next_close(self, now_ms: int) -> int:
+        return self.candle(now_ms) + self.iv if self.iv else now_ms
+
+    def reason(self, symbol: str, now_ms: int, price: float = None) -> Optional[str]:
+        last = self._last.get(symbol)
+        if last is None: return "new"
+        if self.candle(now_ms) > last[0]: return "closed"
+        if self.move and price and last[1] and abs(price / last[1] - 1.0) >= self.move: return "moved"
+        return None
+
+    def mark(self, symbol: str, now_ms: int, price: float = None):
+        self._last[symbol] = (self.candle(now_ms), price or 0.0)
+
+    def retain(self, symbols: Sequence[str]):
+        keep = set(symbols)
+        for s in [s for s in self._last if s not in keep]: del self._last[s]
+
+
+class Scheduler:
+    """
+    SCHEDULE_MODE=candle 的主迴圈（取代固定 SCAN_INTERVAL 整輪重跑），三個節奏各自獨立：
+    - 篩選：每 SCREEN_REFRESH_SEC 更新一次候選
+    - 訊號 / 下單：下一根 K 棒收盤後 EVAL_CLOSE_DELAY_SEC、或每 EVAL_TICK_SEC 醒來，只算 EvalGate 判定要重算的 symbol
+    - 持倉監控：每 MONITOR_INTERVAL_SEC（與訊號下單互斥，不會同時對同一持倉動作）
+    trade(client, rm, symbols) 為實際的訊號 + 下單流程（main.trade_candidates）；after() 每次訊號輪結束後呼叫
+    """
+    def __init__(self, client, rm, watched: Set[str], max_candidates: int,
+                 trade: Callable[..., Awaitable], after: Callable[[], None] = None, clock=time.time):
+        self.client, self.rm = client, rm
+        self.watched = watched
+        self.max_candidates = max_candidates
+        self.trade = trade
+        self.after = after
+        self.clock = clock
+        self.gate = EvalGate()
+        self.candidates: List[str] = []
+        self._lock = asyncio.Lock()
+        self._screen_at = self._monitor_at = 0.0
+        self.last: Dict[str, int] = {}   # 最近一次訊號輪：各觸發原因的 symbol 數與 skipped
+
+    async def screen(self):
+        try:
+            with metrics.timer("scan_phase_seconds", phase="shortlist"):
+                candidates = await shortlist(self.client, max_candidates=self.max_candidates)
+        except Exception as e:
+            print(f"[ERROR] shortlist: {e}")
+            candidates = self.candidates or config.SYMBOL_POOL
+        self.candidates = [s for s in candidates if self.rm.owns(s)]
+        self.watched.update(self.candidates)
+        self.gate.retain(self.candidates)
+        metrics.set_gauge("scan_candidates", len(self.candidates))
+        self._screen_at = self.clock() + config.SCREEN_REFRESH_SEC
+
+    async def _prices(self) -> Dict[str, float]:
+        """價格變動觸發用：WS 模式讀 stream，REST 模式一次 ticker_price 全市場"""
+        stream = self.client.market_stream
+        if stream is not None:
+            return {s: float(p) for s in self.candidates if (p := stream.price(s)) is not None}
+        return {r["symbol"]: float(r["price"]) for r in await self.client.get_all_prices() if "price" in r}
+
+    async def evaluate(self):
+        now_ms = int((self.clock() - config.EVAL_CLOSE_DELAY_SEC) * 1000)   # 收盤後 delay 秒內仍視為上一根
+        prices = await self._prices() if self.gate.move and self.candidates else {}
+        due, reasons = [], Counter()
+        for s in self.candidates:
+            r = self.gate.reason(s, now_ms, prices.get(s))
+            if r is None: continue
+            due.append(s)
+            reasons[r] += 1
+            if r == "closed": self.client.kline_store.expire(s, self.gate.interval)   # 一定要抓到剛收盤的 K 棒
+        skipped = len(self.candidates) - len(due)
+        for r, n in list(reasons.items()) + [("skipped", skipped)]:
+            if n: metrics.inc("scheduler_evaluations_total", n, trigger=r)
+        self.last = {**reasons, "skipped": skipped}
+        print(f"[SCHED] evaluate {len(due)}/{len(self.candidates)} "
+              f"({', '.join(f'{r}={n}' for r, n in reasons.items()) or '-'}), skipped {skipped}")
+        if not due: return
+        async with self._lock:
+            self.client.invalidate_snapshot()
+            with metrics.timer("scan_phase_seconds", phase="evaluate"):
+                await self.trade(self.client, self.rm, due)
+        for s in due: self.gate.mark(s, now_ms, prices.get(s))
+
+    async def monitor(self):
+        async with self._lock:
+            self.client.invalidate_snapshot()
+            try:
+                with metrics.timer("scan_phase_seconds", phase="monitor_all"):
+                    await self.rm.monitor_all(sorted(self.watched))
+            except Exception as e:
+                print(f"[ERROR] monitor_all: {e}")
+        self._monitor_at = self.clock() + config.MONITOR_INTERVAL_SEC
+
+    async def tick(self):
+        """單輪：依目前時間做到期的篩選、訊號與監控（bench 以模擬時鐘逐輪呼叫）"""
+        if self.clock() >= self._screen_at: await self.screen()
+        await self.evaluate()
+        if self.clock() >= self._monitor_at: await self.monitor()
+        if self.after is not None: self.after()
+
+    def _eval_wait(self) -> float:
+        now = self.clock()
+        close = self.gate.next_close(int(now * 1000)) / 1000 + config.EVAL_CLOSE_DELAY_SEC
+        return max(min(close - now, config.EVAL_TICK_SEC), 0.5)
+
+    async def _loop(self, step: Callable[[], Awaitable], wait: Callable[[], float], first: float = 0.0):
+        await asyncio.sleep(first)
+        while True:
+            try: await step()
+            except Exception as e: print(f"[ERROR] scheduler {step.__name__}: {e}")
+            await asyncio.sleep(wait())
+
+    async def run(self):
+        await self.screen()
+
+        async def evaluate():
+            await self.evaluate()
+            if self.after is not None: self.after()
+
+        await asyncio.gather(
+            self._loop(self.screen, lambda: config.SCREEN_REFRESH_SEC, first=config.SCREEN_REFRESH_SEC),
+            self._loop(evaluate, self._eval_wait),
+            self._loop(self.monitor, lambda: config.MONITOR_INTERVAL_SEC))
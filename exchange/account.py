@@ -0,0 +1,57 @@
+import time
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+def parse_position(p: dict) -> dict:
+    return {
+        "entryPrice": _D(p.get("entryPrice", "0")),
+        "positionAmt": _D(p.get("positionAmt", "0")),
+        "unrealizedProfit": _D(p.get("unRealizedProfit", p.get("unrealizedProfit", "0"))),
+        "leverage": _D(p.get("leverage", "0")),
+        "markPrice": _D(p.get("markPrice", "0")),
+    }
+
+
+class AccountSnapshot:
+    """
+    某一時間點的帳戶快照（唯讀）：一次 position_risk() + 一次 balance() 取得所有 symbol。
+    position(symbol) 回傳與 BinanceClient.get_position 相同欄位的唯讀 mapping。
+    """
+    __slots__ = ("positions", "equity", "available", "taken_at")
+
+    def __init__(self, positions: Mapping[str, Mapping], equity: Decimal, available: Decimal, taken_at: float = None):
+        self.positions = MappingProxyType(dict(positions))
+        self.equity = equity
+        self.available = available
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+    @classmethod
+    def build(cls, position_risk: Iterable[dict], balances: Iterable[dict], asset: str = "USDT") -> "AccountSnapshot":
+        positions = {}
+        for p in position_risk or []:
+            sym = p.get("symbol")
+            if not sym: continue
+            view = parse_position(p)
+            # hedge mode 同一 symbol 有 LONG/SHORT 兩筆：優先保留有持倉的那筆
+            if sym not in positions or (positions[sym]["positionAmt"] == 0 and view["positionAmt"] != 0):
+                positions[sym] = MappingProxyType(view)
+        equity = available = Decimal("0")
+        for b in balances or []:
+            if b.get("asset") == asset:
+                equity = _D(b.get("balance", "0"))
+                available = _D(b.get("availableBalance", b.get("balance", "0")))
+        return cls(positions, equity, available)
+
+    def position(self, symbol: str) -> Optional[Mapping]:
+        return self.positions.get(symbol)
+
+    def open_symbols(self) -> List[str]:
+        return [s for s, p in self.positions.items() if p["positionAmt"] != 0]
+
+    def age(self) -> float:
+        return time.time() - self.taken_at
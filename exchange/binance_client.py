@@ -1,21 +1,112 @@
-import os, asyncio
+import os, asyncio, time
 from typing import Optional, Dict, Any
 from decimal import Decimal, getcontext
 from binance.um_futures import UMFutures
+from binance.error import ClientError
 import config
+from exchange.errors import map_error, BinanceAPIError, RateLimitError
+from exchange.rate_limiter import RateLimiter, PROTECT, CLASS_NAMES, priority, request_cost, request_priority
+from monitoring import metrics
+from exchange.transport import AsyncTransport
+from exchange.metadata import ExchangeMetadata, SymbolFilters
+from exchange.kline_store import KlineStore
+from exchange.account import AccountSnapshot, parse_position
 
 getcontext().prec = 28
 
+# connector 模式下，內部呼叫名稱 → UMFutures 方法名稱（binance-futures-connector 4.x）
+CONNECTOR_METHODS = {
+    "ticker_24hr": "ticker_24hr_price_change",
+    "premium_index": "mark_price",
+    "position_risk": "get_position_risk",
+    "batch_orders": "new_batch_order",
+}
+
 class BinanceClient:
     def __init__(self, api_key: str, api_secret: str, testnet: bool = False):
-        base_url = "https://testnet.binancefuture.com" if testnet else "https://fapi.binance.com"
+        base_url = config.BINANCE_BASE_URL or ("https://testnet.binancefuture.com" if testnet else "https://fapi.binance.com")
         self.client = UMFutures(key=api_key, secret=api_secret, base_url=base_url)
         self._sem = asyncio.Semaphore(int(os.getenv("BINANCE_MAX_CONCURRENCY", "5")))
+        self.transport = AsyncTransport(api_key, api_secret, base_url) if config.BINANCE_TRANSPORT == "aiohttp" else None
+        self.limiter = RateLimiter()
+        if self.transport is not None:
+            self.transport.on_headers = self.limiter.observe
+        self.metadata = ExchangeMetadata(self.exchange_info, ttl=config.EXCHANGE_INFO_TTL)
+        self.kline_store = KlineStore(self)
+        self.market_stream = None
+        self._snapshot: Optional[AccountSnapshot] = None
+        self._snapshot_lock = asyncio.Lock()
+        self.account_mirror = None
+
+    def attach_market_stream(self, stream):
+        """啟用 WS 行情：價格 / 資金費率 / 24h / K 線優先讀 stream 的記憶體狀態"""
+        self.market_stream = stream
+        self.kline_store.live = stream.kline_live if stream else None
+        if self.account_mirror is not None:
+            self.account_mirror.mark_price = stream.mark_price if stream else None
+
+    def attach_account_mirror(self, mirror):
+        """啟用 user data stream 帳戶鏡像：權益 / 持倉 / 帳戶快照直接讀本地（mirror.ready 時）"""
+        self.account_mirror = mirror
+        if mirror is not None and self.market_stream is not None:
+            mirror.mark_price = self.market_stream.mark_price
+
+    def _mirror(self):
+        m = self.account_mirror
+        return m if m is not None and m.ready else None
 
     async def _run(self, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        started = [t0]
+        def call():
+            started[0] = time.perf_counter()
+            return fn(*args, **kwargs)
         async with self._sem:
             loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+            try:
+                return await loop.run_in_executor(None, call)
+            finally:
+                metrics.observe("binance_executor_wait_seconds", started[0] - t0)
+
+    async def _send(self, name: str, **params):
+        if self.transport is not None:
+            return await self.transport.request(name, **params)
+        fn = getattr(self.client, CONNECTOR_METHODS.get(name, name))
+        try:
+            return await self._run(fn, **params)
+        except ClientError as e:
+            raise map_error(e.status_code, e.error_code, e.error_message, e.header)
+
+    async def _call(self, name: str, **params):
+        """
+        所有 REST 呼叫的單一入口：
+        - 先向 RateLimiter 依 endpoint 權重 / 優先順序取得額度；429 依 Retry-After 暫停佇列後重送
+        - aiohttp 模式：直接在 event loop 上送出（連線池 + 程序內簽章），不佔 executor thread
+        - connector 模式：UMFutures 丟到 executor 執行；ClientError 轉成相同的型別化例外
+        """
+        weight, orders = request_cost(name, params)
+        level = request_priority(name, params)
+        for attempt in range(config.RATE_LIMIT_RETRIES + 1):
+            t0 = time.perf_counter()
+            await self.limiter.acquire(weight, orders, level)
+            t1 = time.perf_counter()
+            metrics.observe("binance_ratelimit_wait_seconds", t1 - t0, priority=CLASS_NAMES[level])
+            try:
+                return await self._send(name, **params)
+            except RateLimitError as e:
+                metrics.inc("binance_request_errors_total", endpoint=name, code=e.code)
+                self.limiter.observe(e.headers)
+                self.limiter.penalize(e.status, e.retry_after)
+                if e.status != 429 or attempt >= config.RATE_LIMIT_RETRIES: raise
+            except Exception as e:
+                metrics.inc("binance_request_errors_total", endpoint=name, code=getattr(e, "code", type(e).__name__))
+                raise
+            finally:
+                metrics.observe("binance_request_seconds", time.perf_counter() - t1, endpoint=name)
+
+    async def close(self):
+        if self.transport is not None:
+            await self.transport.close()
 
     @staticmethod
     def _D(x) -> Decimal: return Decimal(str(x))
@@ -26,39 +117,66 @@ class BinanceClient:
 
     # ----- market/info -----
     async def exchange_info(self) -> Dict[str, Any]:
-        return await self._run(self.client.exchange_info)
+        return await self._call("exchange_info")
 
     async def get_symbol_info(self, symbol: str) -> Optional[dict]:
-        try:
-            info = await self.exchange_info()
-            for s in info.get("symbols", []):
-                if s.get("symbol") == symbol: return s
-        except Exception: pass
-        return None
+        try: return await self.metadata.get_raw(symbol)
+        except Exception: return None
+
+    async def get_symbol_filters(self, symbol: str) -> Optional[SymbolFilters]:
+        try: return await self.metadata.get(symbol)
+        except Exception: return None
 
     async def get_price(self, symbol: str) -> Optional[Decimal]:
+        if self.market_stream:
+            p = self.market_stream.price(symbol)
+            if p is not None: return p
         try:
-            res = await self._run(self.client.ticker_price, symbol=symbol)
+            res = await self._call("ticker_price", symbol=symbol)
             return self._D(res.get("price"))
         except Exception: return None
 
     async def get_24h_stats(self, symbol: str) -> Optional[dict]:
-        try: return await self._run(self.client.ticker_24hr, symbol=symbol)
+        if self.market_stream:
+            t = self.market_stream.ticker_24h(symbol)
+            if t is not None: return t
+        try: return await self._call("ticker_24hr", symbol=symbol)
         except Exception: return None
 
     async def get_premium_index(self, symbol: str) -> Optional[dict]:
-        try: return await self._run(self.client.premium_index, symbol=symbol)
+        if self.market_stream:
+            m = self.market_stream.premium_index(symbol)
+            if m is not None: return m
+        try: return await self._call("premium_index", symbol=symbol)
         except Exception: return None
 
-    async def get_klines(self, symbol: str, interval: str = None, limit: int = None):
+    async def get_all_24h_stats(self) -> list:
+        try: return await self._call("ticker_24hr") or []
+        except Exception: return []
+
+    async def get_all_prices(self) -> list:
+        try: return await self._call("ticker_price") or []
+        except Exception: return []
+
+    async def get_all_premium_index(self) -> list:
+        try: return await self._call("premium_index") or []
+        except Exception: return []
+
+    async def get_klines(self, symbol: str, interval: str = None, limit: int = None,
+                         start_time: int = None, end_time: int = None):
         interval = interval or config.KLINE_INTERVAL
         limit = limit or config.KLINE_LIMIT
-        return await self._run(self.client.klines, symbol=symbol, interval=interval, limit=limit)
+        kw = {}
+        if start_time is not None: kw["startTime"] = int(start_time)
+        if end_time is not None: kw["endTime"] = int(end_time)
+        return await self._call("klines", symbol=symbol, interval=interval, limit=limit, **kw)
 
     # ----- account/position -----
     async def get_equity(self) -> Decimal:
+        m = self._mirror()
+        if m is not None: return m.wallet_balance
         try:
-            balances = await self._run(self.client.balance)
+            balances = await self._call("balance")
             for b in balances:
                 if b.get("asset") == "USDT":
                     return self._D(b.get("balance"))
@@ -66,54 +184,121 @@ class BinanceClient:
         return Decimal("0")
 
     async def change_leverage(self, symbol: str, leverage: int):
-        try: return await self._run(self.client.change_leverage, symbol=symbol, leverage=leverage)
+        try: return await self._call("change_leverage", symbol=symbol, leverage=leverage)
+        except Exception: return None
+
+    async def get_leverage_brackets(self) -> list:
+        """所有 symbol 的 leverage bracket（不帶 symbol，一次取得）"""
+        return await self._call("leverage_brackets")
+
+    async def get_commission_rate(self, symbol: str) -> Optional[dict]:
+        try: return await self._call("commission_rate", symbol=symbol)
         except Exception: return None
 
     async def get_position(self, symbol: str) -> Optional[dict]:
+        m = self._mirror()
+        if m is not None: return m.position(symbol)
         try:
-            res = await self._run(self.client.position_risk, symbol=symbol)
+            res = await self._call("position_risk", symbol=symbol)
             if isinstance(res, list):
                 for p in res:
                     if p.get("symbol") == symbol:
-                        return {
-                            "entryPrice": self._D(p.get("entryPrice", "0")),
-                            "positionAmt": self._D(p.get("positionAmt", "0")),
-                            "unrealizedProfit": self._D(p.get("unRealizedProfit", p.get("unrealizedProfit", "0"))),
-                            "leverage": self._D(p.get("leverage", "0"))
-                        }
+                        return parse_position(p)
         except Exception: pass
         return None
 
+    async def account_snapshot(self) -> Optional[AccountSnapshot]:
+        """
+        本輪共用的帳戶快照（一次 position_risk + 一次 balance 涵蓋所有 symbol）。
+        invalidate_snapshot() 之後（新一輪 / 成交後）才會重新抓取。
+        """
+        m = self._mirror()
+        if m is not None: return m.snapshot()
+        snap = self._snapshot
+        if snap is not None: return snap
+        async with self._snapshot_lock:
+            if self._snapshot is not None: return self._snapshot
+            try:
+                positions, balances = await asyncio.gather(self._call("position_risk"),
+                                                           self._call("balance"))
+                self._snapshot = AccountSnapshot.build(positions, balances)
+            except Exception as e:
+                print(f"[CLIENT] account snapshot error: {e}")
+                return None
+            return self._snapshot
+
+    def invalidate_snapshot(self):
+        self._snapshot = None
+
+    async def get_open_orders(self, symbol: str = None) -> list:
+        m = self._mirror()
+        if m is not None:
+            return [o for o in m.open_orders.values() if symbol is None or o.get("symbol") == symbol]
+        return await self._call("get_orders", symbol=symbol)
+
+    async def cancel_order(self, symbol: str, order_id):
+        return await self._call("cancel_order", symbol=symbol, orderId=order_id)
+
+    async def new_listen_key(self) -> str:
+        res = await self._call("new_listen_key")
+        return res.get("listenKey")
+
+    async def keepalive_listen_key(self, listen_key: str):
+        return await self._call("renew_listen_key", listenKey=listen_key)
+
     # ----- order helpers -----
-    async def _lot_size_constraints(self, symbol_info: dict):
-        stepSize = minQty = minNotional = Decimal("0")
-        for f in symbol_info.get("filters", []):
-            if f.get("filterType") == "LOT_SIZE":
-                stepSize = self._D(f.get("stepSize")); minQty = self._D(f.get("minQty"))
-            if f.get("filterType") == "MIN_NOTIONAL":
-                minNotional = self._D(f.get("notional", f.get("minNotional", "0")))
-        return stepSize, minQty, minNotional
+    async def _lot_size_constraints(self, symbol: str):
+        f = await self.get_symbol_filters(symbol)
+        if not f: return Decimal("0"), Decimal("0"), Decimal("0")
+        return f.step_size, f.min_qty, f.min_notional
 
     async def _quantize_qty(self, symbol: str, qty: Decimal) -> Decimal:
-        info = await self.get_symbol_info(symbol)
-        if not info: return qty
-        step, minQty, _ = await self._lot_size_constraints(info)
-        q = self._floor_step(qty, step)
-        if q < minQty: return Decimal("0")
-        return q
+        f = await self.get_symbol_filters(symbol)
+        if not f: return qty
+        return f.quantize_qty(qty)
+
+    async def _new_order(self, **params):
+        try:
+            return await self._call("new_order", **params)
+        finally:
+            self.invalidate_snapshot()   # 有下單就讓下一次讀取重新抓帳戶
+
+    async def place_orders(self, orders: list) -> list:
+        """
+        batchOrders（一次最多 5 筆）：回傳與 orders 同順序的結果，
+        被拒的單筆換成對應的 BinanceAPIError 子類別（與單筆 new_order 丟出的例外相同）
+        """
+        try:
+            res = await self._call("batch_orders", batchOrders=[{k: str(v) for k, v in o.items()} for o in orders])
+        finally:
+            self.invalidate_snapshot()
+        out = []
+        for r in res or []:
+            if isinstance(r, dict) and isinstance(r.get("code"), int) and r["code"] < 0:
+                out.append(map_error(400, r["code"], r.get("msg", "")))
+            else:
+                out.append(r)
+        out += [BinanceAPIError(0, None, "missing batch result")] * (len(orders) - len(out))
+        return out
 
     async def open_long(self, symbol: str, qty: Decimal):
         q = await self._quantize_qty(symbol, qty)
         if q <= 0: return None
-        return await self._run(self.client.new_order, symbol=symbol, side="BUY", type="MARKET", quantity=str(q))
+        return await self._new_order(symbol=symbol, side="BUY", type="MARKET", quantity=str(q))
 
     async def open_short(self, symbol: str, qty: Decimal):
         q = await self._quantize_qty(symbol, qty)
         if q <= 0: return None
-        return await self._run(self.client.new_order, symbol=symbol, side="SELL", type="MARKET", quantity=str(q))
+        return await self._new_order(symbol=symbol, side="SELL", type="MARKET", quantity=str(q))
+
+    async def close_position(self, symbol: str, pos: Optional[dict] = None):
+        with priority(PROTECT):   # 持倉查詢、精度與平倉單都排在進場 / 掃描之前
+            return await self._close_position(symbol, pos)
 
-    async def close_position(self, symbol: str):
-        pos = await self.get_position(symbol)
+    async def _close_position(self, symbol: str, pos: Optional[dict] = None):
+        if pos is None:
+            snap = await self.account_snapshot()
+            pos = snap.position(symbol) if snap else await self.get_position(symbol)
         if not pos: return None
         amt = pos["positionAmt"]
         if amt == 0: return None
@@ -121,8 +306,8 @@ class BinanceClient:
         qty = await self._quantize_qty(symbol, abs(amt))
         if qty <= 0: return None
         try:
-            return await self._run(self.client.new_order, symbol=symbol, side=side, type="MARKET",
-                                   quantity=str(qty), reduceOnly=True)
+            return await self._new_order(symbol=symbol, side=side, type="MARKET",
+                                         quantity=str(qty), reduceOnly=True)
         except Exception as e:
             print(f"[CLIENT] close_position error {symbol}: {e}")
             return None
@@ -0,0 +1,48 @@
+from typing import Optional
+
+
+class BinanceAPIError(Exception):
+    """Binance REST 錯誤（HTTP status + Binance error code）；str() 保留 code 方便舊的字串判斷"""
+    def __init__(self, status: int, code: Optional[int], msg: str, headers=None):
+        self.status = status
+        self.code = code
+        self.msg = msg
+        self.headers = dict(headers or {})
+        super().__init__(f"({status}, {code}, '{msg}')")
+
+
+class MarginInsufficientError(BinanceAPIError):
+    """-2019 Margin is insufficient / -2027 超過目前槓桿允許的最大持倉（兩者都靠縮量解決）"""
+
+
+class ReduceOnlyRejectedError(BinanceAPIError):
+    """-2022 ReduceOnly Order is rejected（通常代表持倉已不存在）"""
+
+
+class InvalidQuantityError(BinanceAPIError):
+    """-1111 / -4003 / -4164 數量精度或最小名目不符"""
+
+
+class RateLimitError(BinanceAPIError):
+    """429 超過頻率限制 / 418 IP 被封鎖；retry_after 為伺服器建議等待秒數"""
+    @property
+    def retry_after(self) -> float:
+        try: return float(self.headers.get("Retry-After", self.headers.get("retry-after", 0)))
+        except (TypeError, ValueError): return 0.0
+
+
+_BY_CODE = {
+    -2019: MarginInsufficientError,
+    -2027: MarginInsufficientError,
+    -2022: ReduceOnlyRejectedError,
+    -1111: InvalidQuantityError,
+    -4003: InvalidQuantityError,
+    -4164: InvalidQuantityError,
+    -1003: RateLimitError,
+}
+
+
+def map_error(status: int, code: Optional[int], msg: str, headers=None) -> BinanceAPIError:
+    if status in (418, 429):
+        return RateLimitError(status, code, msg, headers)
+    return _BY_CODE.get(code, BinanceAPIError)(status, code, msg, headers)
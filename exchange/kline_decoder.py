@@ -0,0 +1,50 @@
+from typing import Dict, Sequence
+import numpy as np
+
+# Binance 原始 K 線每列：open_time, open, high, low, close, volume, close_time, quote volume, trades, taker...
+RAW_INDEX = {"open_time": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5, "close_time": 6}
+DTYPES = {"open_time": np.int64, "open": np.float64, "high": np.float64, "low": np.float64,
+          "close": np.float64, "volume": np.float64, "close_time": np.int64}
+ALL_FIELDS = tuple(RAW_INDEX)
+
+
+def check_fields(fields: Sequence[str]) -> tuple:
+    """open_time 必須保留（增量同步 / 排序依據）；未知欄位直接報錯"""
+    fields = tuple(dict.fromkeys(("open_time",) + tuple(fields)))
+    bad = [f for f in fields if f not in RAW_INDEX]
+    if bad: raise ValueError(f"unknown kline fields: {bad}")
+    return fields
+
+
+class KlineDecoder:
+    """
+    原始 K 線（list of lists，價量為字串）→ 各欄 NumPy array，不經 DataFrame / 逐格轉型：
+    - 只轉 fields 指定的欄位，每欄一次整段寫入（字串由 NumPy 在寫入時解析成 float64）
+    - 暫存 array 依看過的最大筆數配置後重複使用；decode() 回傳暫存區的 view，下一次 decode 前有效
+    """
+    def __init__(self, fields: Sequence[str] = ALL_FIELDS):
+        self.fields = check_fields(fields)
+        self._scratch: Dict[str, np.ndarray] = {}
+        self.capacity = 0
+
+    def _reserve(self, n: int):
+        if n <= self.capacity: return
+        self.capacity = max(n, 2 * self.capacity)
+        self._scratch = {f: np.empty(self.capacity, DTYPES[f]) for f in self.fields}
+
+    def decode(self, klines) -> Dict[str, np.ndarray]:
+        n = len(klines)
+        self._reserve(n)
+        out = {}
+        for f in self.fields:
+            i, a = RAW_INDEX[f], self._scratch[f][:n]
+            a[:] = [k[i] for k in klines]
+            out[f] = a
+        return out
+
+    def records(self, klines, dtype: np.dtype) -> np.ndarray:
+        """解碼成新的 structured array（欄位為 dtype.names，須都在 fields 內）；給需要保存結果的呼叫端"""
+        cols = self.decode(klines)
+        rec = np.empty(len(klines), dtype)
+        for name in dtype.names: rec[name] = cols[name]
+        return rec
@@ -0,0 +1,221 @@
+import asyncio, time
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+import config
+from exchange.kline_decoder import KlineDecoder, RAW_INDEX, DTYPES
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000,
+}
+
+ROW_INGEST_MAX = 2   # 增量同步 / WS 推送通常 1~2 根：逐列寫入比整批解碼的固定成本低
+
+
+def interval_ms(interval: str) -> int:
+    return INTERVAL_MS.get(interval, 0)
+
+
+class KlineBuffer:
+    """
+    固定長度的 K 線 ring buffer（每欄一個 NumPy array，只存 decoder.fields 的欄位）。
+    ingest() 先整批解碼再以 slice 寫入，新 K 棒 O(1)
+    """
+    def __init__(self, capacity: int, decoder: KlineDecoder = None):
+        self.capacity = capacity
+        self.decoder = decoder or KlineDecoder(config.KLINE_FIELDS)
+        self.fields = self.decoder.fields
+        self.cols: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=DTYPES[name]) for name in self.fields}
+        self._head = 0   # 下一個寫入位置
+        self._size = 0
+
+    def __len__(self): return self._size
+
+    @property
+    def last_open_time(self) -> int:
+        if self._size == 0: return 0
+        return int(self.cols["open_time"][(self._head - 1) % self.capacity])
+
+    def _write(self, idx: int, row):
+        for name in self.fields:
+            self.cols[name][idx] = row[RAW_INDEX[name]]
+
+    def append(self, row):
+        self._write(self._head, row)
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def replace_last(self, row):
+        self._write((self._head - 1) % self.capacity, row)
+
+    def _append_block(self, cols: Dict[str, np.ndarray], lo: int, hi: int):
+        """把解碼後的第 lo..hi 列接在尾端（超過容量只留最後 capacity 列），最多兩段 slice 複製"""
+        m = hi - lo
+        if m >= self.capacity:
+            lo, m = hi - self.capacity, self.capacity
+            self._head = 0
+        first = min(m, self.capacity - self._head)
+        for name in self.fields:
+            dst, src = self.cols[name], cols[name]
+            dst[self._head:self._head + first] = src[lo:lo + first]
+            dst[:m - first] = src[lo + first:hi]
+        self._head = (self._head + m) % self.capacity
+        self._size = min(self._size + m, self.capacity)
+
+    def _ingest_rows(self, klines) -> int:
+        n = 0
+        for k in klines:
+            ot = int(k[0])
+            last = self.last_open_time
+            if self._size and ot == last:
+                self.replace_last(k)
+            elif self._size == 0 or ot > last:
+                self.append(k)
+            else:
+                continue
+            n += 1
+        return n
+
+    def ingest(self, klines) -> int:
+        """寫入 REST/WS 原始 K 線（list of lists）；同 open_time 取代最後一根，較新則 append，較舊略過"""
+        if not klines: return 0
+        if len(klines) <= ROW_INGEST_MAX: return self._ingest_rows(klines)
+        cols = self.decoder.decode(klines)
+        ot = cols["open_time"]
+        n = len(ot)
+        if n > 1 and not (ot[1:] > ot[:-1]).all():
+            return self._ingest_rows(klines)   # 未排序 / 有重複：逐列套用同樣規則
+        start = replaced = 0
+        if self._size:
+            last = self.last_open_time
+            start = int(np.searchsorted(ot, last))
+            if start < n and ot[start] == last:
+                idx = (self._head - 1) % self.capacity
+                for name in self.fields: self.cols[name][idx] = cols[name][start]
+                start, replaced = start + 1, 1
+        if start < n: self._append_block(cols, start, n)
+        return n - start + replaced
+
+    def reset(self):
+        self._head = 0; self._size = 0
+
+    def load(self, rec) -> int:
+        """整批放入依時間排序的 structured array（須含 self.fields 各欄），取代現有內容；不逐列 ingest"""
+        rec = rec[-self.capacity:]
+        n = len(rec)
+        for name in self.fields:
+            self.cols[name][:n] = rec[name]
+        self._head, self._size = n % self.capacity, n
+        return n
+
+    def column(self, name: str) -> np.ndarray:
+        """依時間順序回傳某欄（copy）"""
+        arr = self.cols[name]
+        if self._size < self.capacity:
+            return arr[:self._size].copy()
+        return np.concatenate((arr[self._head:], arr[:self._head]))
+
+    def closes(self) -> np.ndarray:
+        return self.column("close")
+
+    def tail(self, name: str, k: int) -> np.ndarray:
+        """最後 k 根（依時間順序），只複製 k 個元素"""
+        k = min(k, self._size)
+        idx = (np.arange(self._head - k, self._head)) % self.capacity
+        return self.cols[name][idx]
+
+
+class KlineStore:
+    """
+    (symbol, interval) → KlineBuffer 的共用 K 線快取。
+    - 第一次：完整回補 KLINE_LIMIT 根
+    - 之後：以 startTime=最後一根 open_time 只抓缺少的幾根（通常 1~2 根），取代未收盤 K 棒或 append 新 K 棒
+    - KLINE_MIN_REFRESH_SEC 內重複呼叫（trend + revert 同一輪）直接讀記憶體，不發請求
+    - live(symbol, interval) 為 True（WS 持續推送中）時完全不走 REST
+    - archive（storage.candle_archive.CandleArchive）設定時：重啟先從本地封存暖機，只補最後幾根；抓到的已收盤 K 棒順手寫回封存
+    - preload()：StateStore 重啟時放回的 K 線，效果同封存暖機
+    """
+    def __init__(self, client, capacity: int = None, min_refresh_sec: float = None, clock=time.time,
+                 fields=None):
+        self.client = client
+        self.clock = clock   # 回測時由模擬時鐘取代
+        self.capacity = capacity or config.KLINE_LIMIT
+        self.min_refresh_sec = config.KLINE_MIN_REFRESH_SEC if min_refresh_sec is None else min_refresh_sec
+        self.decoder = KlineDecoder(config.KLINE_FIELDS if fields is None else fields)   # 所有 buffer 共用解碼暫存區
+        self._bufs: Dict[Tuple[str, str], KlineBuffer] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._synced_at: Dict[Tuple[str, str], float] = {}
+        self.live: Optional[Callable[[str, str], bool]] = None
+        self.archive = None
+        self.stats = {"backfill": 0, "archive": 0, "incremental": 0, "cached": 0, "restored": 0, "rows": 0}
+
+    def get(self, symbol: str, interval: str = None) -> Optional[KlineBuffer]:
+        return self._bufs.get((symbol, interval or config.KLINE_INTERVAL))
+
+    def expire(self, symbol: str, interval: str = None):
+        """下一次 sync 不吃 KLINE_MIN_REFRESH_SEC 快取（排程器在 K 棒收盤後要拿到剛收盤的那根）"""
+        self._synced_at.pop((symbol, interval or config.KLINE_INTERVAL), None)
+
+    def buffers(self):
+        return list(self._bufs.items())
+
+    def preload(self, symbol: str, interval: str, rec) -> KlineBuffer:
+        """放回重啟前的 K 線（storage.state_store 的 RECORD 陣列）：不算同步過，下一次 sync 只補增量"""
+        buf = self._bufs.setdefault((symbol, interval), KlineBuffer(self.capacity, self.decoder))
+        self.stats["restored"] += 1
+        self.stats["rows"] += buf.load(rec)
+        return buf
+
+    def _archive(self, symbol: str, interval: str, kl):
+        if self.archive is not None and kl:
+            self.archive.append_klines(symbol, interval, kl, int(self.clock() * 1000))
+
+    async def _backfill(self, buf: KlineBuffer, symbol: str, interval: str):
+        buf.reset()
+        if self.archive is not None:
+            w = self.archive.window(symbol, interval, last=self.capacity)
+            iv = interval_ms(interval)
+            if len(w) and iv and self.clock() * 1000 - int(w["open_time"][-1]) < (self.capacity - 1) * iv:
+                self.stats["archive"] += 1
+                self.stats["rows"] += buf.load(w)
+                return await self._incremental(buf, symbol, interval, int(self.clock() * 1000))
+        kl = await self.client.get_klines(symbol, interval=interval, limit=self.capacity)
+        self.stats["backfill"] += 1
+        self.stats["rows"] += buf.ingest(kl)
+        self._archive(symbol, interval, kl)
+
+    async def _incremental(self, buf: KlineBuffer, symbol: str, interval: str, now_ms: int):
+        iv = interval_ms(interval)
+        missing = (now_ms - buf.last_open_time) // iv + 1 if iv else self.capacity
+        if missing >= self.capacity:
+            return await self._backfill(buf, symbol, interval)
+        kl = await self.client.get_klines(symbol, interval=interval, limit=int(missing) + 1,
+                                          start_time=buf.last_open_time)
+        self.stats["incremental"] += 1
+        self.stats["rows"] += buf.ingest(kl)
+        self._archive(symbol, interval, kl)
+
+    async def sync(self, symbol: str, interval: str = None, force: bool = False) -> KlineBuffer:
+        interval = interval or config.KLINE_INTERVAL
+        key = (symbol, interval)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            buf = self._bufs.get(key)
+            now = self.clock()
+            if not force and buf is not None and len(buf):
+                if (self.live and self.live(symbol, interval)) or now - self._synced_at.get(key, 0) < self.min_refresh_sec:
+                    self.stats["cached"] += 1
+                    return buf
+            if buf is None:
+                buf = self._bufs[key] = KlineBuffer(self.capacity, self.decoder)
+            if len(buf) == 0:
+                await self._backfill(buf, symbol, interval)
+            else:
+                await self._incremental(buf, symbol, interval, int(now * 1000))
+            self._synced_at[key] = now
+            return buf
+
+    async def closes(self, symbol: str, interval: str = None) -> np.ndarray:
+        buf = await self.sync(symbol, interval)
+        return buf.closes()
@@ -0,0 +1,155 @@
+import asyncio, json, time
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+import aiohttp
+import config
+
+
+class MarketStream:
+    """
+    WebSocket 行情訂閱（combined stream）：<symbol>@kline_<interval>、<symbol>@markPrice、!ticker@arr
+    - 收到的資料寫進記憶體；BinanceClient 讀取時先看這裡，資料過期（WS_STALE_SEC）才回退 REST
+    - K 線直接更新 client.kline_store 的 ring buffer
+    - 斷線自動重連（指數退避），重連後用 REST 補齊斷線期間缺的 K 線
+    - base_url 可指向本地測試用 WS server
+    - all_marks=True 時另訂 !markPrice@arr@1s（全市場標記價，供 risk watchdog 涵蓋候選以外的持倉）；
+      每筆標記價更新都會呼叫 mark_listeners(symbol, price, recv_time)
+    """
+    def __init__(self, client, symbols: List[str], interval: str = None, base_url: str = None,
+                 stale_sec: float = None, max_streams: int = None, all_marks: bool = False):
+        self.client = client
+        self.symbols = list(symbols)
+        self.interval = interval or config.KLINE_INTERVAL
+        self.base_url = (base_url or config.WS_BASE_URL).rstrip("/")
+        self.stale_sec = config.WS_STALE_SEC if stale_sec is None else stale_sec
+        self.max_streams = max_streams or config.WS_MAX_STREAMS
+        self.all_marks = all_marks
+        self.mark_listeners: List[Callable[[str, float, float], None]] = []
+        self._marks: Dict[str, Tuple[dict, float]] = {}
+        self._tickers: Dict[str, Tuple[dict, float]] = {}
+        self._kline_ts: Dict[Tuple[str, str], float] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stopped = False
+        self.reconnects = 0
+        self.messages = 0
+
+    # ----- 讀取（供 BinanceClient 使用）-----
+    def _fresh(self, ts: float) -> bool:
+        return (time.time() - ts) < self.stale_sec
+
+    def price(self, symbol: str) -> Optional[Decimal]:
+        t = self._tickers.get(symbol)
+        if t and self._fresh(t[1]): return Decimal(str(t[0]["lastPrice"]))
+        return None
+
+    def mark_price(self, symbol: str) -> Optional[Decimal]:
+        m = self._marks.get(symbol)
+        if m and self._fresh(m[1]): return Decimal(str(m[0]["markPrice"]))
+        return None
+
+    def premium_index(self, symbol: str) -> Optional[dict]:
+        m = self._marks.get(symbol)
+        if m and self._fresh(m[1]): return m[0]
+        return None
+
+    def ticker_24h(self, symbol: str) -> Optional[dict]:
+        t = self._tickers.get(symbol)
+        if t and self._fresh(t[1]): return t[0]
+        return None
+
+    def kline_live(self, symbol: str, interval: str) -> bool:
+        ts = self._kline_ts.get((symbol, interval))
+        return ts is not None and self._fresh(ts)
+
+    # ----- 訊息處理 -----
+    def _on_kline(self, d: dict, now: float):
+        k = d.get("k") or {}
+        symbol, interval = d.get("s"), k.get("i", self.interval)
+        buf = self.client.kline_store.get(symbol, interval)
+        if buf is None or len(buf) == 0: return   # 尚未回補，等 sync 完成
+        buf.ingest([[k["t"], k["o"], k["h"], k["l"], k["c"], k["v"], k["T"]]])
+        self._kline_ts[(symbol, interval)] = now
+
+    def _on_mark(self, d: dict, now: float):
+        self._marks[d["s"]] = ({
+            "symbol": d["s"], "markPrice": d.get("p"), "indexPrice": d.get("i"),
+            "lastFundingRate": d.get("r"), "nextFundingTime": d.get("T"), "time": d.get("E"),
+        }, now)
+        if self.mark_listeners:
+            p = float(d.get("p") or 0)
+            for fn in self.mark_listeners:
+                try: fn(d["s"], p, now)
+                except Exception as e: print(f"[WS] mark listener error: {e}")
+
+    def _on_tickers(self, arr: list, now: float):
+        for t in arr:
+            self._tickers[t["s"]] = ({
+                "symbol": t["s"], "lastPrice": t.get("c"), "priceChangePercent": t.get("P"),
+                "volume": t.get("v"), "quoteVolume": t.get("q"), "closeTime": t.get("C"),
+            }, now)
+
+    def handle(self, msg: dict):
+        stream, data = msg.get("stream", ""), msg.get("data")
+        if data is None: return
+        now = time.time()
+        self.messages += 1
+        if stream == "!ticker@arr": self._on_tickers(data, now)
+        elif stream.startswith("!markPrice@arr"):
+            for d in data: self._on_mark(d, now)
+        elif "@kline_" in stream: self._on_kline(data, now)
+        elif "@markPrice" in stream: self._on_mark(data, now)
+
+    # ----- 連線 -----
+    def _stream_groups(self) -> List[List[str]]:
+        streams = []
+        for s in self.symbols:
+            low = s.lower()
+            streams += [f"{low}@kline_{self.interval}", f"{low}@markPrice"]
+        groups = [streams[i:i + self.max_streams] for i in range(0, len(streams), self.max_streams)] or [[]]
+        groups[0] = ["!ticker@arr"] + (["!markPrice@arr@1s"] if self.all_marks else []) + groups[0]
+        return groups
+
+    async def _backfill(self, symbols: List[str]):
+        # 重連後以 REST 補齊 K 線缺口
+        tasks = [self.client.kline_store.sync(s, self.interval, force=True) for s in symbols]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _connection(self, streams: List[str]):
+        url = f"{self.base_url}/stream?streams={'/'.join(streams)}"
+        symbols = sorted({s.split("@")[0].upper() for s in streams if "@kline_" in s})
+        backoff = 1
+        while not self._stopped:
+            try:
+                async with self._session.ws_connect(url, heartbeat=config.WS_HEARTBEAT_SEC) as ws:
+                    print(f"[WS] connected ({len(streams)} streams)")
+                    backoff = 1
+                    await self._backfill(symbols)
+                    async for m in ws:
+                        if m.type == aiohttp.WSMsgType.TEXT:
+                            self.handle(json.loads(m.data))
+                        elif m.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WS] connection error: {e}")
+            if self._stopped: break
+            self.reconnects += 1
+            print(f"[WS] reconnect in {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def run(self):
+        self._stopped = False
+        self._session = aiohttp.ClientSession()
+        try:
+            self._tasks = [asyncio.create_task(self._connection(g)) for g in self._stream_groups()]
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self._session.close()
+
+    async def stop(self):
+        self._stopped = True
+        for t in self._tasks: t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
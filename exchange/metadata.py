@@ -0,0 +1,124 @@
+import asyncio, time
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Optional
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+class SymbolFilters:
+    """單一 symbol 的下單限制（LOT_SIZE / MIN_NOTIONAL / PRICE_FILTER / precision）"""
+    __slots__ = ("symbol", "step_size", "min_qty", "max_qty", "min_notional",
+                 "tick_size", "min_price", "price_precision", "qty_precision")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.step_size = self.min_qty = self.max_qty = Decimal("0")
+        self.min_notional = Decimal("0")
+        self.tick_size = self.min_price = Decimal("0")
+        self.price_precision = self.qty_precision = 8
+
+    @classmethod
+    def from_info(cls, s: dict) -> "SymbolFilters":
+        sf = cls(s.get("symbol"))
+        sf.price_precision = int(s.get("pricePrecision", 8))
+        sf.qty_precision = int(s.get("quantityPrecision", 8))
+        for f in s.get("filters", []):
+            t = f.get("filterType")
+            if t == "LOT_SIZE":
+                sf.step_size = _D(f.get("stepSize", "0")); sf.min_qty = _D(f.get("minQty", "0"))
+                sf.max_qty = _D(f.get("maxQty", "0"))
+            elif t == "MIN_NOTIONAL":
+                sf.min_notional = _D(f.get("notional", f.get("minNotional", "0")))
+            elif t == "PRICE_FILTER":
+                sf.tick_size = _D(f.get("tickSize", "0")); sf.min_price = _D(f.get("minPrice", "0"))
+        return sf
+
+    def quantize_qty(self, qty: Decimal) -> Decimal:
+        q = qty if self.step_size == 0 else (qty // self.step_size) * self.step_size
+        if q < self.min_qty: return Decimal("0")
+        if self.max_qty > 0 and q > self.max_qty:
+            q = self.max_qty if self.step_size == 0 else (self.max_qty // self.step_size) * self.step_size
+        return q
+
+    def quantize_price(self, price: Decimal) -> Decimal:
+        if self.tick_size == 0: return price
+        return (price // self.tick_size) * self.tick_size
+
+
+class ExchangeMetadata:
+    """
+    exchange_info 快取：TTL 到期前只在記憶體查詢（O(1) dict lookup）。
+    - 第一次使用時同步載入；之後過期則回傳舊資料並在背景刷新，下單路徑不等網路。
+    - refresh() 可手動強制刷新（例如新幣上架或收到 -1111 精度錯誤時）。
+    """
+    def __init__(self, fetch: Callable[[], Awaitable[dict]], ttl: float = 3600):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._filters: Dict[str, SymbolFilters] = {}
+        self._raw: Dict[str, dict] = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._bg: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool: return bool(self._filters)
+
+    @property
+    def loaded_at(self) -> float: return self._loaded_at
+
+    def dump(self) -> dict:
+        """load() 可直接讀回的 exchange_info（只含 symbols）"""
+        return {"symbols": list(self._raw.values())}
+
+    def is_stale(self) -> bool:
+        return (time.time() - self._loaded_at) >= self.ttl
+
+    def load(self, info: dict, loaded_at: float = None):
+        filters, raw = {}, {}
+        for s in info.get("symbols", []):
+            sym = s.get("symbol")
+            if not sym: continue
+            raw[sym] = s
+            filters[sym] = SymbolFilters.from_info(s)
+        self._filters, self._raw = filters, raw
+        self._loaded_at = loaded_at if loaded_at is not None else time.time()
+
+    async def refresh(self):
+        async with self._lock:
+            info = await self._fetch()
+            self.load(info)
+            print(f"[META] exchange_info loaded: {len(self._filters)} symbols")
+
+    async def _ensure(self):
+        if not self.loaded:
+            async with self._lock:
+                if self.loaded: return
+                self.load(await self._fetch())
+                print(f"[META] exchange_info loaded: {len(self._filters)} symbols")
+        elif self.is_stale() and (self._bg is None or self._bg.done()):
+            self._bg = asyncio.ensure_future(self._refresh_quiet())
+
+    async def _refresh_quiet(self):
+        try: await self.refresh()
+        except Exception as e: print(f"[META] background refresh failed: {e}")
+
+    async def get(self, symbol: str) -> Optional[SymbolFilters]:
+        await self._ensure()
+        return self._filters.get(symbol)
+
+    async def get_raw(self, symbol: str) -> Optional[dict]:
+        await self._ensure()
+        return self._raw.get(symbol)
+
+    def peek(self, symbol: str) -> Optional[SymbolFilters]:
+        return self._filters.get(symbol)
+
+    def symbols(self):
+        return list(self._filters.keys())
+
+    async def perpetuals(self, quote: str = "USDT"):
+        await self._ensure()
+        return [s for s, r in self._raw.items()
+                if r.get("contractType") == "PERPETUAL" and r.get("quoteAsset") == quote
+                and r.get("status", "TRADING") == "TRADING"]
@@ -0,0 +1,220 @@
+import asyncio, contextvars, heapq, itertools, time
+from contextlib import contextmanager
+from typing import Dict, Optional
+import config
+
+# 優先順序（數字小先服務）：保護性平倉 > 進場下單 > 帳戶查詢 > 掃描 > 行情
+PROTECT, ENTRY, ACCOUNT, SCAN, MARKET = 0, 1, 2, 3, 4
+CLASS_NAMES = {PROTECT: "protect", ENTRY: "entry", ACCOUNT: "account", SCAN: "scan", MARKET: "market"}
+
+# endpoint → 預設優先順序
+ENDPOINT_PRIORITY = {
+    "exchange_info": SCAN, "ticker_24hr": SCAN, "premium_index": SCAN,
+    "ticker_price": MARKET, "klines": MARKET,
+    "balance": ACCOUNT, "position_risk": ACCOUNT, "get_orders": ACCOUNT,
+    "new_listen_key": ACCOUNT, "renew_listen_key": ACCOUNT, "leverage_brackets": ACCOUNT, "commission_rate": ACCOUNT,
+    "change_leverage": ENTRY, "new_order": ENTRY, "batch_orders": ENTRY, "cancel_order": ENTRY,
+}
+
+_priority: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("request_priority", default=None)
+
+
+@contextmanager
+def priority(level: int):
+    """區塊內（含其中 await 的子呼叫）所有 REST 請求以 level 排隊，例如停損平倉前的持倉查詢"""
+    token = _priority.set(level)
+    try: yield
+    finally: _priority.reset(token)
+
+
+def request_priority(name: str, params: dict) -> int:
+    p = ENDPOINT_PRIORITY.get(name, MARKET)
+    if name == "new_order" and (params.get("reduceOnly") in (True, "true") or params.get("closePosition") in (True, "true")):
+        p = PROTECT
+    ctx = _priority.get()
+    return min(p, ctx) if ctx is not None else p
+
+
+def _kline_weight(limit) -> int:
+    limit = int(limit or 500)
+    if limit < 100: return 1
+    if limit < 500: return 2
+    if limit <= 1000: return 5
+    return 10
+
+
+def request_cost(name: str, params: dict):
+    """(IP request weight, order count)，依 Binance USDⓈ-M Futures 文件"""
+    has_symbol = params.get("symbol") is not None
+    if name == "klines": return _kline_weight(params.get("limit")), 0
+    if name == "ticker_24hr": return (1 if has_symbol else 40), 0
+    if name == "ticker_price": return (1 if has_symbol else 2), 0
+    if name == "premium_index": return (1 if has_symbol else 10), 0
+    if name == "get_orders": return (1 if has_symbol else 40), 0
+    if name in ("balance", "position_risk"): return 5, 0
+    if name == "commission_rate": return 20, 0
+    if name == "new_order": return 0, 1
+    if name == "batch_orders": return 5, len(params.get("batchOrders") or ())
+    return 1, 0
+
+
+class TokenBucket:
+    """容量 capacity、每秒補 rate 的 token bucket"""
+    __slots__ = ("capacity", "rate", "tokens", "stamp", "clock")
+
+    def __init__(self, capacity: float, period: float, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.clock = clock
+        self.stamp = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, n: float) -> float:
+        self._refill()
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        self._refill()
+        self.tokens -= min(n, self.capacity)
+
+    def sync_used(self, used: float):
+        """伺服器回報本視窗已用量（可能包含同 IP 其他程序），本地剩餘不得高於 capacity - used"""
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class _Waiter:
+    __slots__ = ("fut", "weight", "orders", "level", "enqueued")
+
+    def __init__(self, fut, weight, orders, level, enqueued):
+        self.fut, self.weight, self.orders, self.level, self.enqueued = fut, weight, orders, level, enqueued
+
+
+class RateLimiter:
+    """
+    權重感知的 REST 排程器：
+    - IP weight / 下單數（10s、1m）各一個 token bucket，容量取交易所上限 × RATE_LIMIT_SAFETY
+    - 回應 header（X-MBX-USED-WEIGHT-1M、X-MBX-ORDER-COUNT-10S/1M）校正本地剩餘量
+    - 429 / 418 依 Retry-After 暫停整個佇列
+    - 排隊中的請求依優先順序服務（同級先到先服務）；提供佇列深度與等待時間統計
+    """
+    def __init__(self, weight_per_min: int = None, orders_per_10s: int = None, orders_per_min: int = None,
+                 safety: float = None, clock=time.monotonic):
+        safety = config.RATE_LIMIT_SAFETY if safety is None else safety
+        self.clock = clock
+        self.weight = TokenBucket((weight_per_min or config.RATE_LIMIT_WEIGHT_PER_MIN) * safety, 60.0, clock)
+        self.orders_10s = TokenBucket((orders_per_10s or config.RATE_LIMIT_ORDERS_PER_10S) * safety, 10.0, clock)
+        self.orders_1m = TokenBucket((orders_per_min or config.RATE_LIMIT_ORDERS_PER_MIN) * safety, 60.0, clock)
+        self.paused_until = 0.0
+        self.used_weight = 0   # 伺服器最後回報的 1m 已用權重
+        self._heap = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.waits: Dict[int, list] = {c: [0, 0.0, 0.0] for c in CLASS_NAMES}   # count, total, max（秒）
+        self.throttled = 0
+
+    # ----- 取得額度 -----
+    def _wait_time(self, weight: float, orders: int) -> float:
+        w = max(self.paused_until - self.clock(), self.weight.wait_time(weight))
+        if orders:
+            w = max(w, self.orders_10s.wait_time(orders), self.orders_1m.wait_time(orders))
+        return w
+
+    def _take(self, weight: float, orders: int):
+        self.weight.take(weight)
+        if orders:
+            self.orders_10s.take(orders); self.orders_1m.take(orders)
+
+    def _record(self, level: int, waited: float):
+        s = self.waits[level]
+        s[0] += 1; s[1] += waited; s[2] = max(s[2], waited)
+
+    async def acquire(self, weight: float, orders: int = 0, level: int = MARKET):
+        if not self._heap and self._wait_time(weight, orders) <= 0:
+            self._take(weight, orders)
+            self._record(level, 0.0)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (level, next(self._seq), _Waiter(fut, weight, orders, level, self.clock())))
+        self._kick()
+        await fut
+
+    def _kick(self):
+        if self._wake is None: self._wake = asyncio.Event()
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while self._heap:
+            _, _, w = self._heap[0]
+            if w.fut.done():   # 呼叫端已取消
+                heapq.heappop(self._heap); continue
+            delay = self._wait_time(w.weight, w.orders)
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                self._take(w.weight, w.orders)
+                self._record(w.level, self.clock() - w.enqueued)
+                w.fut.set_result(None)
+                continue
+            self.throttled += 1
+            self._wake.clear()
+            try:   # 等額度補足，或有新的（可能更高優先）請求進來時重新檢查佇列頭
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    # ----- 伺服器回饋 -----
+    def observe(self, headers):
+        if not headers: return
+        h = {k.lower(): v for k, v in headers.items()}
+        try:
+            if "x-mbx-used-weight-1m" in h:
+                self.used_weight = int(h["x-mbx-used-weight-1m"])
+                self.weight.sync_used(self.used_weight)
+            if "x-mbx-order-count-10s" in h:
+                self.orders_10s.sync_used(int(h["x-mbx-order-count-10s"]))
+            if "x-mbx-order-count-1m" in h:
+                self.orders_1m.sync_used(int(h["x-mbx-order-count-1m"]))
+        except (TypeError, ValueError):
+            pass
+
+    def penalize(self, status: int, retry_after: float = 0.0) -> float:
+        """429：暫停 Retry-After 秒（預設 1s）；418（IP 封鎖）預設 60s。回傳暫停秒數"""
+        pause = retry_after or (60.0 if status == 418 else 1.0)
+        self.paused_until = max(self.paused_until, self.clock() + pause)
+        self.weight.tokens = min(self.weight.tokens, 0.0)
+        print(f"[RATE] HTTP {status}, pausing REST queue for {pause:.1f}s")
+        return pause
+
+    # ----- 統計 -----
+    def queue_depth(self) -> Dict[str, int]:
+        out = {n: 0 for n in CLASS_NAMES.values()}
+        for level, _, w in self._heap:
+            if not w.fut.done(): out[CLASS_NAMES[level]] += 1
+        return out
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.queue_depth(),
+            "wait_ms": {CLASS_NAMES[c]: {"count": n, "avg": (t / n * 1000 if n else 0.0), "max": m * 1000}
+                        for c, (n, t, m) in self.waits.items()},
+            "tokens": round(self.weight.tokens, 1),
+            "used_weight_1m": self.used_weight,
+            "paused_for": max(0.0, self.paused_until - self.clock()),
+            "throttled": self.throttled,
+        }
+
+    def summary(self) -> str:
+        q = self.queue_depth()
+        waits = " ".join(f"{CLASS_NAMES[c]}={t / n * 1000:.0f}/{m * 1000:.0f}ms"
+                         for c, (n, t, m) in self.waits.items() if n)
+        return (f"used={self.used_weight} tokens={self.weight.tokens:.0f} queued={sum(q.values())} "
+                f"throttled={self.throttled} wait(avg/max) {waits}")
@@ -0,0 +1,98 @@
+import hashlib, hmac, json, time
+from typing import Optional
+from urllib.parse import urlencode
+import aiohttp
+from yarl import URL
+import config
+from exchange.errors import BinanceAPIError, map_error
+
+NONE, KEY, SIGNED = 0, 1, 2
+
+# endpoint 名稱沿用 BinanceClient 內部使用的呼叫名稱
+ENDPOINTS = {
+    "exchange_info":   ("GET",  "/fapi/v1/exchangeInfo", NONE),
+    "ticker_price":    ("GET",  "/fapi/v1/ticker/price", NONE),
+    "ticker_24hr":     ("GET",  "/fapi/v1/ticker/24hr", NONE),
+    "premium_index":   ("GET",  "/fapi/v1/premiumIndex", NONE),
+    "klines":          ("GET",  "/fapi/v1/klines", NONE),
+    "balance":         ("GET",  "/fapi/v2/balance", SIGNED),
+    "position_risk":   ("GET",  "/fapi/v2/positionRisk", SIGNED),
+    "change_leverage": ("POST", "/fapi/v1/leverage", SIGNED),
+    "leverage_brackets": ("GET", "/fapi/v1/leverageBracket", SIGNED),
+    "commission_rate": ("GET",  "/fapi/v1/commissionRate", SIGNED),
+    "new_order":       ("POST", "/fapi/v1/order", SIGNED),
+    "batch_orders":    ("POST", "/fapi/v1/batchOrders", SIGNED),
+    "get_orders":      ("GET",  "/fapi/v1/openOrders", SIGNED),
+    "cancel_order":    ("DELETE", "/fapi/v1/order", SIGNED),
+    "new_listen_key":  ("POST", "/fapi/v1/listenKey", KEY),
+    "renew_listen_key": ("PUT", "/fapi/v1/listenKey", KEY),
+}
+
+
+def _encode(v):
+    if isinstance(v, bool): return "true" if v else "false"
+    if isinstance(v, (list, dict)): return json.dumps(v, separators=(",", ":"))
+    return str(v)
+
+
+class AsyncTransport:
+    """
+    原生 aiohttp REST 傳輸：持久 keep-alive ClientSession、程序內 HMAC-SHA256 簽章、
+    每 host 連線上限與逾時可調；非 2xx 回應轉成 exchange.errors 的型別化例外。
+    """
+    def __init__(self, api_key: str, api_secret: str, base_url: str,
+                 limit_per_host: int = None, timeout: float = None, recv_window: int = None):
+        self.api_key = api_key
+        self._secret = (api_secret or "").encode()
+        self.base_url = base_url.rstrip("/")
+        self.limit_per_host = limit_per_host or config.BINANCE_HTTP_LIMIT_PER_HOST
+        self.timeout = timeout or config.BINANCE_HTTP_TIMEOUT
+        self.recv_window = recv_window or config.BINANCE_RECV_WINDOW
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.last_headers = {}
+        self.on_headers = None   # 每個回應的 header 回呼（RateLimiter.observe）
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            conn = aiohttp.TCPConnector(limit=0, limit_per_host=self.limit_per_host,
+                                        ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=conn,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def sign(self, query: str) -> str:
+        return hmac.new(self._secret, query.encode(), hashlib.sha256).hexdigest()
+
+    def build(self, name: str, params: dict):
+        method, path, security = ENDPOINTS[name]
+        params = {k: _encode(v) for k, v in params.items() if v is not None}
+        if security == SIGNED:
+            params["recvWindow"] = str(self.recv_window)
+            params["timestamp"] = str(int(time.time() * 1000))
+        query = urlencode(params)
+        if security == SIGNED:
+            query = f"{query}&signature={self.sign(query)}"
+        headers = {"X-MBX-APIKEY": self.api_key} if security != NONE else {}
+        url = f"{self.base_url}{path}" + (f"?{query}" if query else "")
+        return method, URL(url, encoded=True), headers
+
+    async def request(self, name: str, **params):
+        method, url, headers = self.build(name, params)
+        async with self._get_session().request(method, url, headers=headers) as r:
+            self.last_headers = r.headers
+            if self.on_headers is not None: self.on_headers(r.headers)
+            try:
+                data = await r.json(content_type=None)
+            except Exception:
+                data = {"msg": await r.text()}
+            if r.status >= 400:
+                code = data.get("code") if isinstance(data, dict) else None
+                msg = data.get("msg", "") if isinstance(data, dict) else str(data)
+                raise map_error(r.status, code, msg, r.headers)
+            if isinstance(data, dict) and isinstance(data.get("code"), int) and data["code"] < 0:
+                raise BinanceAPIError(r.status, data["code"], data.get("msg", ""), r.headers)
+            return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,228 @@
+import asyncio, json, time
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+import aiohttp
+import config
+from exchange.account import AccountSnapshot, parse_position
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+class AccountMirror:
+    """
+    本地帳戶鏡像：錢包餘額、可用保證金、持倉、槓桿、未成交委託。
+    - resync() 以 REST 結果整份覆蓋；apply() 套用 user data stream 事件（ACCOUNT_UPDATE / ORDER_TRADE_UPDATE / ACCOUNT_CONFIG_UPDATE）
+    - 可直接餵入錄下來的事件序列重播（replay）
+    - 若有 mark_price 來源（MarketStream），未實現損益以最新標記價即時重算
+    - 持倉以 (symbol, positionSide) 為 key：hedge mode 的 LONG / SHORT 兩腿各自更新、各自歸零；
+      依 symbol 讀取時與 AccountSnapshot.build 相同，取有持倉的那一腿（one-way mode 只有 BOTH）
+    """
+    SIDES = ("BOTH", "LONG", "SHORT")
+
+    def __init__(self, asset: str = "USDT"):
+        self.asset = asset
+        self.wallet_balance = Decimal("0")
+        self.available = Decimal("0")
+        self.positions: Dict[Tuple[str, str], dict] = {}
+        self.leverage: Dict[str, Decimal] = {}
+        self.open_orders: Dict[int, dict] = {}
+        self.ready = False
+        self.updated_at = 0.0
+        self.mark_price: Optional[Callable[[str], Optional[Decimal]]] = None
+        self._fill_listeners: List[Callable[[dict], None]] = []
+
+    def on_fill(self, fn: Callable[[dict], None]):
+        self._fill_listeners.append(fn)
+
+    # ----- REST 全量同步 -----
+    def resync(self, position_risk: list, balances: list, open_orders: list = None):
+        positions, leverage = {}, {}
+        for p in position_risk or []:
+            sym = p.get("symbol")
+            if not sym: continue
+            view = parse_position(p)
+            leverage[sym] = view["leverage"]
+            if view["positionAmt"] != 0:
+                positions[(sym, p.get("positionSide", "BOTH"))] = view
+        self.positions, self.leverage = positions, leverage
+        for b in balances or []:
+            if b.get("asset") == self.asset:
+                self.wallet_balance = _D(b.get("balance", "0"))
+                self.available = _D(b.get("availableBalance", b.get("balance", "0")))
+        if open_orders is not None:
+            self.open_orders = {int(o["orderId"]): o for o in open_orders}
+        self.ready = True
+        self.updated_at = time.time()
+
+    # ----- 事件 -----
+    def _account_update(self, ev: dict):
+        a = ev.get("a", {})
+        for b in a.get("B", []):
+            if b.get("a") == self.asset:
+                wb = _D(b.get("wb", "0"))
+                # 事件不含 availableBalance：以錢包變動量同步調整（下次 resync 校正）
+                self.available += wb - self.wallet_balance
+                self.wallet_balance = wb
+        for p in a.get("P", []):
+            sym, amt = p.get("s"), _D(p.get("pa", "0"))
+            key = (sym, p.get("ps", "BOTH"))
+            if amt == 0:
+                self.positions.pop(key, None)
+                continue
+            self.positions[key] = {
+                "entryPrice": _D(p.get("ep", "0")), "positionAmt": amt,
+                "unrealizedProfit": _D(p.get("up", "0")),
+                "leverage": self.leverage.get(sym, Decimal("0")),
+                "markPrice": self.positions.get(key, {}).get("markPrice", Decimal("0")),
+            }
+
+    def _order_update(self, ev: dict):
+        o = ev.get("o", {})
+        oid, status = int(o.get("i", 0)), o.get("X")
+        if status in ("NEW", "PARTIALLY_FILLED"):
+            self.open_orders[oid] = {
+                "orderId": oid, "symbol": o.get("s"), "side": o.get("S"), "type": o.get("o"),
+                "origQty": o.get("q"), "executedQty": o.get("z"), "price": o.get("p"),
+                "stopPrice": o.get("sp"), "reduceOnly": o.get("R"), "clientOrderId": o.get("c"), "status": status,
+                "activatePrice": o.get("AP"), "priceRate": o.get("cr"),
+            }
+        else:
+            self.open_orders.pop(oid, None)
+        if o.get("x") == "TRADE":
+            for fn in self._fill_listeners:
+                try: fn(o)
+                except Exception as e: print(f"[USER-STREAM] fill listener error: {e}")
+
+    def _config_update(self, ev: dict):
+        ac = ev.get("ac")
+        if not ac: return
+        sym, lev = ac.get("s"), _D(ac.get("l", "0"))
+        self.leverage[sym] = lev
+        for ps in self.SIDES:
+            if (sym, ps) in self.positions:
+                self.positions[(sym, ps)]["leverage"] = lev
+
+    def apply(self, ev: dict):
+        et = ev.get("e")
+        if et == "ACCOUNT_UPDATE": self._account_update(ev)
+        elif et == "ORDER_TRADE_UPDATE": self._order_update(ev)
+        elif et == "ACCOUNT_CONFIG_UPDATE": self._config_update(ev)
+        else: return
+        self.updated_at = time.time()
+
+    def replay(self, events):
+        for ev in events: self.apply(ev)
+
+    # ----- 讀取 -----
+    def _leg(self, symbol: str) -> Optional[dict]:
+        for ps in self.SIDES:
+            p = self.positions.get((symbol, ps))
+            if p is not None: return p
+        return None
+
+    def position(self, symbol: str) -> Optional[dict]:
+        p = self._leg(symbol)
+        if p is None:
+            return {"entryPrice": Decimal("0"), "positionAmt": Decimal("0"), "unrealizedProfit": Decimal("0"),
+                    "leverage": self.leverage.get(symbol, Decimal("0")), "markPrice": Decimal("0")}
+        p = dict(p)
+        mark = self.mark_price(symbol) if self.mark_price else None
+        if mark is not None and p["entryPrice"] > 0:
+            p["markPrice"] = mark
+            p["unrealizedProfit"] = p["positionAmt"] * (mark - p["entryPrice"])
+        return p
+
+    def snapshot(self) -> AccountSnapshot:
+        return AccountSnapshot({s: self.position(s) for s in dict.fromkeys(s for s, _ in self.positions)},
+                               self.wallet_balance, self.available, self.updated_at)
+
+
+class UserDataStream:
+    """
+    listenKey user data stream：建立/保活 listenKey，連線後把事件套用到 AccountMirror。
+    連線前與每 USER_STREAM_RESYNC_SEC 以 REST 全量校正；斷線或 listenKeyExpired 會重新取得 key 並重連。
+    """
+    def __init__(self, client, mirror: AccountMirror = None, base_url: str = None):
+        self.client = client
+        self.mirror = mirror or AccountMirror()
+        self.base_url = (base_url or config.WS_BASE_URL).rstrip("/")
+        self.listen_key: Optional[str] = None
+        self._stopped = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bg: List[asyncio.Task] = []
+        self.reconnects = 0
+
+    async def resync(self):
+        positions, balances, orders = await asyncio.gather(
+            self.client._call("position_risk"),
+            self.client._call("balance"),
+            self.client._call("get_orders"))
+        self.mirror.resync(positions, balances, orders)
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(config.USER_STREAM_KEEPALIVE_SEC)
+            try: await self.client.keepalive_listen_key(self.listen_key)
+            except Exception as e: print(f"[USER-STREAM] keepalive failed: {e}")
+
+    async def _periodic_resync(self):
+        while True:
+            await asyncio.sleep(config.USER_STREAM_RESYNC_SEC)
+            try: await self.resync()
+            except Exception as e: print(f"[USER-STREAM] resync failed: {e}")
+
+    async def _session_once(self):
+        self.listen_key = await self.client.new_listen_key()
+        url = f"{self.base_url}/ws/{self.listen_key}"
+        async with self._session.ws_connect(url, heartbeat=config.WS_HEARTBEAT_SEC) as ws:
+            self._ws = ws
+            print("[USER-STREAM] connected")
+            await self.resync()
+            self._bg = bg = [asyncio.create_task(self._keepalive()), asyncio.create_task(self._periodic_resync())]
+            try:
+                async for m in ws:
+                    if m.type == aiohttp.WSMsgType.TEXT:
+                        ev = json.loads(m.data)
+                        if ev.get("e") == "listenKeyExpired":
+                            print("[USER-STREAM] listenKey expired")
+                            break
+                        self.mirror.apply(ev)
+                    elif m.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+            finally:
+                self._ws = None
+                for t in bg: t.cancel()
+                await asyncio.gather(*bg, return_exceptions=True)
+
+    async def run(self):
+        self._stopped = False
+        self._task = asyncio.current_task()
+        self._session = aiohttp.ClientSession()
+        backoff = 1
+        try:
+            while not self._stopped:
+                try:
+                    await self._session_once()
+                    backoff = 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[USER-STREAM] error: {e}")
+                self.mirror.ready = False   # 斷線期間讓 client 回退 REST
+                if self._stopped: break
+                self.reconnects += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+        finally:
+            await self._session.close()
+
+    async def stop(self):
+        """關閉 ws、停掉 listenKey 保活 / 定期校正，並等 run() 收尾（關 session）後才返回"""
+        self._stopped = True
+        if self._ws is not None: await self._ws.close()
+        tasks = [t for t in self._bg + [self._task] if t is not None and not t.done()]
+        for t in tasks: t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
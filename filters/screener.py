@@ -0,0 +1,78 @@
+import asyncio
+from typing import List, Optional
+import numpy as np
+import config
+
+
+class ScreenTable:
+    """全市場 funding / 成交額的欄式表（每欄一個 NumPy array）"""
+    __slots__ = ("symbols", "funding", "quote_volume", "last_price")
+
+    def __init__(self, symbols, funding, quote_volume, last_price):
+        self.symbols = symbols
+        self.funding = funding
+        self.quote_volume = quote_volume
+        self.last_price = last_price
+
+    def __len__(self): return len(self.symbols)
+
+    @classmethod
+    def build(cls, premium: list, tickers: list) -> "ScreenTable":
+        tick = {t.get("symbol"): t for t in tickers or []}
+        syms, fund, vol, px = [], [], [], []
+        for p in premium or []:
+            s = p.get("symbol")
+            t = tick.get(s)
+            if t is None: continue
+            syms.append(s)
+            fund.append(p.get("lastFundingRate") or 0)
+            vol.append(t.get("quoteVolume") or 0)
+            px.append(t.get("lastPrice") or 0)
+        return cls(np.array(syms, dtype=object), np.array(fund, dtype=np.float64),
+                   np.array(vol, dtype=np.float64), np.array(px, dtype=np.float64))
+
+    def take(self, idx) -> "ScreenTable":
+        return ScreenTable(self.symbols[idx], self.funding[idx], self.quote_volume[idx], self.last_price[idx])
+
+    def select(self, symbols) -> "ScreenTable":
+        """只保留指定 symbols，並依傳入順序排列"""
+        pos = {s: i for i, s in enumerate(self.symbols)}
+        return self.take(np.array([pos[s] for s in symbols if s in pos], dtype=np.int64))
+
+    def mask(self, funding_min: float, volume_min: float) -> np.ndarray:
+        return (self.funding >= funding_min) & (self.quote_volume >= volume_min)
+
+
+async def fetch_table(client) -> ScreenTable:
+    # 兩個不帶 symbol 的 bulk 請求取代 2×N 個單一 symbol 請求
+    premium, tickers = await asyncio.gather(client.get_all_premium_index(), client.get_all_24h_stats())
+    return ScreenTable.build(premium, tickers)
+
+
+async def universe(client, table: ScreenTable = None) -> List[str]:
+    """SYMBOL_POOL_MODE=all：成交額 >= UNIVERSE_MIN_VOLUME_USD 的 USDT 永續合約（依成交額排序）"""
+    if table is None: table = await fetch_table(client)
+    try:
+        perps = await client.metadata.perpetuals("USDT")
+    except Exception:
+        perps = [s for s in table.symbols if s.endswith("USDT")]
+    t = table.select(perps)
+    t = t.take(t.quote_volume >= config.UNIVERSE_MIN_VOLUME_USD)
+    order = np.argsort(-t.quote_volume, kind="stable")
+    return list(t.symbols[order][:config.UNIVERSE_MAX_SYMBOLS])
+
+
+async def bulk_shortlist(client, pool: Optional[List[str]] = None, max_candidates: int = 6) -> List[str]:
+    table = await fetch_table(client)
+    if pool is None:
+        pool = await universe(client, table)
+    t = table.select(pool)   # 依 pool 順序（與逐一篩選版本一致）
+    if len(t) == 0:
+        return list(pool[:max_candidates])
+
+    approved = t.symbols[t.mask(config.FUNDING_RATE_MIN, config.VOLUME_MIN_USD)]
+    if len(approved):
+        return list(approved[:max_candidates])
+
+    top = np.argsort(-t.quote_volume, kind="stable")[:max_candidates]
+    return list(t.symbols[top])
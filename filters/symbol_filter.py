@@ -2,6 +2,7 @@ import asyncio
 from typing import List
 from decimal import Decimal
 import config
+from filters.screener import bulk_shortlist
 
 async def _metrics_for(client, symbol: str):
     try:
@@ -16,7 +17,14 @@ async def _metrics_for(client, symbol: str):
         vol = Decimal("0")
     return symbol, funding, vol
 
+def screening_pool():
+    """SYMBOL_POOL_MODE=all 時回傳 None（由 screener 依流動性決定全市場 universe）"""
+    return None if config.SYMBOL_POOL_MODE == "all" else config.SYMBOL_POOL
+
 async def shortlist(client, max_candidates: int = 6) -> List[str]:
+    if config.SCREEN_MODE == "bulk" or config.SYMBOL_POOL_MODE == "all":
+        return await bulk_shortlist(client, screening_pool(), max_candidates)
+
     tasks = [ _metrics_for(client, s) for s in config.SYMBOL_POOL ]
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
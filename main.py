@@ -1,19 +1,28 @@
 import asyncio, time, traceback
-from config import API_KEY, API_SECRET, SYMBOL_POOL, SCAN_INTERVAL, DEBUG_MODE, LEVERAGE
+from config import API_KEY, API_SECRET, SYMBOL_POOL, SCAN_INTERVAL, DEBUG_MODE
 from exchange.binance_client import BinanceClient
+from exchange.market_stream import MarketStream
+from exchange.user_stream import UserDataStream
 from risk.risk_mgr import RiskManager
+from risk.watchdog import RiskWatchdog
 from filters.symbol_filter import shortlist
-from strategies.trend import generate_trend_signal
-from strategies.revert import generate_revert_signal
+from strategies.signal_generator import generate_signal
+from strategies.batch import batch_signals
+from storage.candle_archive import CandleArchive
+from storage.state_store import StateStore
+from engine.scheduler import Scheduler
+from monitoring import metrics
+from monitoring.metrics import MetricsServer
 import config
 
-async def manage_symbol(client, rm, symbol):
+async def manage_symbol(client, rm, symbol, signals=None, signal_at=None):
     try:
-        await client.change_leverage(symbol, LEVERAGE)
-
-        trend = await generate_trend_signal(client, symbol)
-        revert = await generate_revert_signal(client, symbol)
-        sig = trend or revert
+        # 槓桿由 RiskManager.sizer 確認（與交易所目前設定相同時不發請求）
+        if signals is not None:
+            sig = signals.get(symbol)   # 批次路徑已算好
+        else:
+            sig = await generate_signal(client, symbol)   # 各策略的耗時在 registry 內分別記錄
+            signal_at = time.perf_counter()
 
         if not sig:
             print(f"[SKIP] {symbol} 無交易訊號")
@@ -22,6 +31,8 @@ async def manage_symbol(client, rm, symbol):
         print(f"[EXEC] {symbol} side={sig}")
         res = await rm.execute_trade(symbol, sig)
         if res:
+            if signal_at is not None:
+                metrics.observe("signal_to_fill_seconds", time.perf_counter() - signal_at)
             print(f"[ORDER OK] {symbol}: {res}")
         else:
             print(f"[ORDER FAIL] {symbol}")
@@ -30,29 +41,141 @@ async def manage_symbol(client, rm, symbol):
     except Exception as e:
         print(f"[ERROR] manage_symbol {symbol}: {e}\n{traceback.format_exc()}")
 
-async def scanner():
-    print("Starting Container")
-    client = BinanceClient(API_KEY, API_SECRET, testnet=config.TESTNET)
-    rm = RiskManager(client)
+async def manage_batch(rm, candidates, signals, signal_at=None):
+    """批次路徑：同輪所有進場訊號一次 sizing、合併成 batchOrders 送出"""
+    trades = {}
+    for s in candidates:
+        sig = signals.get(s)
+        if sig:
+            print(f"[EXEC] {s} side={sig}")
+            trades[s] = sig
+        else:
+            print(f"[SKIP] {s} 無交易訊號")
+    for s, res in (await rm.execute_batch(trades)).items():
+        if res:
+            if signal_at is not None:
+                metrics.observe("signal_to_fill_seconds", time.perf_counter() - signal_at)
+            print(f"[ORDER OK] {s}: {res}")
+        else:
+            print(f"[ORDER FAIL] {s}")
 
-    while True:
-        loop_start = time.time()
+async def trade_candidates(client, rm, candidates):
+    """訊號 → 下單（scan_cycle 與 engine.scheduler 共用）"""
+    signals, signal_at = None, None
+    if config.SIGNAL_MODE == "batch":
         try:
-            candidates = await shortlist(client, max_candidates=len(SYMBOL_POOL))
+            with metrics.timer("scan_phase_seconds", phase="signals"), \
+                 metrics.timer("strategy_signal_seconds", strategy="batch"):
+                signals = await batch_signals(client, candidates)
+            signal_at = time.perf_counter()
         except Exception as e:
-            print(f"[ERROR] shortlist: {e}")
-            candidates = SYMBOL_POOL
+            print(f"[ERROR] batch_signals: {e}\n{traceback.format_exc()}")
 
-        try:
-            tasks = [ manage_symbol(client, rm, s) for s in candidates ]
-            await asyncio.gather(*tasks, return_exceptions=True)
-        except Exception as e:
-            print(f"[ERROR] scanner (manage_symbol): {e}\n{traceback.format_exc()}")
+    try:
+        with metrics.timer("scan_phase_seconds", phase="manage"):
+            if signals is not None and config.ORDER_BATCH_ENABLED:
+                await manage_batch(rm, candidates, signals, signal_at)
+            else:
+                tasks = [ manage_symbol(client, rm, s, signals, signal_at) for s in candidates ]
+                await asyncio.gather(*tasks, return_exceptions=True)
+    except Exception as e:
+        print(f"[ERROR] scanner (manage_symbol): {e}\n{traceback.format_exc()}")
 
-        try:
-            await rm.monitor_all(SYMBOL_POOL)
-        except Exception as e:
-            print(f"[ERROR] monitor_all: {e}\n{traceback.format_exc()}")
+def export_rate(client):
+    for cls, n in client.limiter.queue_depth().items():
+        metrics.set_gauge("binance_ratelimit_queued", n, priority=cls)
+    metrics.set_gauge("binance_used_weight_1m", client.limiter.used_weight)
+
+async def scan_cycle(client, rm, watched, max_candidates):
+    """一輪掃描：篩選 → 訊號 → 下單 → 持倉監控（SCHEDULE_MODE=interval 的 scanner 迴圈與 bench 共用）"""
+    loop_start = time.time()
+    client.invalidate_snapshot()   # 每輪重新取得一次帳戶快照
+    try:
+        with metrics.timer("scan_phase_seconds", phase="shortlist"):
+            candidates = await shortlist(client, max_candidates=max_candidates)
+    except Exception as e:
+        print(f"[ERROR] shortlist: {e}")
+        candidates = config.SYMBOL_POOL
+    candidates = [s for s in candidates if rm.owns(s)]   # 分片模式只留自己 shard 的 symbol
+    watched.update(candidates)
+    metrics.set_gauge("scan_candidates", len(candidates))
+
+    await trade_candidates(client, rm, candidates)
+
+    try:
+        with metrics.timer("scan_phase_seconds", phase="monitor_all"):
+            await rm.monitor_all(sorted(watched))
+    except Exception as e:
+        print(f"[ERROR] monitor_all: {e}\n{traceback.format_exc()}")
+
+    metrics.observe("scan_phase_seconds", time.time() - loop_start, phase="cycle")
+    export_rate(client)
+    return candidates
+
+async def scanner(worker=None):
+    """worker（engine.cluster.Worker）：分片模式，額度走 coordinator、只管自己 shard 的 symbol"""
+    print("Starting Container" if worker is None else f"Starting worker {worker.index}/{worker.workers}")
+    client = BinanceClient(API_KEY, API_SECRET, testnet=config.TESTNET)
+    store = (StateStore(worker.state_path() if worker else None)) if config.STATE_ENABLED else None
+    rm = RiskManager(client, store=store)
+    if worker is not None: worker.attach(client, rm)
+    if store is not None: store.restore(client, rm)
+    pool = [s for s in SYMBOL_POOL if rm.owns(s)]
+
+    if config.CANDLE_ARCHIVE_ENABLED:
+        client.kline_store.archive = CandleArchive()
+
+    stream = None
+    if config.MARKET_DATA_MODE == "ws":
+        stream = MarketStream(client, pool, all_marks=config.WATCHDOG_ENABLED)
+        client.attach_market_stream(stream)
+        asyncio.create_task(stream.run())
+
+    uds = None
+    if config.USER_STREAM_ENABLED:
+        uds = UserDataStream(client)
+        client.attach_account_mirror(uds.mirror)
+        asyncio.create_task(uds.run())
+
+    watchdog = None
+    if config.WATCHDOG_ENABLED:
+        watchdog = RiskWatchdog(client, rm)
+        if stream is None:   # REST 行情模式：只為 watchdog 訂閱全市場標記價
+            stream = MarketStream(client, [], all_marks=True)
+            asyncio.create_task(stream.run())
+        stream.mark_listeners.append(watchdog.on_mark)
+        if uds is not None: uds.mirror.on_fill(watchdog.mark_dirty)
+        asyncio.create_task(watchdog.run())
+
+    if config.METRICS_PORT or config.METRICS_JSON_PATH:
+        # 分片模式每個 worker 各自一個 port（METRICS_PORT + index）/ JSON 檔
+        port = config.METRICS_PORT + worker.index if worker and config.METRICS_PORT else None
+        path = f"{config.METRICS_JSON_PATH}.w{worker.index}" if worker and config.METRICS_JSON_PATH else None
+        asyncio.create_task(MetricsServer(port=port, json_path=path).run())
+
+    max_candidates = config.UNIVERSE_MAX_SYMBOLS if config.SYMBOL_POOL_MODE == "all" else len(SYMBOL_POOL)
+    watched = set(pool)   # 曾進入候選的 symbol 都要持續監控持倉
+
+    def housekeeping():
+        if store is not None:
+            try: store.checkpoint(client, rm)
+            except Exception as e: print(f"[STATE] checkpoint error: {e}")
+
+        if DEBUG_MODE:
+            print(f"[RATE] {client.limiter.summary()}")
+            if watchdog is not None: print(f"[WATCHDOG] {watchdog.summary()}")
+
+    if config.SCHEDULE_MODE == "candle":
+        def after():
+            export_rate(client)
+            housekeeping()
+        await Scheduler(client, rm, watched, max_candidates, trade_candidates, after=after).run()
+        return
+
+    while True:
+        loop_start = time.time()
+        await scan_cycle(client, rm, watched, max_candidates)
+        housekeeping()
 
         elapsed = time.time() - loop_start
         wait = max(1, int(SCAN_INTERVAL - elapsed))
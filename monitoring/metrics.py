@@ -0,0 +1,189 @@
+import asyncio, json, os, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+from aiohttp import web
+import config
+
+# 秒；涵蓋 0.5ms（本地計算）到 30s（整輪掃描）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(kw) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[str, str] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """固定 bucket 的累積直方圖；observe 為一次 bisect + 兩次加法"""
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+        if v > self.max: self.max = v
+
+    def quantile(self, q: float) -> float:
+        """以 bucket 上緣估計分位數"""
+        if self.count == 0: return 0.0
+        target, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Registry:
+    """
+    程序內的 counter / gauge / histogram，鍵為 (name, labels)。
+    只在 event loop 執行緒內更新（executor 內的呼叫在回到 loop 後才記錄），不需要鎖。
+    """
+    def __init__(self):
+        self.help: Dict[str, Tuple[str, str]] = {}   # name → (type, help)
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._fast: Dict[tuple, Histogram] = {}   # (name, 呼叫端 labels 原樣) → Histogram，熱路徑免排序 / 轉字串
+        self.started = time.time()
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help.setdefault(name, (kind, text))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _labels(labels))
+        self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        fk = (name, *labels.items())
+        h = self._fast.get(fk)
+        if h is None:
+            key = (name, _labels(labels))
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            self._fast[fk] = h
+        h.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - t0, **labels)
+
+    # ----- 輸出 -----
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines, typed = [], set()
+
+        def head(name, kind):
+            if name in typed: return
+            typed.add(name)
+            k, text = self.help.get(name, (kind, ""))
+            if text: lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), v in sorted(self.counters.items()):
+            head(name, "counter"); lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), v in sorted(self.gauges.items()):
+            head(name, "gauge"); lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+            head(name, "histogram")
+            acc = 0
+            for le, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                acc += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', str(le)))} {acc}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        key = lambda name, labels: name + _fmt_labels(labels)
+        return {
+            "time": time.time(),
+            "uptime_sec": time.time() - self.started,
+            "counters": {key(n, l): v for (n, l), v in self.counters.items()},
+            "gauges": {key(n, l): v for (n, l), v in self.gauges.items()},
+            "histograms": {key(n, l): {"count": h.count, "sum": h.sum, "max": h.max,
+                                       "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                           for (n, l), h in self.histograms.items()},
+        }
+
+
+REGISTRY = Registry()
+inc, set_gauge, observe, timer = REGISTRY.inc, REGISTRY.set, REGISTRY.observe, REGISTRY.timer
+
+for _name, _kind, _text in (
+    ("binance_request_seconds", "histogram", "REST latency per endpoint (after rate-limit wait)"),
+    ("binance_request_errors_total", "counter", "REST errors per endpoint and Binance code"),
+    ("binance_ratelimit_wait_seconds", "histogram", "time queued in the rate limiter per priority class"),
+    ("binance_executor_wait_seconds", "histogram", "connector mode: semaphore + executor queue wait"),
+    ("scan_phase_seconds", "histogram", "scanner cycle phases"),
+    ("strategy_signal_seconds", "histogram", "signal computation per strategy"),
+    ("order_placement_seconds", "histogram", "RiskManager order placement incl. margin resize retries"),
+    ("signal_to_fill_seconds", "histogram", "signal available to order response"),
+    ("watchdog_tick_to_order_seconds", "histogram", "mark-price tick to order response"),
+    ("scheduler_evaluations_total", "counter", "candle scheduler: symbols evaluated per trigger (new/closed/moved) and skipped"),
+):
+    REGISTRY.describe(_name, _kind, _text)
+
+
+class MetricsServer:
+    """本機 HTTP /metrics（Prometheus 格式）＋ 可選的定期 JSON dump"""
+    def __init__(self, registry: Registry = None, host: str = None, port: int = None,
+                 json_path: str = None, json_interval: float = None):
+        self.registry = registry or REGISTRY
+        self.host = host or config.METRICS_HOST
+        self.port = config.METRICS_PORT if port is None else port
+        self.json_path = config.METRICS_JSON_PATH if json_path is None else json_path
+        self.json_interval = json_interval or config.METRICS_JSON_INTERVAL_SEC
+        self._runner = None
+
+    async def _metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self):
+        if not self.port: return
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"[METRICS] serving http://{self.host}:{self.port}/metrics")
+
+    def dump_json(self):
+        tmp = self.json_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp, self.json_path)
+
+    async def run(self):
+        await self.start()
+        if not self.json_path: return
+        while True:
+            await asyncio.sleep(self.json_interval)
+            try: self.dump_json()
+            except Exception as e: print(f"[METRICS] json dump failed: {e}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,62 @@
+import json
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Dict, Tuple
+import config
+
+# 策略訊號相關欄位：這些不變時整段歷史的訊號可以重用（最佳化時依此分組）
+SIGNAL_FIELDS = ("trend_ema_fast", "trend_ema_slow", "macd_signal", "revert_rsi_period",
+                 "revert_rsi_oversold", "revert_rsi_overbought", "boll_window", "boll_stddev")
+
+
+def _cast(tp, v):
+    """同一組參數不論來源（config / CLI 字串 / JSON）都得到相同型別，key() 才穩定"""
+    return int(float(v)) if tp in (int, "int") else float(v)
+
+
+@dataclass(frozen=True)
+class Params:
+    """
+    策略 / 風控可調參數（對應 config.py 同名大寫變數）。
+    config 只在 import 時讀一次；需要同一個 process 內評估多組參數（回測 / 最佳化）時改傳 Params。
+    """
+    trend_ema_fast: int
+    trend_ema_slow: int
+    macd_signal: int
+    revert_rsi_period: int
+    revert_rsi_oversold: float
+    revert_rsi_overbought: float
+    boll_window: int
+    boll_stddev: float
+    equity_ratio: float
+    leverage: int
+    max_pyramid: int
+    profit_add_threshold_pct: float
+    trailing_giveback_pct: float
+    max_loss_pct: float
+
+    @classmethod
+    def from_config(cls) -> "Params":
+        return cls(**{f.name: _cast(f.type, getattr(config, f.name.upper())) for f in fields(cls)})
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Params":
+        return cls.from_config().replace(**d)
+
+    def replace(self, **kw) -> "Params":
+        """以欄位名（大小寫皆可，如 TREND_EMA_FAST）覆寫，並轉成欄位型別"""
+        types = {f.name: f.type for f in fields(self)}
+        out = {}
+        for k, v in kw.items():
+            name = k.lower()
+            if name not in types: raise KeyError(f"unknown parameter: {k}")
+            out[name] = _cast(types[name], v)
+        return replace(self, **out)
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+    def key(self) -> str:
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def signal_key(self) -> Tuple:
+        return tuple(getattr(self, f) for f in SIGNAL_FIELDS)
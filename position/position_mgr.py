@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Dict
 
 @dataclass
@@ -8,13 +8,17 @@ class PosState:
     last_breakout_price: float = 0.0  # 最近一次突破加碼的觸發價（避免連續觸發）
 
 class PositionManager:
-    def __init__(self):
-        self.state: Dict[str, PosState] = {}
+    def __init__(self, store=None):
+        # store（storage.state_store.StateStore）：PosState 以 dict 落盤；欄位直接改動後呼叫 save() 寫入
+        self.state: Dict[str, PosState] = store.mapping("position_state", asdict, lambda d: PosState(**d)) if store else {}
 
     def get(self, symbol: str) -> PosState:
         if symbol not in self.state:
             self.state[symbol] = PosState()
         return self.state[symbol]
 
+    def save(self, symbol: str):
+        if symbol in self.state and hasattr(self.state, "flush"): self.state.flush(symbol)
+
     def reset(self, symbol: str):
         self.state[symbol] = PosState()
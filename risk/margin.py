@@ -0,0 +1,187 @@
+import asyncio, time
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+import config
+
+FEE_TTL = 86400   # commissionRate 權重 20：一天只查一次，當作全帳戶的 taker 費率
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+class Bracket:
+    """單一 leverage bracket：名目價值 [floor, cap) 內最高 max_leverage 倍，維持保證金率 mmr"""
+    __slots__ = ("floor", "cap", "max_leverage", "mmr", "cum")
+
+    def __init__(self, b: dict):
+        self.floor = _D(b.get("notionalFloor", "0"))
+        self.cap = _D(b.get("notionalCap", "0"))
+        self.max_leverage = int(b.get("initialLeverage", 1))
+        self.mmr = _D(b.get("maintMarginRatio", "0"))
+        self.cum = _D(b.get("cum", "0"))
+
+
+class LeverageBrackets:
+    """
+    leverageBracket 快取（不帶 symbol 一次取得全部，權重 1）：TTL 內只在記憶體查詢，
+    過期時下一次 ensure() 重抓；抓取失敗保留舊資料。
+    """
+    def __init__(self, fetch, ttl: float = None):
+        self._fetch = fetch
+        self.ttl = config.LEVERAGE_BRACKET_TTL if ttl is None else ttl
+        self._by_symbol: Dict[str, List[Bracket]] = {}
+        self._raw: list = []
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool: return bool(self._by_symbol)
+
+    @property
+    def loaded_at(self) -> float: return self._loaded_at
+
+    def dump(self) -> list:
+        return self._raw
+
+    def load(self, data, loaded_at: float = None):
+        if isinstance(data, dict): data = [data]
+        self._raw = list(data or [])
+        out = {}
+        for item in data or []:
+            sym = item.get("symbol")
+            if sym: out[sym] = sorted((Bracket(b) for b in item.get("brackets", [])), key=lambda b: b.floor)
+        self._by_symbol = out
+        self._loaded_at = loaded_at if loaded_at is not None else time.time()
+
+    async def ensure(self):
+        if self.loaded and time.time() - self._loaded_at < self.ttl: return
+        async with self._lock:
+            if self.loaded and time.time() - self._loaded_at < self.ttl: return
+            try:
+                self.load(await self._fetch())
+                print(f"[MARGIN] leverage brackets loaded: {len(self._by_symbol)} symbols")
+            except Exception as e:
+                self._loaded_at = time.time() - self.ttl + 60   # 失敗後 1 分鐘內不重試
+                print(f"[MARGIN] leverage brackets error: {e}")
+
+    def get(self, symbol: str) -> List[Bracket]:
+        return self._by_symbol.get(symbol, [])
+
+    def max_leverage(self, symbol: str, notional: Decimal = Decimal("0")) -> Optional[int]:
+        """持倉名目價值 notional 時可用的最高槓桿"""
+        for b in self.get(symbol):
+            if notional < b.cap: return b.max_leverage
+        return None
+
+    def max_notional(self, symbol: str, leverage: int) -> Optional[Decimal]:
+        """以 leverage 倍持有時允許的最大名目價值（max_leverage >= leverage 的 bracket 中最高的 cap）"""
+        caps = [b.cap for b in self.get(symbol) if b.max_leverage >= leverage]
+        return max(caps) if caps else (None if not self.get(symbol) else Decimal("0"))
+
+
+class MarginModel:
+    """
+    USDⓈ-M 單向持倉的下單成本（每單位數量，參考價 p、槓桿 L、價格緩衝 b、taker 費率 f）：
+        p × (1 + b) / L   初始保證金（以較差的成交價估）
+      + p × b             open loss（市價單成交價與標記價的差）
+      + p × f             手續費
+    反向單先抵銷既有持倉（不需保證金），超出的部分才計成本；同方向加上持倉後的名目價值不得超過 bracket 上限。
+    """
+    def __init__(self, client, fee_rate: float = None, buffer: float = None):
+        self.client = client
+        self.buffer = _D(config.MARGIN_PRICE_BUFFER if buffer is None else buffer)
+        self.fee_rate = _D(config.MARGIN_FEE_RATE if fee_rate is None else fee_rate)
+        fetch = getattr(client, "get_leverage_brackets", None)
+        self.brackets = LeverageBrackets(fetch) if fetch is not None else None
+        self.fee_at = 0.0
+
+    @property
+    def active(self) -> bool:
+        """交易所 client 才有保證金限制（回測 SimClient 不套用，維持與 run_fast 一致）"""
+        return self.brackets is not None
+
+    async def ensure(self, symbol: str = None):
+        if not self.active: return
+        await self.brackets.ensure()
+        if symbol and time.time() - self.fee_at > FEE_TTL and hasattr(self.client, "get_commission_rate"):
+            self.fee_at = time.time()
+            try:
+                r = await self.client.get_commission_rate(symbol)
+                if r and r.get("takerCommissionRate") is not None:
+                    self.fee_rate = _D(r["takerCommissionRate"])
+            except Exception as e:
+                print(f"[MARGIN] commissionRate error: {e}")
+
+    def load_fee(self, rate, fetched_at: float):
+        self.fee_rate, self.fee_at = _D(rate), fetched_at
+
+    def available(self, snap) -> Decimal:
+        """
+        可用保證金：交易所回報的 availableBalance 與本地估計（權益 + 未實現虧損 − 持倉初始保證金）取較小者。
+        user stream 鏡像的 available 只隨錢包變動調整、不含新開倉的初始保證金，本地估計可補上這段落差
+        """
+        used = loss = Decimal("0")
+        for p in snap.positions.values():
+            amt = p["positionAmt"]
+            if amt == 0: continue
+            lev = p["leverage"] if p["leverage"] > 0 else Decimal("1")
+            used += abs(amt) * (p["markPrice"] or p["entryPrice"]) / lev
+            loss += min(p["unrealizedProfit"], Decimal("0"))
+        return max(min(_D(snap.available), _D(snap.equity) + loss - used), Decimal("0"))
+
+    def unit_cost(self, price: Decimal, leverage: int) -> Decimal:
+        p = _D(price)
+        return p * (1 + self.buffer) / _D(leverage) + p * self.buffer + p * self.fee_rate
+
+    def cost(self, qty: Decimal, price: Decimal, leverage: int, side: str, pos_amt: Decimal = Decimal("0")) -> Decimal:
+        """下 qty 需要的可用保證金（反向單抵銷既有持倉的部分不計）"""
+        s = 1 if side == "LONG" else -1
+        opening = qty - abs(pos_amt) if pos_amt * s < 0 else qty
+        return max(opening, Decimal("0")) * self.unit_cost(price, leverage)
+
+    def max_qty(self, symbol: str, side: str, price: Decimal, leverage: int, available: Decimal,
+                pos_amt: Decimal = Decimal("0")) -> Decimal:
+        """可用保證金 available 下，symbol 以 leverage 倍能成交的最大數量（未依 step size 取整）"""
+        price = _D(price)
+        if price <= 0: return Decimal("0")
+        s = 1 if side == "LONG" else -1
+        offset = abs(pos_amt) if pos_amt * s < 0 else Decimal("0")   # 反向單先平掉的數量
+        q = offset + max(_D(available), Decimal("0")) / self.unit_cost(price, leverage)
+        cap = self.brackets.max_notional(symbol, leverage) if self.active else None
+        if cap is not None:
+            held = abs(pos_amt) if pos_amt * s > 0 else Decimal("0")
+            q = min(q, max(cap / price - held, Decimal("0")) + offset)
+        return q
+
+
+class MarginPool:
+    """
+    同時進場的多筆訂單共用的可用保證金：take() 逐筆縮量並扣抵，plan() 只試算不扣抵。
+    proportional=True 時所有訂單等比例縮量（先算總成本），否則依序先到先得。
+    """
+    def __init__(self, model: MarginModel, available: Decimal):
+        self.model = model
+        self.remaining = _D(available)
+
+    def take(self, symbol: str, side: str, qty: Decimal, price: Decimal, leverage: int,
+             pos_amt: Decimal = Decimal("0"), filters=None) -> Decimal:
+        q = min(qty, self.model.max_qty(symbol, side, price, leverage, self.remaining, pos_amt))
+        if filters is not None: q = filters.quantize_qty(q)
+        if q <= 0: return Decimal("0")
+        self.remaining -= self.model.cost(q, price, leverage, side, pos_amt)
+        return q
+
+    def release(self, qty: Decimal, kept: Decimal, price: Decimal, leverage: int, side: str,
+                pos_amt: Decimal = Decimal("0")):
+        """take() 過 qty、實際只用 kept（例如分片模式只核准一部分）：把差額的保證金還回 pool"""
+        cost = self.model.cost
+        self.remaining += cost(qty, price, leverage, side, pos_amt) - cost(kept, price, leverage, side, pos_amt)
+
+    def plan(self, entries: Sequence[Tuple], proportional: bool = False) -> List[Decimal]:
+        """entries：(symbol, side, qty, price, leverage, pos_amt, filters)；回傳各筆可成交數量"""
+        pool = MarginPool(self.model, self.remaining)
+        if proportional:
+            total = sum(self.model.cost(e[2], e[3], e[4], e[1], e[5]) for e in entries)
+            k = min(Decimal("1"), pool.remaining / total) if total > 0 else Decimal("1")
+            entries = [(e[0], e[1], e[2] * k) + tuple(e[3:]) for e in entries]
+        return [pool.take(*e) for e in entries]
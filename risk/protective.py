@@ -0,0 +1,152 @@
+import time
+from decimal import Decimal
+from typing import Dict, Optional
+import config
+
+PREFIX = "rmp"   # 本模組掛的委託 clientOrderId 前綴：rmp-stop-<ms> / rmp-trail-<ms>
+STOP, TRAIL = "stop", "trail"
+ORDER_TYPES = {STOP: "STOP_MARKET", TRAIL: "TRAILING_STOP_MARKET"}
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+def callback_rate(activation_pct: float, giveback_pct: float) -> Decimal:
+    """
+    移動停利回撤（%，交易所限制 0.1~10）：在啟動點 pr = activation 時，
+    RiskManager 允許回吐 activation × giveback 的獲利，換算成相對於當時價格的百分比
+    """
+    if config.PROTECTIVE_CALLBACK_RATE > 0:
+        rate = config.PROTECTIVE_CALLBACK_RATE
+    else:
+        rate = activation_pct * giveback_pct / (1.0 + activation_pct) * 100.0
+    return _D(round(min(max(rate, 0.1), 10.0), 1))
+
+
+def kind_of(order: dict) -> Optional[str]:
+    cid = order.get("clientOrderId") or ""
+    if not cid.startswith(PREFIX + "-"): return None
+    k = cid.split("-")[1]
+    return k if k in ORDER_TYPES else None
+
+
+class ProtectiveOrders:
+    """
+    交易所端的保護單（reduce-only，以標記價觸發）：
+    - STOP_MARKET：stopPrice 對應 RiskManager 的最大虧損（pr = −MAX_LOSS_PCT）
+    - TRAILING_STOP_MARKET：activationPrice 在 pr = PROTECTIVE_TRAIL_ACTIVATION_PCT，callbackRate 見 callback_rate()
+    開倉 / 加碼 / 平倉後 sync() 依最新持倉掛上或改單（取消後重掛：先掛新單再撤舊單，不留空窗）；
+    每輪 reconcile() 以一次 openOrders（或 user stream 鏡像）比對所有持倉，補掛缺的、撤掉多餘的。
+    """
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+        self.activation_pct = config.PROTECTIVE_TRAIL_ACTIVATION_PCT
+        self.tolerance = _D(config.PROTECTIVE_PRICE_TOLERANCE)
+        self.orders: Dict[str, Dict[str, dict]] = {}   # symbol → kind → {orderId, qty, price}
+
+    def covers(self, symbol: str) -> bool:
+        """交易所端停損已掛好（client 端可省略停損判斷）"""
+        return STOP in self.orders.get(symbol, {})
+
+    def covers_trail(self, symbol: str, hw) -> bool:
+        """
+        交易所端移動停利已掛好且高水位已過啟動點（撮合引擎正在追蹤高點），client 端可省略移動停利判斷；
+        啟動點之前仍由 RiskManager 依 giveback 判斷
+        """
+        return TRAIL in self.orders.get(symbol, {}) and float(hw) >= self.activation_pct
+
+    # ----- 目標委託 -----
+    async def targets(self, symbol: str, pos: dict) -> Dict[str, dict]:
+        amt, entry = pos["positionAmt"], pos["entryPrice"]
+        if amt == 0 or entry <= 0: return {}
+        f = await self.client.get_symbol_filters(symbol)
+        side = "SELL" if amt > 0 else "BUY"
+        s = 1 if amt > 0 else -1
+        qty = f.quantize_qty(abs(amt)) if f else abs(amt)
+        if qty <= 0: return {}
+        px = (lambda p: f.quantize_price(p)) if f else (lambda p: p)
+        stop = px(entry * (1 - s * _D(self.params.max_loss_pct)))
+        out = {}
+        if stop > 0:
+            out[STOP] = {"side": side, "qty": qty, "price": stop, "stopPrice": str(stop)}
+        act = px(entry * (1 + s * _D(self.activation_pct)))
+        out[TRAIL] = {"side": side, "qty": qty, "price": act, "activationPrice": str(act),
+                      "callbackRate": str(callback_rate(self.activation_pct, self.params.trailing_giveback_pct))}
+        return out
+
+    def _stale(self, cur: Optional[dict], want: dict) -> bool:
+        if cur is None: return True
+        if cur["qty"] != want["qty"]: return True
+        return abs(cur["price"] - want["price"]) > want["price"] * self.tolerance
+
+    # ----- 下單 / 撤單 -----
+    async def _place(self, symbol: str, kind: str, want: dict) -> Optional[dict]:
+        extra = {k: want[k] for k in ("stopPrice", "activationPrice", "callbackRate") if k in want}
+        try:
+            res = await self.client._call("new_order", symbol=symbol, side=want["side"], type=ORDER_TYPES[kind],
+                                          quantity=str(want["qty"]), reduceOnly=True, workingType="MARK_PRICE",
+                                          newClientOrderId=f"{PREFIX}-{kind}-{int(time.time() * 1000)}", **extra)
+        except Exception as e:
+            print(f"[PROTECT] place {kind} {symbol} error: {e}")
+            return None
+        print(f"[PROTECT] {symbol} {ORDER_TYPES[kind]} qty={want['qty']} {extra}")
+        return {"orderId": res.get("orderId"), "qty": want["qty"], "price": want["price"]}
+
+    async def _cancel(self, symbol: str, order_id) -> bool:
+        try:
+            await self.client.cancel_order(symbol, order_id)
+            return True
+        except Exception as e:
+            print(f"[PROTECT] cancel {symbol} #{order_id} error: {e}")
+            return False
+
+    async def sync(self, symbol: str, pos: Optional[dict] = None):
+        """讓 symbol 的保護單與持倉一致（持倉為 0 則全部撤掉）"""
+        if pos is None:
+            snap = await self.client.account_snapshot()
+            pos = snap.position(symbol) if snap else await self.client.get_position(symbol)
+        wants = await self.targets(symbol, pos) if pos else {}
+        have = self.orders.setdefault(symbol, {})
+        for kind in ORDER_TYPES:
+            cur, want = have.get(kind), wants.get(kind)
+            if want is None:
+                if cur is not None and await self._cancel(symbol, cur["orderId"]):
+                    have.pop(kind, None)
+                continue
+            if not self._stale(cur, want): continue
+            new = await self._place(symbol, kind, want)
+            if new is None: continue   # 新單失敗就保留舊單
+            have[kind] = new
+            if cur is not None: await self._cancel(symbol, cur["orderId"])
+        if not have: self.orders.pop(symbol, None)
+
+    async def reconcile(self, snap, open_orders: list = None, owns=None):
+        """
+        每輪校正：open_orders（未給則 REST openOrders 一次）中屬於本模組的委託重新認領，
+        同一種類多張只留一張、無持倉的 symbol 全撤，再對每個持倉 sync()。owns（分片模式）只處理自己的 symbol
+        """
+        if open_orders is None:
+            try: open_orders = await self.client.get_open_orders()
+            except Exception as e:
+                print(f"[PROTECT] openOrders error: {e}")
+                return
+        seen: Dict[str, Dict[str, dict]] = {}
+        for o in open_orders or []:
+            kind = kind_of(o)
+            if kind is None or (owns is not None and not owns(o.get("symbol"))): continue
+            sym = o.get("symbol")
+            price = _D(o.get("stopPrice") or 0) if kind == STOP else _D(o.get("activatePrice") or o.get("activationPrice") or 0)
+            rec = {"orderId": o.get("orderId"), "qty": _D(o.get("origQty", "0")), "price": price}
+            kinds = seen.setdefault(sym, {})
+            if kind in kinds:
+                await self._cancel(sym, rec["orderId"])
+            else:
+                kinds[kind] = rec
+        self.orders = seen
+        open_syms = {s for s in (snap.open_symbols() if snap is not None else []) if owns is None or owns(s)}
+        for sym in list(seen):
+            if sym not in open_syms:
+                await self.sync(sym, {"positionAmt": Decimal("0"), "entryPrice": Decimal("0")})
+        for sym in open_syms:
+            await self.sync(sym, snap.position(sym))
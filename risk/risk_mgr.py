@@ -1,38 +1,73 @@
+import asyncio
 from decimal import Decimal, getcontext
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, Set
 import config
 from exchange.binance_client import BinanceClient
+from exchange.errors import MarginInsufficientError
+from params import Params
+from risk.protective import ProtectiveOrders
+from risk.sizing import OrderSizer
+from monitoring import metrics
 
 getcontext().prec = 28
 
+# ----- 出場 / 加碼規則（Decimal 純量與 NumPy 向量皆可用；回測 fast path 共用） -----
+def stop_hit(pr, max_loss):
+    return pr <= -max_loss
+
+def add_due(pr, count, threshold, max_pyramid):
+    return (pr >= threshold) & (count < max_pyramid)
+
+def trail_hit(pr, hw, giveback_pct):
+    return (hw > 0) & ((hw - pr) >= hw * giveback_pct)
+
 class RiskManager:
-    def __init__(self, client: BinanceClient, equity_ratio: float = None):
+    def __init__(self, client: BinanceClient, equity_ratio: float = None, params: Params = None,
+                 protective: bool = None, store=None):
         self.client = client
-        self.equity_ratio = Decimal(str(equity_ratio if equity_ratio is not None else config.EQUITY_RATIO))
-        self.high_water: Dict[str, Decimal] = {}
-        self.pyramids: Dict[str, int] = {}
-
-    async def get_order_qty(self, symbol: str) -> Decimal:
-        price = await self.client.get_price(symbol)
-        if not price or price <= 0: return Decimal("0")
-        equity = await self.client.get_equity()
-        if equity <= 0: return Decimal("0")
-        notional = Decimal(str(equity)) * self.equity_ratio
-        raw_qty = (notional * Decimal(str(config.LEVERAGE))) / Decimal(str(price))
-        q = await self.client._quantize_qty(symbol, raw_qty)
-        return q
-
-    async def _place_with_resize(self, symbol: str, side: str, qty: Decimal, max_retries: int = 3):
-        cur = qty
+        self.params = params or Params.from_config()
+        protective = config.PROTECTIVE_ORDERS_ENABLED if protective is None else protective
+        self.protective = ProtectiveOrders(client, self.params) if protective else None
+        self.equity_ratio = Decimal(str(equity_ratio if equity_ratio is not None else self.params.equity_ratio))
+        self.sizer = OrderSizer(client, self.params, self.equity_ratio)
+        # store（storage.state_store.StateStore）：high water / 加碼次數 / 槓桿每次變動即落盤，重啟後接續
+        self.high_water: Dict[str, Decimal] = store.mapping("high_water", str, Decimal) if store else {}
+        self.pyramids: Dict[str, int] = store.mapping("pyramids", int, int) if store else {}
+        if store: self.sizer.leverage = store.mapping("leverage", int, int)
+        self.busy: Set[str] = set()
+        self.shard: Optional[Callable[[str], bool]] = None   # 分片模式（engine.cluster.Worker.owns）：只管自己的 symbol
+
+    def owns(self, symbol: str) -> bool:
+        return self.shard is None or self.shard(symbol)
+
+    async def _equity(self) -> Decimal:
+        return await self.sizer.account_equity()
+
+    async def get_order_qty(self, symbol: str, price: Decimal = None) -> Decimal:
+        return await self.sizer.qty(symbol, price)
+
+    async def _place_with_resize(self, symbol: str, side: str, qty: Decimal, max_retries: int = 3, price: Decimal = None,
+                                 refresh: bool = False):
+        """
+        送單前先以本地保證金模型縮到可成交的最大數量；仍被拒（-2019 / -2027，帳戶狀態已變）時重抓帳戶再算一次，
+        模型算不出更小的數量（或沒有模型，例如回測）才退回減半重試。
+        qty 為尚未 fit 的原始數量（每筆只從 pool 扣抵一次）；refresh：先重抓帳戶、重建 pool 再 fit
+        """
+        if side not in ("LONG", "SHORT"):
+            print(f"[RISK] Unknown side {side}"); return None
+        cur = await self.sizer.fit(symbol, side, qty, price, refresh=refresh)
+        if cur <= 0:
+            print(f"[RISK] margin exhausted, skip {symbol}"); return None
+        if cur < qty: print(f"[RISK] Margin insufficient, resize qty {qty} → {cur} ({symbol})")
         for _ in range(max_retries + 1):
             try:
-                if side == "LONG": return await self.client.open_long(symbol, cur)
-                if side == "SHORT": return await self.client.open_short(symbol, cur)
-                print(f"[RISK] Unknown side {side}"); return None
+                return await (self.client.open_long if side == "LONG" else self.client.open_short)(symbol, cur)
             except Exception as e:
                 emsg = str(e)
-                if "-2019" in emsg or "Margin is insufficient" in emsg:
-                    cur = (cur * Decimal("0.5")).quantize(Decimal("0.00000001"))
+                if isinstance(e, MarginInsufficientError) or "-2019" in emsg or "Margin is insufficient" in emsg:
+                    nxt = await self.sizer.fit(symbol, side, cur, price, refresh=True)
+                    if nxt >= cur: nxt = (cur * Decimal("0.5")).quantize(Decimal("0.00000001"))
+                    cur = nxt
                     if cur <= 0:
                         print(f"[RISK] qty too small after resize: {symbol}")
                         return None
@@ -43,42 +78,138 @@ class RiskManager:
                     return None
         return None
 
-    async def execute_trade(self, symbol: str, side: str):
+    async def execute_trade(self, symbol: str, side: str, price: Decimal = None):
+        """單筆進場；sizing 已 prepare（或帶入 price）時只發 new_order 一個請求"""
         try:
-            qty = await self.get_order_qty(symbol)
+            await self.sizer.ensure_leverage(symbol)
+            qty = await self.get_order_qty(symbol, price)
             if qty <= 0:
                 print(f"[RISK] qty too small: {symbol}")
                 return None
-            return await self._place_with_resize(symbol, side, qty)
+            with metrics.timer("order_placement_seconds", side=side):
+                res = await self._place_with_resize(symbol, side, qty, price=price)
         except Exception as e:
             print(f"[RISK] execute_trade error {symbol}: {e}")
             return None
+        if res: await self._sync_protective(symbol)
+        return res
+
+    async def _submit(self, chunk):
+        """一組（<= ORDER_BATCH_SIZE）訂單：1 筆走 new_order、多筆走 batchOrders；回傳與 chunk 同順序的結果或例外"""
+        if len(chunk) == 1:
+            symbol, side, qty = chunk[0]
+            try:
+                return [await (self.client.open_long if side == "LONG" else self.client.open_short)(symbol, qty)]
+            except Exception as e:
+                return [e]
+        orders = [{"symbol": s, "side": "BUY" if side == "LONG" else "SELL", "type": "MARKET", "quantity": q}
+                  for s, side, q in chunk]
+        try:
+            return await self.client.place_orders(orders)
+        except Exception as e:
+            return [e] * len(chunk)
+
+    async def execute_batch(self, trades: Dict[str, str]) -> Dict[str, Optional[dict]]:
+        """
+        同一輪的多個進場訊號（symbol → LONG / SHORT）：sizing 一次備齊、所有訂單共用可用保證金先在本地縮量
+        （MARGIN_ALLOCATION），再每 ORDER_BATCH_SIZE 筆合併成一個 batchOrders。
+        逐筆處理結果：仍被拒為保證金不足的單筆改走 _place_with_resize（重抓帳戶後重算），其餘錯誤記錄後略過；成功的同步保護單。
+        """
+        out: Dict[str, Optional[dict]] = {s: None for s in trades}
+        if not trades: return out
+        try:
+            await self.sizer.prepare(trades)
+        except Exception as e:
+            print(f"[RISK] sizing prepare error: {e}")
+        wanted = []
+        for s, side in trades.items():
+            if side not in ("LONG", "SHORT"):
+                print(f"[RISK] Unknown side {side}"); continue
+            try:
+                qty = await self.get_order_qty(s)
+            except Exception as e:
+                print(f"[RISK] sizing error {s}: {e}"); continue
+            if qty <= 0:
+                print(f"[RISK] qty too small: {s}"); continue
+            wanted.append((s, side, qty))
+        try:
+            fits = await self.sizer.reserve(wanted)
+        except Exception as e:
+            print(f"[RISK] margin model error: {e}")
+            fits = [q for _, _, q in wanted]
+        orders = []
+        for (s, side, qty), fit in zip(wanted, fits):
+            if fit <= 0:
+                print(f"[RISK] margin exhausted, skip {s}"); continue
+            if fit < qty: print(f"[RISK] Margin insufficient, resize qty {qty} → {fit} ({s})")
+            orders.append((s, side, fit, qty))
+        n = max(1, min(config.ORDER_BATCH_SIZE, 5))
+        chunks = [orders[i:i + n] for i in range(0, len(orders), n)]
+        with metrics.timer("order_placement_seconds", side="batch"):
+            results = await asyncio.gather(*[self._submit([o[:3] for o in c]) for c in chunks])
+        for chunk, res in zip(chunks, results):
+            for (s, side, _, wanted_qty), r in zip(chunk, res):
+                if isinstance(r, MarginInsufficientError):
+                    # 重抓帳戶重建 pool 後以原始數量 fit 一次（reserve 的扣抵隨舊 pool 作廢，不會重複扣）
+                    print(f"[RISK] Margin insufficient in batch, refit {s}")
+                    r = await self._place_with_resize(s, side, wanted_qty, refresh=True)
+                elif isinstance(r, Exception):
+                    print(f"[RISK] place order error {s}: {r}")
+                    r = None
+                out[s] = r
+                if r: await self._sync_protective(s)
+        return out
+
+    async def _sync_protective(self, symbol: str, pos=None):
+        """持倉變動後讓交易所端保護單跟上（開倉 / 加碼改數量、平倉撤單）"""
+        if self.protective is None: return
+        try:
+            await self.protective.sync(symbol, pos)
+        except Exception as e:
+            print(f"[PROTECT] sync {symbol} error: {e}")
 
-    async def add_pyramid(self, symbol: str, side: str):
-        if self.pyramids.get(symbol, 0) >= config.MAX_PYRAMID:
+    async def add_pyramid(self, symbol: str, side: str, price: Decimal = None):
+        if self.pyramids.get(symbol, 0) >= self.params.max_pyramid:
             return None
-        res = await self.execute_trade(symbol, side)
+        res = await self.execute_trade(symbol, side, price)
         if res:
             self.pyramids[symbol] = self.pyramids.get(symbol, 0) + 1
             print(f"[PYRAMID] {symbol} count={self.pyramids[symbol]}")
         return res
 
-    async def _profit_ratio(self, symbol: str) -> Optional[Decimal]:
-        pos = await self.client.get_position(symbol)
+    @staticmethod
+    def _profit_ratio(pos) -> Optional[Decimal]:
         if not pos or pos["positionAmt"] == 0 or pos["entryPrice"] == 0: return None
         notional = abs(pos["positionAmt"]) * pos["entryPrice"]
         if notional <= 0: return None
         return pos["unrealizedProfit"] / notional
 
-    async def monitor_symbol(self, symbol: str):
-        pos = await self.client.get_position(symbol)
+    async def monitor_symbol(self, symbol: str, snap=None):
+        if snap is None:
+            snap = await self.client.account_snapshot()
+        pos = snap.position(symbol) if snap else await self.client.get_position(symbol)
+        await self.check_position(symbol, pos)
+
+    async def check_position(self, symbol: str, pos):
+        """
+        對單一持倉套用停損 / 獲利加碼 / 移動停利，回傳動作（"stop" / "add" / "trail" / None）。
+        watchdog 以 tick 標記價組出的 pos 直接呼叫。
+        """
+        if symbol in self.busy: return None   # 同一 symbol 已有動作進行中（scan 與 watchdog 不重複下單）
+        self.busy.add(symbol)
+        try:
+            return await self._check_position(symbol, pos)
+        finally:
+            self.busy.discard(symbol)
+
+    async def _check_position(self, symbol: str, pos):
         if not pos or pos["positionAmt"] == 0:
             self.high_water.pop(symbol, None)
             self.pyramids.pop(symbol, None)
             return
 
         side = "LONG" if pos["positionAmt"] > 0 else "SHORT"
-        pr = await self._profit_ratio(symbol)
+        pr = self._profit_ratio(pos)
         if pr is None: return
 
         hw = self.high_water.get(symbol, Decimal("0"))
@@ -86,28 +217,45 @@ class RiskManager:
             self.high_water[symbol] = pr
             hw = pr
 
-        if pr <= Decimal(str(-config.MAX_LOSS_PCT)):
-            print(f"[STOP-LOSS] {symbol} pr={pr:.4f} <= -{config.MAX_LOSS_PCT*100:.1f}% → close")
-            await self.client.close_position(symbol)
+        # 交易所端 STOP_MARKET 已掛好時停損由撮合引擎執行，這裡不再重複判斷
+        covered = self.protective is not None and self.protective.covers(symbol)
+        if not covered and stop_hit(pr, Decimal(str(self.params.max_loss_pct))):
+            print(f"[STOP-LOSS] {symbol} pr={pr:.4f} <= -{self.params.max_loss_pct*100:.1f}% → close")
+            await self.client.close_position(symbol, pos)
             self.high_water.pop(symbol, None)
             self.pyramids.pop(symbol, None)
-            return
+            await self._sync_protective(symbol)
+            return "stop"
 
-        if pr >= Decimal(str(config.PROFIT_ADD_THRESHOLD_PCT)):
-            if self.pyramids.get(symbol, 0) < config.MAX_PYRAMID:
-                print(f"[PYRAMID-ON-PROFIT] {symbol} pr={pr:.4f} >= {config.PROFIT_ADD_THRESHOLD_PCT*100:.1f}% → add")
-                await self.add_pyramid(symbol, side)
+        added = None
+        if add_due(pr, self.pyramids.get(symbol, 0), Decimal(str(self.params.profit_add_threshold_pct)), self.params.max_pyramid):
+            print(f"[PYRAMID-ON-PROFIT] {symbol} pr={pr:.4f} >= {self.params.profit_add_threshold_pct*100:.1f}% → add")
+            added = await self.add_pyramid(symbol, side, pos.get("markPrice"))
 
-        if hw > 0:
+        # 交易所端 TRAILING_STOP_MARKET 已啟動時同理
+        trail_covered = self.protective is not None and self.protective.covers_trail(symbol, hw)
+        if not trail_covered and trail_hit(pr, hw, Decimal(str(self.params.trailing_giveback_pct))):
             giveback = (hw - pr)
-            if giveback >= hw * Decimal(str(config.TRAILING_GIVEBACK_PCT)):
-                print(f"[TRAIL-EXIT] {symbol} pr={pr:.4f}, hw={hw:.4f}, giveback={giveback:.4f} → close")
-                await self.client.close_position(symbol)
-                self.high_water.pop(symbol, None)
-                self.pyramids.pop(symbol, None)
-                return
+            print(f"[TRAIL-EXIT] {symbol} pr={pr:.4f}, hw={hw:.4f}, giveback={giveback:.4f} → close")
+            # 剛加碼過則快照已失效，改抓最新持倉數量
+            await self.client.close_position(symbol, None if added else pos)
+            self.high_water.pop(symbol, None)
+            self.pyramids.pop(symbol, None)
+            await self._sync_protective(symbol)
+            return "trail"
+        return "add" if added else None
 
     async def monitor_all(self, symbols):
         from asyncio import gather
-        tasks = [ self.monitor_symbol(s) for s in symbols ]
+        # 整輪共用同一份帳戶快照：2 個 signed 請求涵蓋所有 symbol
+        snap = await self.client.account_snapshot()
+        if snap is not None:
+            symbols = list(dict.fromkeys(list(symbols) + snap.open_symbols()))
+        symbols = [s for s in symbols if self.owns(s)]
+        tasks = [ self.monitor_symbol(s, snap) for s in symbols ]
         await gather(*tasks, return_exceptions=True)
+        if self.protective is not None:
+            try:
+                await self.protective.reconcile(await self.client.account_snapshot(), owns=self.owns)
+            except Exception as e:
+                print(f"[PROTECT] reconcile error: {e}")
@@ -0,0 +1,186 @@
+import asyncio, time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import config
+from risk.margin import MarginModel, MarginPool
+
+BULK_PRICE_MIN = 3   # 要補價格的 symbol 數 >= 此值時改用一次全市場 ticker/price（權重 2）取代逐一查詢
+
+
+def _D(x) -> Decimal: return Decimal(str(x))
+
+
+class OrderSizer:
+    """
+    下單數量的前置資料（價格 / 權益 / 精度 / 交易所目前套用的槓桿）預先備妥，送單時只剩下單本身一個請求：
+    - prepare(symbols)：同一輪要下單的 symbol 一次備齊——帳戶快照（2 個請求，同輪 monitor_all 共用）、
+      價格（WS 模式 0 個，否則一次全市場 ticker/price）、槓桿只在與目標不同時才改
+    - 精度來自 ExchangeMetadata 的記憶體快取；槓桿由 positionRisk 的 leverage 欄位得知，不再每輪逐一 change_leverage
+    - prepare 取得的價格 / 權益在 SIZING_MAX_AGE_SEC 內沿用；未 prepare 或已過期時退回即時查詢（結果不快取）
+    - fit() / reserve()：以 MarginModel（leverage bracket、可用保證金、持倉、手續費）直接算出可成交的最大數量，
+      同一批訂單共用 MarginPool 逐筆扣抵；what_if() 只試算不扣抵。回測 SimClient 沒有 bracket 資料，數量原樣通過
+    """
+    def __init__(self, client, params, equity_ratio: Decimal = None, max_age: float = None):
+        self.client = client
+        self.params = params
+        self.equity_ratio = _D(params.equity_ratio if equity_ratio is None else equity_ratio)
+        self.max_age = config.SIZING_MAX_AGE_SEC if max_age is None else max_age
+        self.prices: Dict[str, Tuple[Decimal, float]] = {}   # symbol → (price, 取得時間)
+        self.equity: Optional[Decimal] = None
+        self.available: Optional[Decimal] = None
+        self.equity_at = 0.0
+        self.leverage: Dict[str, int] = {}
+        self.snapshot = None
+        self.margin = MarginModel(client)
+        self.pool: Optional[MarginPool] = None   # 本地可用保證金：reserve() / fit() 逐筆扣抵，新快照時重建
+        self.budget = None   # 分片模式（engine.cluster.RemoteBudget）：多個 worker 共用同一帳戶的額度
+
+    def _fresh(self, at: float) -> bool:
+        return time.time() - at <= self.max_age
+
+    # ----- 預先備妥 -----
+    def observe_snapshot(self, snap):
+        if snap is None or snap is self.snapshot: return   # 同一份快照：保留 pool 內已扣抵的量
+        self.equity, self.equity_at, self.snapshot = snap.equity, snap.taken_at, snap
+        self.available = self.margin.available(snap) if self.margin.active else snap.available
+        self.pool = MarginPool(self.margin, self.available)
+        if self.budget is not None: self.budget.report(snap, self.available)
+        for s, p in snap.positions.items():
+            lev = int(p.get("leverage") or 0)
+            if lev > 0: self.leverage[s] = lev
+
+    async def refresh_account(self):
+        self.observe_snapshot(await self.client.account_snapshot())
+
+    async def refresh_prices(self, symbols: Iterable[str]):
+        now, missing = time.time(), []
+        stream = getattr(self.client, "market_stream", None)
+        for s in symbols:
+            p = stream.price(s) if stream else None
+            if p is not None: self.prices[s] = (p, now)
+            else: missing.append(s)
+        if not missing: return
+        if len(missing) >= BULK_PRICE_MIN:
+            want = set(missing)
+            for r in await self.client.get_all_prices():
+                if r.get("symbol") in want and r.get("price"):
+                    self.prices[r["symbol"]] = (_D(r["price"]), now)
+            return
+        for s, p in zip(missing, await asyncio.gather(*[self.client.get_price(s) for s in missing])):
+            if p: self.prices[s] = (p, now)
+
+    def target_leverage(self, symbol: str) -> int:
+        """params.leverage，但不超過目前持倉所在 bracket 允許的最高槓桿（否則 change_leverage 回 -4028）"""
+        target = int(self.params.leverage)
+        if not self.margin.active: return target
+        pos = self.snapshot.position(symbol) if self.snapshot is not None else None
+        held = abs(pos["positionAmt"]) * pos["markPrice"] if pos else Decimal("0")
+        cap = self.margin.brackets.max_leverage(symbol, held)
+        return min(target, cap) if cap else target
+
+    def applied_leverage(self, symbol: str) -> int:
+        return self.leverage.get(symbol) or int(self.params.leverage)
+
+    async def ensure_leverage(self, symbol: str) -> bool:
+        await self.margin.ensure(symbol)
+        target = self.target_leverage(symbol)
+        if self.leverage.get(symbol) == target: return True
+        res = await self.client.change_leverage(symbol, target)
+        if res:
+            self.leverage[symbol] = target
+            return True
+        return False
+
+    async def prepare(self, symbols):
+        symbols = list(symbols)
+        await asyncio.gather(self.refresh_account(), self.refresh_prices(symbols),
+                             self.margin.ensure(symbols[0] if symbols else None))
+        await asyncio.gather(*[self.ensure_leverage(s) for s in symbols])
+
+    # ----- 計算 -----
+    async def price(self, symbol: str) -> Optional[Decimal]:
+        hit = self.prices.get(symbol)
+        if hit is not None and self._fresh(hit[1]): return hit[0]
+        return await self.client.get_price(symbol)
+
+    async def account_equity(self) -> Decimal:
+        if self.equity is not None and self._fresh(self.equity_at): return self.equity
+        snap = await self.client.account_snapshot()
+        if snap is not None: return snap.equity
+        return await self.client.get_equity()
+
+    async def qty(self, symbol: str, price: Decimal = None) -> Decimal:
+        price = price if price and price > 0 else await self.price(symbol)
+        if not price or price <= 0: return Decimal("0")
+        equity = await self.account_equity()
+        if equity <= 0: return Decimal("0")
+        notional = _D(equity) * self.equity_ratio
+        return await self.client._quantize_qty(symbol, notional * _D(self.params.leverage) / _D(price))
+
+    async def fit(self, symbol: str, side: str, qty: Decimal, price: Decimal = None, refresh: bool = False) -> Decimal:
+        """
+        單筆：目前可用保證金與 bracket 上限下 <= qty 的最大可成交數量（依 step size 取整）並從 pool 扣抵，
+        同時送出的多筆（例如 monitor_all 並行加碼）不會各自以為整份可用保證金都是自己的。
+        pool 在 SIZING_MAX_AGE_SEC 內沿用（自己的成交已扣抵，不必每筆重抓帳戶）；過期或 refresh（下單被拒，
+        交易所狀態與本地不一致）時重抓。無模型時原樣回傳
+        """
+        if not self.margin.active or qty <= 0: return qty
+        await self.margin.ensure(symbol)
+        price = price if price and price > 0 else await self.price(symbol)
+        if not price or price <= 0: return qty
+        if refresh or self.pool is None or not self._fresh(self.equity_at):
+            if refresh: self.client.invalidate_snapshot()
+            await self.refresh_account()
+        if self.pool is None: return qty
+        pos = self.snapshot.position(symbol)
+        row = (symbol, side, qty, _D(price), self.applied_leverage(symbol), pos["positionAmt"] if pos else Decimal("0"),
+               await self.client.get_symbol_filters(symbol))
+        return await self._granted(row, self.pool.take(*row))
+
+    async def _granted(self, row, q: Decimal) -> Decimal:
+        """
+        分片模式：本地放得下（已從 pool 扣抵）的 q 再向 coordinator 申請全域額度，依核准比例縮量；
+        沒核准的部分把保證金還回本地 pool
+        """
+        if self.budget is None or q <= 0: return q
+        s, side, _, price, lev, amt, filters = row
+        k = await self.budget.reserve(s, self.margin.cost(q, price, lev, side, amt), q * price)
+        if k >= 1: return q
+        kept = max(filters.quantize_qty(q * k) if filters is not None else q * k, Decimal("0"))
+        self.pool.release(q, kept, price, lev, side, amt)
+        return kept
+
+    async def _rows(self, entries) -> List[tuple]:
+        """(symbol, side, qty) → MarginPool 使用的 (symbol, side, qty, price, leverage, 持倉數量, filters)"""
+        rows = []
+        for s, side, qty in entries:
+            price = await self.price(s)
+            pos = self.snapshot.position(s) if self.snapshot is not None else None
+            rows.append((s, side, qty, _D(price or 0), self.applied_leverage(s),
+                         pos["positionAmt"] if pos else Decimal("0"), await self.client.get_symbol_filters(s)))
+        return rows
+
+    def _usable(self) -> bool:
+        return self.margin.active and self.pool is not None and self._fresh(self.equity_at)
+
+    async def reserve(self, entries, proportional: bool = None) -> List[Decimal]:
+        """
+        同一批訂單 (symbol, side, qty)：從 prepare 時建立的 MarginPool 扣抵，回傳各筆放得下的數量（0 = 保證金已用完）。
+        保證金不足時依 MARGIN_ALLOCATION：sequential 依序先到先得、proportional 全部等比例縮量。未 prepare 時原樣回傳
+        """
+        entries = list(entries)
+        if not self._usable(): return [q for _, _, q in entries]
+        proportional = config.MARGIN_ALLOCATION == "proportional" if proportional is None else proportional
+        rows = await self._rows(entries)
+        fits = self.pool.plan(rows, proportional)
+        for r, q in zip(rows, fits):
+            if q > 0: self.pool.take(r[0], r[1], q, *r[3:6])
+        return [await self._granted(r, q) for r, q in zip(rows, fits)]
+
+    async def what_if(self, entries, proportional: bool = None) -> Dict[str, Decimal]:
+        """試算：entries（symbol, LONG / SHORT）同時進場、共用目前可用保證金時各自能下的數量（不扣抵、不送單）"""
+        entries = [(s, side, await self.qty(s)) for s, side in entries]
+        if not self._usable(): return {s: q for s, _, q in entries}
+        proportional = config.MARGIN_ALLOCATION == "proportional" if proportional is None else proportional
+        rows = await self._rows(entries)
+        return {r[0]: q for r, q in zip(rows, self.pool.plan(rows, proportional))}
@@ -0,0 +1,159 @@
+import asyncio, time
+from decimal import Decimal
+from typing import Dict, List, Optional
+import config
+from monitoring import metrics
+from risk.risk_mgr import RiskManager
+
+
+class Levels:
+    """
+    單一持倉的觸發價（由 RiskManager 的 profit ratio 門檻換算成標記價）：
+    pr = side × (mark − entry) / entry
+    - stop_px：pr = −max_loss
+    - add_px：pr = 加碼門檻（已達 MAX_PYRAMID 為 None）
+    - trail_px：pr = hw × (1 − giveback)（hw <= 0 尚無移動停利時為 None）
+    """
+    __slots__ = ("symbol", "side", "amt", "entry", "leverage", "hw", "hw_px", "stop_px", "add_px", "trail_px", "giveback")
+
+    def __init__(self, symbol: str, pos: dict, hw: float, pyramids: int, params):
+        self.symbol = symbol
+        self.amt = float(pos["positionAmt"])
+        self.side = 1.0 if self.amt > 0 else -1.0
+        self.entry = float(pos["entryPrice"])
+        self.leverage = pos.get("leverage", Decimal("0"))
+        self.giveback = params.trailing_giveback_pct
+        self.stop_px = self._px(-params.max_loss_pct)
+        self.add_px = self._px(params.profit_add_threshold_pct) if pyramids < params.max_pyramid else None
+        self._set_hw(hw)
+
+    def _px(self, pr: float) -> float:
+        return self.entry * (1.0 + self.side * pr)
+
+    def _set_hw(self, hw: float):
+        self.hw = hw
+        self.hw_px = self._px(max(hw, 0.0))
+        self.trail_px = self._px(hw * (1.0 - self.giveback)) if hw > 0 else None
+
+    def on_price(self, p: float) -> Optional[str]:
+        """每個 tick O(1)：更新高水位，回傳觸發的規則名稱"""
+        s = self.side
+        if s * (p - self.hw_px) > 0:
+            self._set_hw(s * (p - self.entry) / self.entry)
+        if s * (p - self.stop_px) <= 0: return "stop"
+        if self.add_px is not None and s * (p - self.add_px) >= 0: return "add"
+        if self.trail_px is not None and s * (p - self.trail_px) <= 0: return "trail"
+        return None
+
+    def position_at(self, p: float) -> dict:
+        D = lambda x: Decimal(str(x))
+        return {"entryPrice": D(self.entry), "positionAmt": D(self.amt),
+                "unrealizedProfit": D(self.amt * (p - self.entry)), "leverage": self.leverage, "markPrice": D(p)}
+
+
+class RiskWatchdog:
+    """
+    與 scan 週期解耦的風控迴圈：
+    - 持倉（mirror / 帳戶快照，無逐 tick REST）換算成 Levels；每個標記價 tick 只做幾次比較
+    - 觸發時立刻以 tick 價格組出的 pos 呼叫 RiskManager.check_position（同一套停損 / 加碼 / 移動停利規則）
+    - 成交、下單後或每 WATCHDOG_REFRESH_SEC 重建觸發價
+    - 獲利加碼同一 symbol 至少間隔 WATCHDOG_ADD_COOLDOWN_SEC（預設同 SCAN_INTERVAL，維持原本每輪最多加碼一次的節奏）
+    - latency：tick 收到 → 訂單回應（ms）
+    - tick 上的新高水位只更新記憶體（PersistentDict.stage），StateStore.checkpoint 時才落盤
+    """
+    def __init__(self, client, rm: RiskManager, refresh_sec: float = None, add_cooldown_sec: float = None):
+        self.client = client
+        self.rm = rm
+        self.refresh_sec = config.WATCHDOG_REFRESH_SEC if refresh_sec is None else refresh_sec
+        self.add_cooldown_sec = config.WATCHDOG_ADD_COOLDOWN_SEC if add_cooldown_sec is None else add_cooldown_sec
+        self._last_add: Dict[str, float] = {}
+        self._stage_hw = getattr(rm.high_water, "stage", rm.high_water.__setitem__)   # 未啟用 StateStore 時為一般 dict
+        self.levels: Dict[str, Levels] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._dirty = asyncio.Event()
+        self._stopped = False
+        self.latencies_ms: List[float] = []
+        self.ticks = 0
+        self.fired = 0
+
+    # ----- 持倉 → 觸發價 -----
+    def rebuild(self, snap):
+        levels, now = {}, time.time()
+        for s in (snap.open_symbols() if snap is not None else []):
+            pos = snap.position(s)
+            if not pos or pos["positionAmt"] == 0 or pos["entryPrice"] == 0 or not self.rm.owns(s): continue
+            lv = Levels(s, pos, float(self.rm.high_water.get(s, 0)), self.rm.pyramids.get(s, 0), self.rm.params)
+            if now - self._last_add.get(s, 0) < self.add_cooldown_sec: lv.add_px = None
+            levels[s] = lv
+        self.levels = levels
+
+    async def refresh(self):
+        self.rebuild(await self.client.account_snapshot())
+
+    def mark_dirty(self, *_):
+        self._dirty.set()
+
+    # ----- tick -----
+    def on_mark(self, symbol: str, price: float, recv: float):
+        self.ticks += 1
+        lv = self.levels.get(symbol)
+        if lv is None or price <= 0 or symbol in self._inflight: return
+        hw = lv.hw
+        rule = lv.on_price(price)
+        if lv.hw > hw and lv.hw > self.rm.high_water.get(symbol, 0):
+            self._stage_hw(symbol, Decimal(str(lv.hw)))
+        if rule is None or symbol in self.rm.busy: return
+        pm = self.rm.protective   # 交易所端保護單已涵蓋的規則不必為每個 tick 建 task
+        if pm is not None and (rule == "stop" and pm.covers(symbol) or rule == "trail" and pm.covers_trail(symbol, lv.hw)):
+            return
+        self._inflight[symbol] = asyncio.get_running_loop().create_task(self._fire(symbol, rule, lv, price, recv))
+
+    async def _fire(self, symbol: str, rule: str, lv: Levels, price: float, recv: float):
+        action = None
+        try:
+            action = await self.rm.check_position(symbol, lv.position_at(price))
+            if action == "add":
+                self._last_add[symbol] = time.time()
+                lv.add_px = None
+            if action:
+                ms = (time.time() - recv) * 1000
+                metrics.observe("watchdog_tick_to_order_seconds", ms / 1000, action=action)
+                self.fired += 1
+                self.latencies_ms.append(ms)
+                if len(self.latencies_ms) > 1000: del self.latencies_ms[:500]
+                print(f"[WATCHDOG] {symbol} {rule} @ {price} → {action}, tick-to-order {ms:.1f}ms")
+        except Exception as e:
+            print(f"[WATCHDOG] {symbol} {rule} error: {e}")
+        finally:
+            self._inflight.pop(symbol, None)
+            if action: self.mark_dirty()   # 下單後快照已失效，重建觸發價
+
+    # ----- 迴圈 -----
+    async def run(self):
+        self._stopped = False
+        while not self._stopped:
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[WATCHDOG] refresh error: {e}")
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.refresh_sec)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopped = True
+        self.mark_dirty()
+
+    def latency(self) -> Dict[str, float]:
+        xs = sorted(self.latencies_ms)
+        if not xs: return {"count": 0}
+        q = lambda f: xs[min(len(xs) - 1, int(f * len(xs)))]
+        return {"count": len(xs), "p50": q(0.5), "p99": q(0.99), "max": xs[-1]}
+
+    def summary(self) -> str:
+        lat = self.latency()
+        s = f"positions={len(self.levels)} ticks={self.ticks} fired={self.fired}"
+        if lat["count"]: s += f" tick-to-order p50={lat['p50']:.1f}ms p99={lat['p99']:.1f}ms max={lat['max']:.1f}ms"
+        return s
@@ -0,0 +1,53 @@
+import argparse, asyncio, time
+
+import config
+from exchange.binance_client import BinanceClient
+from storage.candle_archive import CandleArchive
+
+
+async def _sync(args):
+    archive = CandleArchive(args.dir)
+    client = BinanceClient(config.API_KEY, config.API_SECRET, testnet=config.TESTNET)
+    end_ms = args.end or int(time.time() * 1000)
+    start_ms = args.start or end_ms - args.days * 86_400_000
+    try:
+        for interval in args.interval:
+            for s in args.symbols:
+                t0 = time.perf_counter()
+                n = await archive.sync(client, s, interval, start_ms, end_ms)
+                size = len(archive.open(s, interval))
+                print(f"[ARCHIVE] {s} {interval}: +{n} rows (total {size}) in {time.perf_counter() - t0:.2f}s")
+    finally:
+        await client.close()
+
+
+def _info(args):
+    archive = CandleArchive(args.dir)
+    for interval in args.interval:
+        for s in args.symbols:
+            recs = archive.open(s, interval)
+            if len(recs) == 0:
+                print(f"[ARCHIVE] {s} {interval}: empty"); continue
+            print(f"[ARCHIVE] {s} {interval}: {len(recs)} rows {int(recs['open_time'][0])} → "
+                  f"{int(recs['open_time'][-1])}, gaps={len(archive.gaps(s, interval))}, "
+                  f"known empty={len(archive.known_empty(s, interval))}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="本地 K 線封存：python -m storage sync|info")
+    ap.add_argument("command", choices=("sync", "info"))
+    ap.add_argument("--dir", default=config.CANDLE_ARCHIVE_DIR)
+    ap.add_argument("--symbols", nargs="*", default=config.SYMBOL_POOL)
+    ap.add_argument("--interval", nargs="*", default=[config.KLINE_INTERVAL])
+    ap.add_argument("--days", type=int, default=config.CANDLE_ARCHIVE_DAYS)
+    ap.add_argument("--start", type=int, help="startTime（ms），預設為 end - days")
+    ap.add_argument("--end", type=int, help="endTime（ms），預設為現在")
+    args = ap.parse_args()
+    if args.command == "sync":
+        asyncio.run(_sync(args))
+    else:
+        _info(args)
+
+
+if __name__ == "__main__":
+    main()
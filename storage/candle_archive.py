@@ -0,0 +1,178 @@
+import os, time
+from typing import List, Tuple
+import numpy as np
+import config
+from exchange.kline_store import interval_ms
+from exchange.kline_decoder import KlineDecoder
+
+# 每根 K 棒固定 56 bytes（little-endian），檔案即為 RECORD 陣列，可直接 memmap
+RECORD = np.dtype([("open_time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+                   ("close", "<f8"), ("volume", "<f8"), ("close_time", "<i8")])
+_DECODER = KlineDecoder(RECORD.names)   # 封存保留完整 7 欄
+PAGE_LIMIT = 1000   # klines limit 1000 的權重為 5（1500 為 10）
+EMPTY = np.dtype([("start", "<i8"), ("end", "<i8")])   # 交易所確認沒有 K 棒的 open_time 區間（含兩端）
+
+
+def to_records(klines) -> np.ndarray:
+    """REST / WS 原始 K 線（list of lists，數值為字串）→ RECORD 陣列"""
+    if not klines: return np.empty(0, RECORD)
+    return _DECODER.records(klines, RECORD)
+
+
+def _holes(start: int, open_times: List[int], stop: int, iv: int) -> List[Tuple[int, int]]:
+    """[start, stop] 內沒有出現在 open_times（遞增）的區間"""
+    out, prev = [], start - iv
+    for t in open_times:
+        if t > stop: break
+        if t - prev > iv: out.append((prev + iv, t - 1))
+        prev = max(prev, t)
+    if stop - prev >= iv: out.append((prev + iv, stop))
+    return out
+
+
+def _merge(ranges) -> List[Tuple[int, int]]:
+    out: List[Tuple[int, int]] = []
+    for a, b in sorted(ranges):
+        if out and a <= out[-1][1] + 1: out[-1] = (out[-1][0], max(out[-1][1], b))
+        else: out.append((a, b))
+    return out
+
+
+def _subtract(ranges, known) -> List[Tuple[int, int]]:
+    """ranges 扣掉 known（已合併、遞增）"""
+    out = []
+    for a, b in ranges:
+        for x, y in known:
+            if y < a or x > b: continue
+            if x > a: out.append((a, x - 1))
+            a = y + 1
+            if a > b: break
+        if a <= b: out.append((a, b))
+    return out
+
+
+class CandleArchive:
+    """
+    本地 K 線封存：每個 (symbol, interval) 一個固定寬度二進位檔 {root}/{interval}/{SYMBOL}.bin。
+    - 只存已收盤 K 棒，依 open_time 遞增；新資料直接 append，補洞 / 往前補歷史時才整檔重寫
+    - open() / window() 以 numpy.memmap 回傳，切片不複製、不解析 JSON、不建 DataFrame
+    - 交易所本身就沒有資料的區間（停機、下架、上市前）記在 {SYMBOL}.empty，sync 不再重抓
+    """
+    def __init__(self, root: str = None):
+        self.root = root or config.CANDLE_ARCHIVE_DIR
+
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{symbol}.bin")
+
+    def open(self, symbol: str, interval: str) -> np.ndarray:
+        p = self.path(symbol, interval)
+        if not os.path.exists(p) or os.path.getsize(p) < RECORD.itemsize:
+            return np.empty(0, RECORD)
+        n = os.path.getsize(p) // RECORD.itemsize
+        return np.memmap(p, dtype=RECORD, mode="r", shape=(n,))
+
+    def last_open_time(self, symbol: str, interval: str) -> int:
+        recs = self.open(symbol, interval)
+        return int(recs["open_time"][-1]) if len(recs) else 0
+
+    def window(self, symbol: str, interval: str, start_ms: int = None, end_ms: int = None,
+               last: int = None) -> np.ndarray:
+        """[start_ms, end_ms] 之間（或最後 last 根）的 K 棒，memmap view"""
+        recs = self.open(symbol, interval)
+        if len(recs) == 0: return recs
+        ot = recs["open_time"]
+        lo = int(np.searchsorted(ot, start_ms, "left")) if start_ms is not None else 0
+        hi = int(np.searchsorted(ot, end_ms, "right")) if end_ms is not None else len(recs)
+        if last is not None: lo = max(lo, hi - last)
+        return recs[lo:hi]
+
+    def gaps(self, symbol: str, interval: str) -> List[Tuple[int, int]]:
+        recs = self.open(symbol, interval)
+        iv = interval_ms(interval)
+        if len(recs) < 2 or not iv: return []
+        ot = recs["open_time"]
+        k = np.flatnonzero(np.diff(ot) > iv)
+        return [(int(ot[i]) + iv, int(ot[i + 1]) - 1) for i in k]
+
+    def empty_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{symbol}.empty")
+
+    def known_empty(self, symbol: str, interval: str) -> List[Tuple[int, int]]:
+        p = self.empty_path(symbol, interval)
+        if not os.path.exists(p): return []
+        return [(int(a), int(b)) for a, b in np.fromfile(p, EMPTY)]
+
+    def mark_empty(self, symbol: str, interval: str, ranges) -> int:
+        """記下交易所回傳為空的區間（與既有的合併），回傳合併後的區間數"""
+        if not ranges: return len(self.known_empty(symbol, interval))
+        cur = self.known_empty(symbol, interval)
+        merged = _merge(cur + list(ranges))
+        if merged != cur:
+            p = self.empty_path(symbol, interval)
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            np.array(merged, EMPTY).tofile(p + ".tmp")
+            os.replace(p + ".tmp", p)
+        return len(merged)
+
+    def write(self, symbol: str, interval: str, records: np.ndarray, now_ms: int = None) -> int:
+        """寫入新 K 棒（自動略過未收盤與已存在的 open_time），回傳新增筆數"""
+        if len(records) == 0: return 0
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        records = records[records["close_time"] < now_ms]
+        if len(records) == 0: return 0
+        p = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        cur = self.open(symbol, interval)
+        last = int(cur["open_time"][-1]) if len(cur) else None
+        if last is None or records["open_time"].min() > last:
+            records = records[np.unique(records["open_time"], return_index=True)[1]]   # 排序並去重
+            with open(p, "ab") as f:
+                f.write(records.tobytes())
+            return len(records)
+        # 插入到既有範圍內（補洞 / 往前補）：合併後整檔重寫
+        merged = np.concatenate([np.asarray(cur), records])
+        _, idx = np.unique(merged["open_time"], return_index=True)
+        merged = merged[idx]
+        added = len(merged) - len(cur)
+        del cur
+        tmp = p + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(merged.tobytes())
+        os.replace(tmp, p)
+        return added
+
+    def append_klines(self, symbol: str, interval: str, klines, now_ms: int = None) -> int:
+        return self.write(symbol, interval, to_records(klines), now_ms)
+
+    async def sync(self, client, symbol: str, interval: str, start_ms: int, end_ms: int = None) -> int:
+        """
+        以 startTime/endTime 分頁把 [start_ms, end_ms] 補齊：往前的歷史、檔內缺口、最後一根之後到現在。
+        交易所回傳為空的已收盤區間記進 known_empty，之後的 sync 直接略過（缺口不會每次重抓）
+        """
+        iv = interval_ms(interval)
+        now_ms = int(time.time() * 1000)
+        end_ms = end_ms or now_ms
+        recs = self.open(symbol, interval)
+        if len(recs) == 0:
+            ranges = [(start_ms, end_ms)]
+        else:
+            first, last = int(recs["open_time"][0]), int(recs["open_time"][-1])
+            ranges = [(start_ms, first - 1)] if start_ms < first else []
+            ranges += [g for g in self.gaps(symbol, interval) if g[1] >= start_ms]
+            ranges.append((last + iv, end_ms))
+        del recs
+        ranges = _subtract(ranges, self.known_empty(symbol, interval))
+        closed = now_ms - iv   # open_time <= closed 的 K 棒已收盤，空的就是真的沒有
+        added, empty = 0, []
+        for a, b in ranges:
+            cur = a
+            while cur <= b:
+                kl = await client.get_klines(symbol, interval=interval, limit=PAGE_LIMIT, start_time=cur, end_time=b)
+                full = len(kl) >= PAGE_LIMIT
+                stop = min(int(kl[-1][0]) if full else b, closed)   # 這一頁確定涵蓋到的範圍
+                empty += _holes(cur, [int(k[0]) for k in kl], stop, iv) if iv else []
+                if kl: added += self.append_klines(symbol, interval, kl, now_ms)
+                if not full: break
+                cur = int(kl[-1][0]) + iv
+        if empty: self.mark_empty(symbol, interval, empty)
+        return added
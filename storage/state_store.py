@@ -0,0 +1,182 @@
+import json, os, sqlite3, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import config
+from storage.candle_archive import RECORD
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (ns, key));
+CREATE TABLE IF NOT EXISTS cache (
+    name TEXT PRIMARY KEY, value TEXT NOT NULL, loaded_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS candles (
+    symbol TEXT NOT NULL, interval TEXT NOT NULL, last_open_time INTEGER NOT NULL, rows BLOB NOT NULL,
+    PRIMARY KEY (symbol, interval));
+"""
+
+_MISSING = object()
+
+
+class PersistentDict(dict):
+    """
+    寫入即落盤的 dict（namespace ns 下每個 key 一列）：攔 __setitem__ / __delitem__ / pop / clear，
+    值沒變時不寫；讀取與一般 dict 相同，呼叫端（RiskManager / watchdog）不必知道有持久化。
+    stage()：只改記憶體、延到 flush_staged()（StateStore.checkpoint）才寫，給 tick 路徑上的高頻更新用
+    """
+    def __init__(self, store: "StateStore", ns: str, encode: Callable = str, decode: Callable = str):
+        super().__init__((k, decode(v)) for k, v in store.load(ns).items())
+        self.store, self.ns, self.encode = store, ns, encode
+        self._staged = set()
+
+    def __setitem__(self, key, value):
+        if key in self._staged: self._staged.discard(key)   # 記憶體已是新值但尚未落盤：照樣寫
+        elif dict.get(self, key, _MISSING) == value: return
+        dict.__setitem__(self, key, value)
+        self.store.put(self.ns, key, self.encode(value))
+
+    def __delitem__(self, key):
+        self._staged.discard(key)
+        dict.__delitem__(self, key)
+        self.store.delete(self.ns, key)
+
+    def pop(self, key, *default):
+        self._staged.discard(key)
+        if key in self: self.store.delete(self.ns, key)
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key not in self: self[key] = default
+        return self[key]
+
+    def update(self, *a, **kw):
+        for k, v in dict(*a, **kw).items(): self[k] = v
+
+    def clear(self):
+        self._staged.clear()
+        dict.clear(self)
+        self.store.delete(self.ns)
+
+    def stage(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._staged.add(key)
+
+    def flush_staged(self) -> int:
+        keys, self._staged = [k for k in self._staged if k in self], set()
+        for k in keys: self.store.put(self.ns, k, self.encode(self[k]))
+        return len(keys)
+
+    def flush(self, key):
+        """值是可變物件且被原地修改時（例如 PosState 欄位），手動寫入目前內容"""
+        self.store.put(self.ns, key, self.encode(self[key]))
+
+
+class StateStore:
+    """
+    重啟後要接續的狀態（SQLite WAL，單一檔案）：
+    - state：風控狀態（high water / 加碼次數 / 槓桿 / PositionManager），PersistentDict 每次變動即寫入一列
+    - cache：exchange_info / leverage bracket / 手續費率，連同原本的取得時間；重啟時照舊套用 TTL，過期才重抓
+    - candles：每個 KlineBuffer 的內容（RECORD bytes），checkpoint() 只寫有新 K 棒的；重啟後 sync 直接走增量
+    WAL + synchronous=NORMAL：程序崩潰不丟已 commit 的寫入（斷電可能丟最後幾筆，STATE_DB_SYNC=full 可避免）
+    """
+    def __init__(self, path: str = None, sync: str = None):
+        self.path = path or config.STATE_DB_PATH
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, isolation_level=None)   # autocommit：每筆寫入即一個交易
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(f"PRAGMA synchronous={(sync or config.STATE_DB_SYNC).upper()}")
+        self.db.executescript(SCHEMA)
+        self._saved: Dict[str, float] = {}                   # cache name → 已寫入的 loaded_at
+        self._candles: Dict[Tuple[str, str], int] = {}       # (symbol, interval) → 已寫入的 last_open_time
+        self._mappings: List[PersistentDict] = []
+
+    def close(self):
+        self.flush_staged()
+        self.db.close()
+
+    # ----- 風控狀態 -----
+    def load(self, ns: str) -> Dict[str, Any]:
+        return {k: json.loads(v) for k, v in self.db.execute("SELECT key, value FROM state WHERE ns = ?", (ns,))}
+
+    def put(self, ns: str, key: str, value):
+        self.db.execute("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)", (ns, key, json.dumps(value), time.time()))
+
+    def delete(self, ns: str, key: str = None):
+        if key is None: self.db.execute("DELETE FROM state WHERE ns = ?", (ns,))
+        else: self.db.execute("DELETE FROM state WHERE ns = ? AND key = ?", (ns, key))
+
+    def mapping(self, ns: str, encode: Callable = str, decode: Callable = str) -> PersistentDict:
+        m = PersistentDict(self, ns, encode, decode)
+        self._mappings.append(m)
+        return m
+
+    def flush_staged(self) -> int:
+        """寫入各 mapping stage() 過的值（同一個交易）"""
+        if not any(m._staged for m in self._mappings): return 0
+        with self.db:
+            self.db.execute("BEGIN")
+            return sum(m.flush_staged() for m in self._mappings)
+
+    # ----- 快取 -----
+    def save_cache(self, name: str, value, loaded_at: float):
+        if not loaded_at or self._saved.get(name) == loaded_at: return
+        self.db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (name, json.dumps(value), loaded_at))
+        self._saved[name] = loaded_at
+
+    def load_cache(self, name: str) -> Tuple[Optional[Any], float]:
+        row = self.db.execute("SELECT value, loaded_at FROM cache WHERE name = ?", (name,)).fetchone()
+        if row is None: return None, 0.0
+        self._saved[name] = row[1]
+        return json.loads(row[0]), row[1]
+
+    # ----- K 線 -----
+    def save_candles(self, store) -> int:
+        rows = []
+        for (s, iv), buf in store.buffers():
+            last = buf.last_open_time
+            if not len(buf) or self._candles.get((s, iv)) == last: continue
+            rec = np.zeros(len(buf), RECORD)   # buffer 沒保存的欄位（KLINE_FIELDS 以外）寫 0，restore 時也不讀
+            for name in buf.fields: rec[name] = buf.column(name)
+            rows.append((s, iv, last, rec.tobytes()))
+            self._candles[(s, iv)] = last
+        if rows:
+            with self.db:
+                self.db.execute("BEGIN")
+                self.db.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def restore_candles(self, store) -> int:
+        n = 0
+        for s, iv, last, blob in self.db.execute("SELECT symbol, interval, last_open_time, rows FROM candles"):
+            store.preload(s, iv, np.frombuffer(blob, RECORD))
+            self._candles[(s, iv)] = last
+            n += 1
+        return n
+
+    # ----- 接上 client / RiskManager -----
+    def restore(self, client, rm=None):
+        """啟動時呼叫：把快取與 K 線放回記憶體（風控狀態在 RiskManager(store=...) 建立時已載入）"""
+        t0 = time.perf_counter()
+        info, at = self.load_cache("exchange_info")
+        if info: client.metadata.load(info, loaded_at=at)
+        margin = rm.sizer.margin if rm is not None else None
+        if margin is not None and margin.active:
+            data, at = self.load_cache("leverage_brackets")
+            if data: margin.brackets.load(data, loaded_at=at)
+            fee, at = self.load_cache("commission_rate")
+            if fee is not None: margin.load_fee(fee, at)
+        n = self.restore_candles(client.kline_store)
+        print(f"[STATE] restored {len(client.metadata.symbols())} symbols info, {n} kline buffers, "
+              f"{len(rm.high_water) if rm is not None else 0} risk states in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    def checkpoint(self, client, rm=None):
+        """每輪結束呼叫：只寫入自上次以來有變動的快取 / K 線，以及 stage() 延後的風控狀態（其餘已即時寫入）"""
+        self.flush_staged()
+        if client.metadata.loaded: self.save_cache("exchange_info", client.metadata.dump(), client.metadata.loaded_at)
+        margin = rm.sizer.margin if rm is not None else None
+        if margin is not None and margin.active:
+            if margin.brackets.loaded:
+                self.save_cache("leverage_brackets", margin.brackets.dump(), margin.brackets.loaded_at)
+            self.save_cache("commission_rate", str(margin.fee_rate), margin.fee_at)
+        return self.save_candles(client.kline_store)
+
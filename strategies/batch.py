@@ -0,0 +1,196 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import config
+
+LONG, SHORT, FLAT = 1, -1, 0
+SIDES = {LONG: "LONG", SHORT: "SHORT"}
+
+
+def side_name(v) -> Optional[str]:
+    return SIDES.get(int(v))
+
+
+# ----- 決策規則（純量與向量共用：per-symbol wrapper 和批次路徑用同一套） -----
+def trend_side(f0, f1, s0, s1, m0, m1, g0, g1):
+    """EMA 快慢線交叉或 MACD 與訊號線交叉；[0]=前一根、[1]=最新一根"""
+    up = ((f0 <= s0) & (f1 > s1)) | ((m0 <= g0) & (m1 > g1))
+    dn = ((f0 >= s0) & (f1 < s1)) | ((m0 >= g0) & (m1 < g1))
+    return np.where(up, LONG, np.where(dn, SHORT, FLAT))
+
+
+def revert_side(close, lower, upper, rsi, oversold=None, overbought=None):
+    oversold = config.REVERT_RSI_OVERSOLD if oversold is None else oversold
+    overbought = config.REVERT_RSI_OVERBOUGHT if overbought is None else overbought
+    lo = (close <= lower) & (rsi <= oversold)
+    hi = (close >= upper) & (rsi >= overbought)
+    return np.where(lo, LONG, np.where(hi, SHORT, FLAT))
+
+
+# ----- 2-D 指標（rows = symbols, cols = bars） -----
+def stack_closes(series: Sequence[np.ndarray], length: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把各 symbol 的 close 疊成 (symbols × bars) 矩陣，右對齊。
+    較短的列左側以第一筆補齊，start[i] 為該列第一筆真實資料的欄位。
+    """
+    length = length or max((len(s) for s in series), default=0)
+    X = np.empty((len(series), length), dtype=np.float64)
+    start = np.zeros(len(series), dtype=np.int64)
+    for i, s in enumerate(series):
+        s = np.asarray(s, dtype=np.float64)[-length:]
+        n = len(s)
+        start[i] = length - n
+        if n == 0:
+            X[i] = np.nan
+            continue
+        X[i, start[i]:] = s
+        X[i, :start[i]] = s[0]
+    return X, start
+
+
+def ema_rows(X: np.ndarray, alpha: float, start: np.ndarray) -> np.ndarray:
+    """每列自 start 起做 ewm(adjust=False)；迴圈走 bars，向量化跨 symbols"""
+    out = np.full_like(X, np.nan)
+    if X.shape[1] == 0: return out
+    ema = np.full(X.shape[0], np.nan)
+    last_start = int(start.max()) if len(start) else 0
+    for t in range(X.shape[1]):
+        x = X[:, t]
+        if t > last_start:   # 所有列都已開始：純遞迴
+            ema = alpha * x + (1.0 - alpha) * ema
+        else:
+            ema = np.where(t == start, x, np.where(t > start, alpha * x + (1.0 - alpha) * ema, np.nan))
+        out[:, t] = ema
+    return out
+
+
+def rsi_rows(X: np.ndarray, period: int, start: np.ndarray) -> np.ndarray:
+    d = np.diff(X, axis=1, prepend=X[:, :1])
+    a = 1.0 / period
+    up = ema_rows(np.clip(d, 0, None), a, start + 1)
+    dn = ema_rows(np.clip(-d, 0, None), a, start + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100.0 - 100.0 / (1.0 + up / dn)
+
+
+def trend_lines(X: np.ndarray, start: np.ndarray, fast: int = None, slow: int = None, signal: int = None):
+    """回傳 (ema_fast, ema_slow, macd, signal) 四個 (symbols × bars) 矩陣"""
+    fast = fast or config.TREND_EMA_FAST
+    slow = slow or config.TREND_EMA_SLOW
+    signal = signal or config.MACD_SIGNAL
+    f = ema_rows(X, 2.0 / (fast + 1), start)
+    s = ema_rows(X, 2.0 / (slow + 1), start)
+    m = f - s
+    return f, s, m, ema_rows(m, 2.0 / (signal + 1), start)
+
+
+def _bars_seen(X: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """(symbols × bars)：到該欄為止的真實 K 棒數"""
+    return np.arange(1, X.shape[1] + 1)[None, :] - start[:, None]
+
+
+def evaluate_trend(X: np.ndarray, start: np.ndarray, fast: int = None, slow: int = None,
+                   signal: int = None) -> np.ndarray:
+    fast = fast or config.TREND_EMA_FAST
+    slow = slow or config.TREND_EMA_SLOW
+    if X.shape[1] < 2: return np.zeros(X.shape[0], dtype=np.int64)
+    f, s, m, g = trend_lines(X, start, fast, slow, signal)
+    side = trend_side(f[:, -2], f[:, -1], s[:, -2], s[:, -1], m[:, -2], m[:, -1], g[:, -2], g[:, -1])
+    valid = (X.shape[1] - start) >= max(fast, slow) + 5
+    return np.where(valid, side, FLAT)
+
+
+def trend_sides(X: np.ndarray, start: np.ndarray, fast: int = None, slow: int = None,
+                signal: int = None) -> np.ndarray:
+    """每一根 K 棒收盤時的 trend 訊號（symbols × bars），供回測一次算完整段歷史"""
+    fast = fast or config.TREND_EMA_FAST
+    slow = slow or config.TREND_EMA_SLOW
+    out = np.zeros(X.shape, dtype=np.int64)
+    if X.shape[1] < 2: return out
+    f, s, m, g = trend_lines(X, start, fast, slow, signal)
+    out[:, 1:] = trend_side(f[:, :-1], f[:, 1:], s[:, :-1], s[:, 1:], m[:, :-1], m[:, 1:], g[:, :-1], g[:, 1:])
+    return np.where(_bars_seen(X, start) >= max(fast, slow) + 5, out, FLAT)
+
+
+def rolling_mean_std(X: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """各列 rolling(window).mean() / .std(ddof=1)；以累積和計算（先扣掉每列基準值以保精度）"""
+    mean = np.full_like(X, np.nan); std = np.full_like(X, np.nan)
+    if X.shape[1] < window: return mean, std
+    ref = X[:, :1]
+    Y = X - ref
+    c1 = np.cumsum(np.pad(Y, ((0, 0), (1, 0))), axis=1)
+    c2 = np.cumsum(np.pad(Y * Y, ((0, 0), (1, 0))), axis=1)
+    s1 = c1[:, window:] - c1[:, :-window]
+    s2 = c2[:, window:] - c2[:, :-window]
+    mean[:, window - 1:] = s1 / window + ref
+    std[:, window - 1:] = np.sqrt(np.maximum(s2 - s1 * s1 / window, 0.0) / (window - 1))
+    return mean, std
+
+
+def evaluate_revert(X: np.ndarray, start: np.ndarray, rsi_period: int = None, window: int = None,
+                    k: float = None, oversold=None, overbought=None) -> np.ndarray:
+    rsi_period = rsi_period or config.REVERT_RSI_PERIOD
+    window = window or config.BOLL_WINDOW
+    k = config.BOLL_STDDEV if k is None else k
+    if X.shape[1] < window: return np.zeros(X.shape[0], dtype=np.int64)
+    W = X[:, -window:]
+    mid, std = W.mean(axis=1), W.std(axis=1, ddof=1)
+    rsi = rsi_rows(X, rsi_period, start)[:, -1]
+    side = revert_side(X[:, -1], mid - k * std, mid + k * std, rsi, oversold, overbought)
+    valid = (X.shape[1] - start) >= max(window, rsi_period) + 5
+    return np.where(valid, side, FLAT)
+
+
+def revert_sides(X: np.ndarray, start: np.ndarray, rsi_period: int = None, window: int = None,
+                 k: float = None, oversold=None, overbought=None) -> np.ndarray:
+    """每一根 K 棒收盤時的 revert 訊號（symbols × bars）"""
+    rsi_period = rsi_period or config.REVERT_RSI_PERIOD
+    window = window or config.BOLL_WINDOW
+    k = config.BOLL_STDDEV if k is None else k
+    mid, std = rolling_mean_std(X, window)
+    rsi = rsi_rows(X, rsi_period, start)
+    side = revert_side(X, mid - k * std, mid + k * std, rsi, oversold, overbought)
+    return np.where(_bars_seen(X, start) >= max(window, rsi_period) + 5, side, FLAT)
+
+
+def _trend_args(p) -> tuple:
+    return (p.trend_ema_fast, p.trend_ema_slow, p.macd_signal) if p is not None else ()
+
+
+def _revert_args(p) -> tuple:
+    if p is None: return ()
+    return (p.revert_rsi_period, p.boll_window, p.boll_stddev, p.revert_rsi_oversold, p.revert_rsi_overbought)
+
+
+def evaluate(X: np.ndarray, start: np.ndarray, params=None) -> np.ndarray:
+    """trend 優先、revert 次之（同 manage_symbol 的 trend or revert）；params 為 None 時用 config"""
+    t = evaluate_trend(X, start, *_trend_args(params))
+    r = evaluate_revert(X, start, *_revert_args(params))
+    return np.where(t != FLAT, t, r)
+
+
+def history_sides(X: np.ndarray, start: np.ndarray, params=None) -> np.ndarray:
+    """evaluate() 的整段歷史版本：(symbols × bars)"""
+    t = trend_sides(X, start, *_trend_args(params))
+    r = revert_sides(X, start, *_revert_args(params))
+    return np.where(t != FLAT, t, r)
+
+
+async def _bounded(coro, timeout: float):
+    """超過 timeout 回 TimeoutError（本輪略過該 symbol），同步本身在背景繼續，完成後下一輪直接讀快取"""
+    if not timeout: return await coro
+    return await asyncio.wait_for(asyncio.shield(asyncio.ensure_future(coro)), timeout)
+
+
+async def batch_signals(client, symbols: List[str], interval: str = None) -> Dict[str, Optional[str]]:
+    """一次取得所有候選的 K 線、疊成矩陣後同時計算所有 symbol 的訊號；慢的 symbol（SYMBOL_TIMEOUT_SEC）不拖住其他"""
+    interval = interval or config.KLINE_INTERVAL
+    bufs = await asyncio.gather(*[_bounded(client.kline_store.sync(s, interval), config.SYMBOL_TIMEOUT_SEC)
+                                  for s in symbols], return_exceptions=True)
+    ok = [(s, b) for s, b in zip(symbols, bufs) if not isinstance(b, Exception) and len(b)]
+    out: Dict[str, Optional[str]] = {s: None for s in symbols}
+    if not ok: return out
+    X, start = stack_closes([b.closes() for _, b in ok])
+    for (s, _), v in zip(ok, evaluate(X, start)):
+        out[s] = side_name(v)
+    return out
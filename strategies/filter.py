@@ -1,19 +1,21 @@
 # strategies/filter.py
 import asyncio
 from decimal import Decimal
-from config import SYMBOL_POOL, VOLUME_MIN_USD, FUNDING_RATE_MIN
+from config import SYMBOL_POOL, VOLUME_MIN_USD, FUNDING_RATE_MIN, SCREEN_MODE
+from filters.screener import bulk_shortlist
+from filters.symbol_filter import screening_pool
 
 async def _fetch_metrics(client, symbol):
     try:
         # try premium index -> get funding rate
         try:
-            prem = await client._run(client.client.premium_index, symbol)
+            prem = await client._call("premium_index", symbol=symbol)
             funding = Decimal(str(prem.get("lastFundingRate", "0")))
         except Exception:
             funding = Decimal("0")
         # try 24hr ticker for volume
         try:
-            info = await client._run(client.client.ticker_24hr, symbol)
+            info = await client._call("ticker_24hr", symbol=symbol)
             volume = Decimal(str(info.get("quoteVolume", "0")))
         except Exception:
             volume = Decimal("0")
@@ -23,6 +25,9 @@ async def _fetch_metrics(client, symbol):
         return symbol, None, None
 
 async def filter_symbols(client, max_candidates=10):
+    if SCREEN_MODE == "bulk" or screening_pool() is None:
+        return await bulk_shortlist(client, screening_pool(), max_candidates)
+
     tasks = [_fetch_metrics(client, s) for s in SYMBOL_POOL]
     results = await asyncio.gather(*tasks, return_exceptions=False)
 
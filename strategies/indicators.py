@@ -0,0 +1,206 @@
+import math
+from collections import deque
+from typing import Dict, Optional, Tuple
+import config
+
+
+class EMA:
+    """pandas ewm(span=period, adjust=False) 的遞迴版本：第一筆為種子值"""
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, period: int = None, alpha: float = None):
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.value: Optional[float] = None
+
+    def peek(self, x: float) -> float:
+        if self.value is None: return x
+        return self.alpha * x + (1.0 - self.alpha) * self.value
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        return self.value
+
+
+class WilderRSI:
+    """RSI：diff → up/down 各做 ewm(alpha=1/period, adjust=False)，rs = up/down"""
+    __slots__ = ("up", "down", "prev")
+
+    def __init__(self, period: int):
+        self.up = EMA(alpha=1.0 / period)
+        self.down = EMA(alpha=1.0 / period)
+        self.prev: Optional[float] = None
+
+    @staticmethod
+    def _value(up: float, down: float) -> float:
+        if down == 0:
+            return float("nan") if up == 0 else 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+    def peek(self, x: float) -> float:
+        if self.prev is None: return float("nan")
+        d = x - self.prev
+        return self._value(self.up.peek(max(d, 0.0)), self.down.peek(max(-d, 0.0)))
+
+    def update(self, x: float) -> float:
+        if self.prev is None:
+            self.prev = x
+            return float("nan")
+        d = x - self.prev
+        self.prev = x
+        return self._value(self.up.update(max(d, 0.0)), self.down.update(max(-d, 0.0)))
+
+
+class RollingStats:
+    """
+    固定視窗 mean / 樣本標準差（ddof=1），Welford 滑動更新，與 rolling(window).mean()/.std() 一致。
+    每滑動 window 次以視窗內資料重算一次，避免浮點誤差累積（攤提仍為 O(1)）。
+    """
+    __slots__ = ("window", "values", "mean", "m2", "_slides")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._slides = 0
+
+    def _next(self, x: float) -> Tuple[float, float]:
+        n = len(self.values)
+        if n < self.window:   # 視窗未滿：一般 Welford 累加
+            mean = self.mean + (x - self.mean) / (n + 1)
+            return mean, self.m2 + (x - self.mean) * (x - mean)
+        old = self.values[0]
+        mean = self.mean + (x - old) / self.window
+        return mean, self.m2 + (x - old) * (x - mean + old - self.mean)
+
+    @staticmethod
+    def _std(m2: float, n: int) -> float:
+        return math.sqrt(max(m2, 0.0) / (n - 1)) if n > 1 else float("nan")
+
+    def peek(self, x: float) -> Tuple[float, float]:
+        mean, m2 = self._next(x)
+        n = min(len(self.values) + 1, self.window)
+        if n < self.window: return float("nan"), float("nan")
+        return mean, self._std(m2, n)
+
+    def update(self, x: float) -> Tuple[float, float]:
+        self.mean, self.m2 = self._next(x)
+        self.values.append(x)
+        if len(self.values) < self.window: return float("nan"), float("nan")
+        self._slides += 1
+        if self._slides >= self.window:
+            self._slides = 0
+            self.mean = math.fsum(self.values) / self.window
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in self.values)
+        return self.mean, self._std(self.m2, self.window)
+
+
+class IndicatorSet:
+    """
+    單一 (symbol, interval) 的指標狀態。
+    - 已收盤 K 棒 commit 進遞迴狀態（每根 O(1)），最後一根（未收盤）只 peek 不改狀態
+    - [-2] = 最後一根已收盤的值，[-1] = 含即時 K 棒的值，與原本 pandas 的 iloc[-2] / iloc[-1] 對應
+    - EMA 類指標以第一次看到的 K 棒為種子；與 pandas 在同一段完整歷史上計算結果相同（誤差 < 1e-9）
+    - 原本每次以 KLINE_LIMIT 根重算、種子是視窗第一根，每滑一根就換一次種子；這裡刻意不跟著重設
+      （要逐根重算整個視窗才做得到），差異 = (1-alpha)^(N-1) * (視窗首根 close - 當時的 EMA)。
+      預設參數下 ema_slow / MACD signal 約 1e-5 * 價格、RSI 約 1e-4 點，布林帶為固定視窗不受影響；
+      見 tests/test_indicators.py
+    """
+    def __init__(self, ema_fast: int = None, ema_slow: int = None, macd_signal: int = None,
+                 rsi_period: int = None, boll_window: int = None, boll_std: float = None):
+        self.ema_fast = EMA(ema_fast or config.TREND_EMA_FAST)
+        self.ema_slow = EMA(ema_slow or config.TREND_EMA_SLOW)
+        self.macd_signal = EMA(macd_signal or config.MACD_SIGNAL)
+        self.rsi = WilderRSI(rsi_period or config.REVERT_RSI_PERIOD)
+        self.boll = RollingStats(boll_window or config.BOLL_WINDOW)
+        self.boll_std = boll_std if boll_std is not None else config.BOLL_STDDEV
+        self.committed_open_time = 0
+        self.committed = 0          # 已 commit 的 K 棒數
+        self.prev = None            # 最後一根已收盤 K 棒的指標值
+        self.live = None            # 含即時 K 棒的指標值
+        self.last_close = float("nan")
+
+    @property
+    def count(self) -> int:
+        return self.committed + (1 if self.live is not None else 0)
+
+    def _values(self, close: float, commit: bool) -> dict:
+        op = "update" if commit else "peek"
+        f = getattr(self.ema_fast, op)(close)
+        s = getattr(self.ema_slow, op)(close)
+        macd = f - s
+        sig = getattr(self.macd_signal, op)(macd)
+        rsi = getattr(self.rsi, op)(close)
+        mean, std = getattr(self.boll, op)(close)
+        return {"close": close, "ema_fast": f, "ema_slow": s, "macd": macd, "signal": sig, "rsi": rsi,
+                "boll_mid": mean, "boll_upper": mean + self.boll_std * std, "boll_lower": mean - self.boll_std * std}
+
+    def commit(self, open_time: int, close: float):
+        self.prev = self._values(close, True)
+        self.committed_open_time = open_time
+        self.committed += 1
+
+    def tick(self, close: float):
+        """即時 K 棒價格更新：O(1)，不改變已收盤狀態"""
+        self.live = self._values(close, False)
+        self.last_close = close
+
+    def update(self, open_times, closes):
+        """從 K 線 buffer（依時間排序的 open_time / close）套用新收盤的 K 棒，最後一根視為即時 K 棒"""
+        n = len(closes)
+        if n == 0: return
+        start = 0
+        if self.committed:
+            # 找出比已 commit 更新的第一根；若中間有缺口（buffer 已不含上次 commit 的 K 棒）則重新暖機
+            idx = n - 1
+            while idx >= 0 and open_times[idx] > self.committed_open_time: idx -= 1
+            if idx < 0 or open_times[idx] != self.committed_open_time:
+                return False
+            start = idx + 1
+        for i in range(start, n - 1):
+            self.commit(int(open_times[i]), float(closes[i]))
+        self.tick(float(closes[n - 1]))
+        return True
+
+    def trend(self):
+        p, l = self.prev, self.live
+        return (p["ema_fast"], l["ema_fast"], p["ema_slow"], l["ema_slow"],
+                p["macd"], l["macd"], p["signal"], l["signal"])
+
+
+class IndicatorEngine:
+    """(symbol, interval) → IndicatorSet；從 KlineStore 讀最新 K 線後做增量更新"""
+    def __init__(self, kline_store, **periods):
+        self.kline_store = kline_store
+        self.periods = periods
+        self._sets: Dict[Tuple[str, str], IndicatorSet] = {}
+
+    def _new(self) -> IndicatorSet:
+        return IndicatorSet(**self.periods)
+
+    def apply(self, key: Tuple[str, str], buf) -> IndicatorSet:
+        ind = self._sets.get(key)
+        if ind is None:
+            ind = self._sets[key] = self._new()
+        if ind.committed:
+            # 只讀尾端新增的幾根：成本與 KLINE_LIMIT 無關
+            k = 2
+            while k < len(buf) and buf.tail("open_time", k)[0] > ind.committed_open_time:
+                k *= 2
+            if ind.update(buf.tail("open_time", k), buf.tail("close", k)) is not False:
+                return ind
+            ind = self._sets[key] = self._new()
+        ind.update(buf.column("open_time"), buf.closes())
+        return ind
+
+    async def sync(self, symbol: str, interval: str = None) -> IndicatorSet:
+        interval = interval or config.KLINE_INTERVAL
+        buf = await self.kline_store.sync(symbol, interval)
+        return self.apply((symbol, interval), buf)
+
+
+def indicators_for(client) -> IndicatorEngine:
+    eng = getattr(client, "indicators", None)
+    if eng is None:
+        eng = client.indicators = IndicatorEngine(client.kline_store)
+    return eng
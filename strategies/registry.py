@@ -0,0 +1,150 @@
+import asyncio, inspect
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+import config
+from strategies.indicators import indicators_for
+from monitoring import metrics
+
+_MISSING = object()
+
+# ----- 特徵宣告：name → fn(Features)，同一快照只算一次 -----
+FEATURES: Dict[str, Callable] = {}
+
+
+def feature(name: str):
+    def deco(fn):
+        FEATURES[name] = fn
+        return fn
+    return deco
+
+
+feature("count")(lambda f: f.count)
+feature("prev")(lambda f: f.prev)
+feature("live")(lambda f: f.live)
+feature("close")(lambda f: f.live["close"])
+feature("trend")(lambda f: tuple(v for k in ("ema_fast", "ema_slow", "macd", "signal")
+                                 for v in (f.prev[k], f.live[k])))
+feature("boll")(lambda f: (f.live["boll_lower"], f.live["boll_mid"], f.live["boll_upper"]))
+feature("rsi")(lambda f: f.live["rsi"])
+
+
+class Features:
+    """
+    單一 (symbol, interval, K 棒) 的特徵快照：IndicatorSet 目前的 prev / live 值（dict 每次更新都換新，
+    持有參考即固定），宣告過的特徵第一次讀取時計算並記住，之後所有策略共用。
+    """
+    __slots__ = ("symbol", "interval", "count", "prev", "live", "_values")
+
+    def __init__(self, symbol: str, interval: str, ind):
+        self.symbol, self.interval = symbol, interval
+        self.count, self.prev, self.live = ind.count, ind.prev, ind.live
+        self._values: Dict[str, object] = {}
+
+    def __getitem__(self, name: str):
+        v = self._values.get(name, _MISSING)
+        if v is _MISSING:
+            v = self._values[name] = FEATURES[name](self)
+        return v
+
+
+class FeatureStore:
+    """
+    (symbol, interval, 最後一根已收盤 open_time, 即時價) → Features，LRU（FEATURE_CACHE_SIZE）。
+    K 線 / 指標沿用 KlineStore + IndicatorEngine 的增量更新；價格沒變時直接回傳同一份快照。
+    """
+    def __init__(self, client, size: int = None):
+        self.indicators = indicators_for(client)
+        self.size = config.FEATURE_CACHE_SIZE if size is None else size
+        self._lru: "OrderedDict[tuple, Features]" = OrderedDict()
+        self.stats = {"hit": 0, "miss": 0, "evicted": 0}
+
+    async def get(self, symbol: str, interval: str = None) -> Features:
+        interval = interval or config.KLINE_INTERVAL
+        ind = await self.indicators.sync(symbol, interval)
+        key = (symbol, interval, ind.committed_open_time, ind.last_close)
+        f = self._lru.get(key)
+        if f is not None:
+            self._lru.move_to_end(key)
+            self.stats["hit"] += 1
+            return f
+        f = self._lru[key] = Features(symbol, interval, ind)
+        self.stats["miss"] += 1
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+            self.stats["evicted"] += 1
+        return f
+
+
+def features_for(client) -> FeatureStore:
+    store = getattr(client, "features", None)
+    if store is None:
+        store = client.features = FeatureStore(client)
+    return store
+
+
+# ----- 策略註冊表：fn(Features) -> "LONG" / "SHORT" / None（可為 async） -----
+class Strategy:
+    __slots__ = ("name", "fn", "priority", "min_bars")
+
+    def __init__(self, name: str, fn: Callable, priority: int, min_bars: Callable[[], int]):
+        self.name, self.fn, self.priority, self.min_bars = name, fn, priority, min_bars
+
+
+STRATEGIES: Dict[str, Strategy] = {}
+
+
+def register(name: str, priority: int = 100, min_bars: Callable[[], int] = lambda: 0):
+    """priority 小的先採用（合併時取第一個有訊號的）；min_bars 在呼叫時才讀 config，K 棒不足直接回 None"""
+    def deco(fn):
+        STRATEGIES[name] = Strategy(name, fn, priority, min_bars)
+        return fn
+    return deco
+
+
+def registered(names: Sequence[str] = None) -> List[Strategy]:
+    out = sorted(STRATEGIES.values(), key=lambda s: s.priority)
+    return out if names is None else [s for s in out if s.name in names]
+
+
+def _call(s: Strategy, f: Features):
+    try:
+        if f.live is None or f.count < s.min_bars(): return None
+        with metrics.timer("strategy_signal_seconds", strategy=s.name):
+            return s.fn(f)
+    except Exception as e:
+        print(f"[STRATEGY:{s.name}] error {f.symbol}: {e}")
+        return None
+
+
+async def _wait(s: Strategy, f: Features, aw) -> Optional[str]:
+    try:
+        with metrics.timer("strategy_signal_seconds", strategy=s.name):
+            return await aw
+    except Exception as e:
+        print(f"[STRATEGY:{s.name}] error {f.symbol}: {e}")
+        return None
+
+
+async def run_strategies(client, symbol: str, names: Sequence[str] = None,
+                         interval: str = None) -> Dict[str, Optional[str]]:
+    """
+    一次取得特徵快照，所有（或指定的）策略在同一份快照上計算；回傳 name → 訊號（依 priority 排序）。
+    同步策略直接算完（純 CPU，不值得建 task），async 策略（例如要查外部資料）以 gather 同時等待
+    """
+    strategies = registered(names)
+    try:
+        f = await features_for(client).get(symbol, interval)
+    except Exception as e:
+        print(f"[STRATEGY] features error {symbol}: {e}")
+        return {s.name: None for s in strategies}
+    out = {s.name: _call(s, f) for s in strategies}
+    pending = [s for s in strategies if inspect.isawaitable(out[s.name])]
+    if pending:
+        for s, sig in zip(pending, await asyncio.gather(*[_wait(s, f, out[s.name]) for s in pending])):
+            out[s.name] = sig
+    return out
+
+
+def combine(signals: Dict[str, Optional[str]]) -> Optional[str]:
+    """依 priority 取第一個有訊號的策略（trend 先、revert 後，同原本的 trend or revert）"""
+    return next((sig for sig in signals.values() if sig), None)
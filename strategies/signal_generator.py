@@ -1,12 +1,8 @@
 # strategies/signal_generator.py
 from typing import Optional
-from .trend import generate_trend_signal
-from .revert import generate_revert_signal
+from .registry import run_strategies, combine
+from . import trend, revert   # noqa: F401  內建策略在 import 時註冊
 
 async def generate_signal(client, symbol: str) -> Optional[str]:
-    # 先看趨勢，再看反轉（保留你原本優先順序）
-    t = await generate_trend_signal(client, symbol)
-    if t:
-        return t
-    r = await generate_revert_signal(client, symbol)
-    return r
+    # 所有已註冊策略共用同一份特徵快照、同時計算；先看趨勢，再看反轉（保留你原本優先順序）
+    return combine(await run_strategies(client, symbol))
@@ -0,0 +1,36 @@
+import os, sys
+
+# config 在 import 時讀環境變數；測試一律離線，不需要 API key
+os.environ.setdefault("OFFLINE_MODE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contextlib
+import pytest
+from aiohttp import web
+
+
+@pytest.fixture
+def ws_server():
+    """
+    本地 WS server（取代 Binance stream 端點）：serve(handler) 為 async context manager，回傳 base_url；
+    每個連線呼叫 handler(ws, request)，handler 返回即關閉該連線
+    """
+    @contextlib.asynccontextmanager
+    async def serve(handler):
+        async def endpoint(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await handler(ws, request)
+            return ws
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", endpoint)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            yield f"ws://127.0.0.1:{port}"
+        finally:
+            await runner.cleanup()
+    return serve
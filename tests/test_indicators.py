@@ -0,0 +1,100 @@
+"""
+IndicatorSet（增量）對照原本 strategies/trend.py、revert.py 的 pandas 公式。
+
+- 同一段完整歷史（兩邊種子都是第一根）：所有指標一致，容差 1e-9（相對價格）
+- 原本每次抓 KLINE_LIMIT 根重算，EMA 類以視窗第一根為種子；增量版種子固定在第一次看到的 K 棒，
+  差異 = (1-alpha)^(N-1)（iloc[-2] 為 N-2） * (視窗首根 close - 該根的增量 EMA)，刻意保留（見 IndicatorSet docstring）。
+  EMA 以此解析上界檢查；MACD signal / RSI 為上述差異的線性傳遞，容差取實測值的數倍：
+  signal 1e-4 * 價格、RSI 1e-3 點；布林帶為固定視窗，仍要求 1e-9
+"""
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from strategies.indicators import IndicatorSet
+
+FAST, SLOW, SIGNAL, RSI, BOLL, STD = 20, 50, 9, 14, 20, 2.0
+WINDOW = 200   # KLINE_LIMIT 預設
+EXACT = 1e-9
+
+
+def _closes(n=800, seed=3):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+
+
+def _baseline(closes) -> dict:
+    """原本 pandas 版本的計算（trend._ema / revert._rsi / rolling），回傳 iloc[-2] 與 iloc[-1]"""
+    close = pd.Series(closes)
+    ema_fast = close.ewm(span=FAST, adjust=False).mean()
+    ema_slow = close.ewm(span=SLOW, adjust=False).mean()
+    macd = ema_fast - ema_slow
+    signal = macd.ewm(span=SIGNAL, adjust=False).mean()
+    delta = close.diff()
+    up, down = delta.clip(lower=0), -delta.clip(upper=0)
+    rs = up.ewm(alpha=1 / RSI, adjust=False).mean() / down.ewm(alpha=1 / RSI, adjust=False).mean()
+    rsi = 100 - (100 / (1 + rs))
+    ma, std = close.rolling(BOLL).mean(), close.rolling(BOLL).std()
+    cols = {"ema_fast": ema_fast, "ema_slow": ema_slow, "macd": macd, "signal": signal, "rsi": rsi,
+            "boll_mid": ma, "boll_upper": ma + STD * std, "boll_lower": ma - STD * std}
+    return {k: (v.iloc[-2], v.iloc[-1]) for k, v in cols.items()}
+
+
+def _new():
+    return IndicatorSet(FAST, SLOW, SIGNAL, RSI, BOLL, STD)
+
+
+ALL = ("ema_fast", "ema_slow", "macd", "signal", "rsi", "boll_mid", "boll_upper", "boll_lower")
+
+
+def _tol(price, **loose):
+    """價格類指標以價格為尺度（RSI 以 100 點為尺度）；loose 覆寫個別指標的容差"""
+    return lambda k: loose.get(k, EXACT * (100 if k == "rsi" else price))
+
+
+def _assert_close(ind, ref, tol, keys=ALL):
+    for k in keys:
+        for got, want in ((ind.prev[k], ref[k][0]), (ind.live[k], ref[k][1])):
+            assert abs(got - want) <= tol(k), (k, got, want)
+
+
+def test_full_history_matches_pandas():
+    closes, ind = _closes(), _new()
+    times = np.arange(len(closes)) * 900_000
+    for t in range(SLOW + 5, len(closes), 7):
+        assert ind.update(times[:t], closes[:t]) is not False
+        _assert_close(ind, _baseline(closes[:t]), _tol(closes[t - 1]))
+
+
+def test_sliding_window_divergence_bounded():
+    closes, ind = _closes(), _new()
+    times = np.arange(len(closes)) * 900_000
+    history = _new()   # 增量 EMA 在每根 K 棒的值，用來算視窗首根的種子差
+    seeds = [history.ema_slow.update(c) for c in closes]
+    decay = (1 - 2 / (SLOW + 1)) ** (WINDOW - 2)   # iloc[-2] 離種子 N-2 步（iloc[-1] 更小）
+    for t in range(WINDOW, len(closes)):
+        w = slice(t - WINDOW, t)
+        assert ind.update(times[w], closes[w]) is not False
+        ref = _baseline(closes[w])
+        price = closes[t - 1]
+        bound = decay * abs(closes[t - WINDOW] - seeds[t - WINDOW]) + EXACT * price
+        _assert_close(ind, ref, _tol(price, ema_slow=bound, macd=1e-4 * price, signal=1e-4 * price, rsi=1e-3))
+
+
+def test_tick_does_not_change_committed_state():
+    closes, ind = _closes(300), _new()
+    times = np.arange(len(closes)) * 900_000
+    ind.update(times, closes)
+    prev, committed = ind.prev, ind.committed
+    for px in (closes[-1] * 1.01, closes[-1] * 0.98, closes[-1]):
+        ind.tick(px)
+    assert ind.prev is prev and ind.committed == committed
+    _assert_close(ind, _baseline(closes), _tol(closes[-1]))
+
+
+def test_gap_requires_rewarm():
+    closes, ind = _closes(400), _new()
+    times = np.arange(len(closes)) * 900_000
+    ind.update(times[:200], closes[:200])
+    assert ind.update(times[250:400], closes[250:400]) is False
@@ -0,0 +1,134 @@
+import asyncio, time
+from decimal import Decimal
+
+from exchange.binance_client import BinanceClient
+from exchange.market_stream import MarketStream
+
+IV = 900_000   # 15m
+
+
+def _candle(now_ms=None) -> int:
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    return now_ms // IV * IV
+
+
+class _Rest:
+    """取代 BinanceClient._call：K 線以目前時間為最後一根，記錄每次 REST 呼叫"""
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, name, **params):
+        self.calls.append(name)
+        if name == "klines":
+            end = _candle()
+            start = params.get("startTime", end - (params["limit"] - 1) * IV)
+            return [[t, "100", "101", "99", "100", "5", t + IV - 1, "0", 1, "0", "0", "0"]
+                    for t in range(start, min(end, start + (params["limit"] - 1) * IV) + 1, IV)]
+        if name == "ticker_price":
+            return {"symbol": params["symbol"], "price": "99.5"}
+        if name == "premium_index":
+            return {"symbol": params["symbol"], "markPrice": "99.6"}
+        raise AssertionError(name)
+
+    def count(self, name):
+        return self.calls.count(name)
+
+
+def _client():
+    client = BinanceClient("k", "s")
+    client._call = _Rest()
+    return client
+
+
+def _kline(close: str, t: int) -> dict:
+    return {"stream": "btcusdt@kline_15m", "data": {"e": "kline", "s": "BTCUSDT", "k": {
+        "t": t, "T": t + IV - 1, "i": "15m", "o": "100", "h": "102", "l": "99", "c": close, "v": "7"}}}
+
+
+def _mark(price: str) -> dict:
+    return {"stream": "btcusdt@markPrice", "data": {"e": "markPriceUpdate", "s": "BTCUSDT", "p": price,
+                                                    "i": price, "r": "0.0001", "T": 0, "E": 0}}
+
+
+async def _until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+
+def test_stream_updates_reconnects_and_falls_back(ws_server):
+    connections = []
+
+    async def handler(ws, request):
+        connections.append(request.query["streams"].split("/"))
+        if len(connections) == 1:
+            # 第一條連線：即時 K 棒更新 + 標記價 + ticker，接著由 server 斷線
+            await ws.send_json(_kline("100.5", _candle()))
+            await ws.send_json(_mark("100.7"))
+            await ws.send_json({"stream": "!ticker@arr", "data": [{"s": "BTCUSDT", "c": "100.6", "P": "1",
+                                                                  "v": "1", "q": "1", "C": 0}]})
+            await asyncio.sleep(0.1)
+            await ws.close()
+            return
+        await ws.send_json(_mark("101.0"))
+        async for _ in ws: pass
+
+    async def run():
+        client = _client()
+        rest = client._call
+        async with ws_server(handler) as url:
+            stream = MarketStream(client, ["BTCUSDT"], interval="15m", base_url=url)
+            client.attach_market_stream(stream)
+
+            # 尚未連上：價格 / 標記價 / K 線都走 REST
+            assert await client.get_price("BTCUSDT") == Decimal("99.5")
+            assert (await client.get_premium_index("BTCUSDT"))["markPrice"] == "99.6"
+            assert not stream.kline_live("BTCUSDT", "15m")
+            buf = await client.kline_store.sync("BTCUSDT", "15m")
+            assert rest.count("klines") == 1 and buf.closes()[-1] == 100.0
+
+            task = asyncio.create_task(stream.run())
+            await _until(lambda: stream.mark_price("BTCUSDT") is not None)
+            await _until(lambda: stream.price("BTCUSDT") is not None)
+            assert connections[0] == ["!ticker@arr", "btcusdt@kline_15m", "btcusdt@markPrice"]
+
+            # K 線：WS 更新同一根即時 K 棒（不新增），之後 sync 直接讀記憶體
+            assert buf.closes()[-1] == 100.5 and buf.last_open_time == _candle()
+            assert stream.kline_live("BTCUSDT", "15m")
+            client.kline_store.expire("BTCUSDT", "15m")
+            klines = rest.count("klines")
+            await client.kline_store.sync("BTCUSDT", "15m")
+            assert rest.count("klines") == klines
+            assert await client.get_price("BTCUSDT") == Decimal("100.6")
+            assert stream.mark_price("BTCUSDT") == Decimal("100.7")
+
+            # server 斷線 → 退避後重連，重連時以 REST 補 K 線
+            await _until(lambda: stream.mark_price("BTCUSDT") == Decimal("101.0"))
+            assert stream.reconnects == 1 and len(connections) == 2
+            assert rest.count("klines") == klines + 1
+
+            # 資料過期（WS 沒在推送）：回退 REST
+            stream.stale_sec = 0
+            prices = rest.count("ticker_price")
+            assert await client.get_price("BTCUSDT") == Decimal("99.5")
+            assert rest.count("ticker_price") == prices + 1
+            assert (await client.get_premium_index("BTCUSDT"))["markPrice"] == "99.6"
+            assert not stream.kline_live("BTCUSDT", "15m")
+            client.kline_store.expire("BTCUSDT", "15m")
+            await client.kline_store.sync("BTCUSDT", "15m")
+            assert rest.count("klines") == klines + 2
+
+            await asyncio.wait_for(stream.stop(), 5)
+            assert task.done()
+        await client.close()
+    asyncio.run(run())
+
+
+def test_kline_before_backfill_is_ignored():
+    client = _client()
+    stream = MarketStream(client, ["BTCUSDT"], interval="15m")
+    stream.handle(_kline("100.5", _candle()))
+    assert client.kline_store.get("BTCUSDT", "15m") is None
+    assert not stream.kline_live("BTCUSDT", "15m")
+    assert stream.messages == 1
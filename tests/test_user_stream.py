@@ -0,0 +1,107 @@
+import asyncio
+from decimal import Decimal
+
+from exchange.user_stream import AccountMirror, UserDataStream
+
+D = Decimal
+
+# 錄下來的 user data stream 事件（欄位同 Binance 合約 ACCOUNT_UPDATE / ORDER_TRADE_UPDATE）
+EVENTS = [
+    {"e": "ORDER_TRADE_UPDATE", "E": 1, "o": {"s": "BTCUSDT", "c": "c1", "S": "BUY", "o": "LIMIT", "q": "0.010",
+                                             "p": "50000", "sp": "0", "x": "NEW", "X": "NEW", "i": 11, "z": "0",
+                                             "R": False, "ps": "BOTH"}},
+    {"e": "ORDER_TRADE_UPDATE", "E": 2, "o": {"s": "BTCUSDT", "c": "c1", "S": "BUY", "o": "LIMIT", "q": "0.010",
+                                             "p": "50000", "sp": "0", "x": "TRADE", "X": "FILLED", "i": 11,
+                                             "z": "0.010", "l": "0.010", "L": "50000", "R": False, "ps": "BOTH"}},
+    {"e": "ACCOUNT_UPDATE", "E": 3, "a": {"m": "ORDER", "B": [{"a": "USDT", "wb": "999.80", "cw": "999.80"}],
+                                         "P": [{"s": "BTCUSDT", "pa": "0.010", "ep": "50000", "up": "0",
+                                                "mt": "cross", "ps": "BOTH"}]}},
+    # hedge mode：同一 symbol 兩腿
+    {"e": "ACCOUNT_UPDATE", "E": 4, "a": {"m": "ORDER", "B": [],
+                                         "P": [{"s": "ETHUSDT", "pa": "1.0", "ep": "3000", "up": "0", "ps": "LONG"},
+                                               {"s": "ETHUSDT", "pa": "-2.0", "ep": "3100", "up": "5", "ps": "SHORT"}]}},
+    {"e": "ACCOUNT_CONFIG_UPDATE", "E": 5, "ac": {"s": "ETHUSDT", "l": 7}},
+    {"e": "ACCOUNT_UPDATE", "E": 6, "a": {"m": "ORDER", "B": [{"a": "USDT", "wb": "1010.80", "cw": "1010.80"}],
+                                         "P": [{"s": "ETHUSDT", "pa": "0", "ep": "0", "up": "0", "ps": "LONG"}]}},
+    {"e": "ACCOUNT_UPDATE", "E": 7, "a": {"m": "FUNDING_FEE", "B": [{"a": "BNB", "wb": "1"}], "P": []}},
+]
+
+
+def _mirror():
+    m = AccountMirror()
+    m.resync([{"symbol": "BTCUSDT", "positionAmt": "0", "entryPrice": "0", "leverage": "10", "positionSide": "BOTH"},
+              {"symbol": "ETHUSDT", "positionAmt": "0", "entryPrice": "0", "leverage": "5", "positionSide": "LONG"}],
+             [{"asset": "USDT", "balance": "1000", "availableBalance": "900"}], [])
+    return m
+
+
+def test_replay_balances_and_positions():
+    m, fills = _mirror(), []
+    m.on_fill(fills.append)
+    m.replay(EVENTS[:2])
+    assert m.open_orders == {} and [f["i"] for f in fills] == [11]
+    m.replay(EVENTS[2:])
+    assert m.wallet_balance == D("1010.80")
+    assert m.available == D("910.80")   # 依錢包變動量調整
+    btc = m.position("BTCUSDT")
+    assert btc["positionAmt"] == D("0.010") and btc["entryPrice"] == D("50000") and btc["leverage"] == D("10")
+    # LONG 腿歸零不影響 SHORT 腿
+    eth = m.position("ETHUSDT")
+    assert eth["positionAmt"] == D("-2.0") and eth["entryPrice"] == D("3100") and eth["leverage"] == D("7")
+    snap = m.snapshot()
+    assert sorted(snap.open_symbols()) == ["BTCUSDT", "ETHUSDT"]
+    assert snap.equity == D("1010.80") and snap.available == D("910.80")
+
+
+def test_hedge_legs_do_not_overwrite():
+    m = _mirror()
+    m.apply(EVENTS[3])
+    assert m.positions[("ETHUSDT", "LONG")]["positionAmt"] == D("1.0")
+    assert m.positions[("ETHUSDT", "SHORT")]["positionAmt"] == D("-2.0")
+    m.apply({"e": "ACCOUNT_UPDATE", "a": {"P": [{"s": "ETHUSDT", "pa": "0", "ps": "SHORT"}]}})
+    assert m.position("ETHUSDT")["positionAmt"] == D("1.0")
+
+
+def test_open_order_tracking_and_mark_price():
+    m = _mirror()
+    m.apply(EVENTS[0])
+    assert m.open_orders[11]["status"] == "NEW" and m.open_orders[11]["origQty"] == "0.010"
+    m.replay(EVENTS[1:3])
+    m.mark_price = lambda s: D("51000") if s == "BTCUSDT" else None
+    assert m.position("BTCUSDT")["unrealizedProfit"] == D("10.000")
+
+
+class _Client:
+    def __init__(self):
+        self.calls = []
+
+    async def new_listen_key(self):
+        return "lk"
+
+    async def keepalive_listen_key(self, key):
+        self.calls.append("keepalive")
+
+    async def _call(self, name):
+        self.calls.append(name)
+        return {"position_risk": [], "balance": [{"asset": "USDT", "balance": "1000"}], "get_orders": []}[name]
+
+
+def test_stop_closes_stream_and_background_tasks(ws_server):
+    async def handler(ws, request):
+        await ws.send_json(EVENTS[2])
+        async for _ in ws: pass   # 保持連線直到 client 關閉
+
+    async def run():
+        async with ws_server(handler) as url:
+            uds = UserDataStream(_Client(), base_url=url)
+            task = asyncio.create_task(uds.run())
+            for _ in range(200):
+                if uds.mirror.positions: break
+                await asyncio.sleep(0.01)
+            assert uds.mirror.position("BTCUSDT")["positionAmt"] == D("0.010")
+            bg = list(uds._bg)
+            assert len(bg) == 2 and not any(t.done() for t in bg)
+            await asyncio.wait_for(uds.stop(), 5)
+            assert task.done() and all(t.done() for t in bg)
+            assert uds._session.closed and uds.reconnects == 0
+    asyncio.run(run())